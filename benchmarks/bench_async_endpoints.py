@@ -0,0 +1,147 @@
+"""Load benchmark: requests in flight per worker on /process-email.
+
+Both variants run on a single event loop (one uvicorn worker) against stub
+LLMs with a fixed latency, so the numbers only reflect how the endpoint uses
+the loop:
+
+* before - the old endpoint, an ``async def`` that calls the blocking
+  ``process_email``
+* after  - the current endpoint awaiting ``aprocess_email``
+
+Usage:
+    python benchmarks/bench_async_endpoints.py --requests 50 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import httpx
+from fastapi import FastAPI
+from langchain_core.messages import AIMessage
+
+from email_assistant import agents, triage
+from email_assistant.main import app
+from email_assistant.schemas import RouterSchema
+
+
+class InFlight:
+    """tracks how many stubbed llm calls are running at the same time, and how many ran"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.calls = 0
+
+    def enter(self):
+        self.calls += 1
+        self.current += 1
+        self.peak = max(self.peak, self.current)
+
+    def exit(self):
+        self.current -= 1
+
+
+class StubRouter:
+    def __init__(self, latency, tracker):
+        self.latency = latency
+        self.tracker = tracker
+
+    def invoke(self, messages, config=None, **kwargs):
+        self.tracker.enter()
+        time.sleep(self.latency)
+        self.tracker.exit()
+        return RouterSchema(classification="respond", reasoning="benchmark", confidence=1.0)
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.tracker.enter()
+        await asyncio.sleep(self.latency)
+        self.tracker.exit()
+        return RouterSchema(classification="respond", reasoning="benchmark", confidence=1.0)
+
+
+class StubToolModel(StubRouter):
+    """writes the email, the run ends on its tool result (Done is only answered if asked again)"""
+
+    def _reply(self, messages):
+        if any(getattr(m, "type", None) == "tool" for m in messages):
+            return AIMessage(content="", tool_calls=[{"name": "Done", "args": {"done": True}, "id": "done"}])
+        args = {"to": "alice@company.com", "subject": "Re: benchmark", "body": "Thanks!"}
+        return AIMessage(content="", tool_calls=[{"name": "write_email", "args": args, "id": "write"}])
+
+    def invoke(self, messages, config=None, **kwargs):
+        self.tracker.enter()
+        time.sleep(self.latency)
+        self.tracker.exit()
+        return self._reply(messages)
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.tracker.enter()
+        await asyncio.sleep(self.latency)
+        self.tracker.exit()
+        return self._reply(messages)
+
+
+def legacy_app() -> FastAPI:
+    """the endpoint as it was before: async def around the blocking graph"""
+    legacy = FastAPI()
+
+    @legacy.post("/process-email")
+    async def process_email_endpoint(request: dict):
+        return agents.process_email(request["email_input"])
+
+    return legacy
+
+
+EMAIL = {
+    "email_input": {
+        "author": "Alice Smith <alice.smith@company.com>",
+        "to": "John Doe <john.doe@company.com>",
+        "subject": "Quick question about API documentation",
+        "email_thread": "Hi John, could we schedule a quick call this week?",
+    }
+}
+
+
+async def run(target_app, n_requests):
+    transport = httpx.ASGITransport(app=target_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/process-email", json=EMAIL) for _ in range(n_requests)))
+        elapsed = time.perf_counter() - start
+    failed = sum(r.status_code != 200 for r in responses)
+    return elapsed, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="concurrent requests per variant")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per stubbed llm call")
+    args = parser.parse_args()
+
+    #every request is the same email, without this all but the first would skip the triage call
+    triage.TRIAGE_CACHE_ENABLED = False
+    rows = []
+    for name, target_app in (("before (blocking)", legacy_app()), ("after (async)", app)):
+        tracker = InFlight()
+        router, tool_model = StubRouter(args.latency, tracker), StubToolModel(args.latency, tracker)
+        agents.get_llm_router = lambda: router
+        agents.get_llm_with_tools = lambda: tool_model
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, failed = asyncio.run(run(target_app, args.requests))
+        rows.append((name, tracker.peak, elapsed, args.requests / elapsed, failed))
+        calls_per_request = tracker.calls / args.requests
+
+    print(f"{args.requests} concurrent requests, {calls_per_request:g} llm calls each at {args.latency:.3f}s")
+    print(f"{'variant':<20}{'peak in flight':>16}{'wall (s)':>12}{'req/s':>10}{'errors':>8}")
+    for name, peak, elapsed, rps, failed in rows:
+        print(f"{name:<20}{peak:>16}{elapsed:>12.2f}{rps:>10.1f}{failed:>8}")
+
+
+if __name__ == "__main__":
+    main()
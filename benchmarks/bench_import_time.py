@@ -0,0 +1,73 @@
+"""Import-time benchmark for the API process, with a regression gate.
+
+Runs ``python -X importtime -c "import email_assistant.main"`` in fresh
+interpreters, reports the median cumulative import time and the heaviest
+modules, and exits with status 1 when:
+
+* the median is above ``--max-ms``, or
+* a module that must stay lazy (langgraph, langchain, the OpenAI client,
+  IPython) was imported, which means a heavy import crept back to module level
+
+Usage:
+    python benchmarks/bench_import_time.py --runs 5 --max-ms 900
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+LAZY_MODULES = ("langgraph", "langchain", "langchain_openai", "openai", "IPython")
+
+
+def import_profile(module: str) -> dict:
+    """cumulative import time in microseconds of every module imported by `import module`"""
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark")}
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    profile = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="email_assistant.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=900.0, help="regression threshold for the median")
+    parser.add_argument("--top", type=int, default=10, help="heaviest top-level imports to show")
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+    totals_ms = [profile[args.module] / 1000 for profile in profiles]
+    median_ms = statistics.median(totals_ms)
+
+    last = profiles[-1]
+    top_level = {name: us for name, us in last.items() if "." not in name and name != args.module}
+    print(f"import {args.module}: median {median_ms:.0f} ms over {args.runs} runs (min {min(totals_ms):.0f}, max {max(totals_ms):.0f})")
+    print("heaviest top-level packages:")
+    for name, us in sorted(top_level.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {name:<30}{us / 1000:>8.0f} ms")
+
+    leaked = sorted(name for name in LAZY_MODULES if name in last)
+    failed = False
+    if leaked:
+        print(f"FAIL: imported at module level, should be lazy: {', '.join(leaked)}")
+        failed = True
+    if median_ms > args.max_ms:
+        print(f"FAIL: median {median_ms:.0f} ms is above the {args.max_ms:.0f} ms threshold")
+        failed = True
+    if not failed:
+        print("OK")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
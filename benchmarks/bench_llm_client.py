@@ -0,0 +1,205 @@
+"""Connection reuse of the chat-model HTTP clients under concurrent load.
+
+Starts a local OpenAI-compatible server over TLS (self-signed certificate
+made with the ``openssl`` CLI, answers after ``--latency`` seconds) in a
+subprocess. It then sends ``--requests`` chat completions with ``--concurrency``
+in flight, spread over three ChatOpenAI models: triage, drafting and the judge.
+Four client setups are compared:
+
+* no-keepalive: connections are closed after every call, every call pays a
+  TCP connect and a TLS handshake
+* per-model: each model has its own pool (the SDK's default limits), the
+  three callers warm up and hold their own connections
+* shared-1-pool: the three models share one unsharded pool
+* shared: the three models share the llm_client transport (one client,
+  EMAIL_ASSISTANT_LLM_POOL_SHARDS pools), what the factory builds
+
+TLS handshakes and TCP connects are counted with httpcore's trace hooks.
+Latency is the client-side time of each ``ainvoke``.
+
+Usage:
+    python benchmarks/bench_llm_client.py --requests 600 --concurrency 32 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+COMPLETION = json.dumps({
+    "id": "chatcmpl-bench", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 20, "completion_tokens": 1, "total_tokens": 21},
+}).encode()
+
+
+SETUPS = ("no-keepalive", "per-model", "shared-1-pool", "shared")
+
+
+def serve(port, certfile, keyfile, latency):
+    """the fake OpenAI server, run in the subprocess"""
+    import uvicorn
+
+    async def app(scope, receive, send):
+        while (await receive()).get("more_body"):
+            pass
+        await asyncio.sleep(latency)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": COMPLETION})
+
+    uvicorn.run(app, host="127.0.0.1", port=port, ssl_certfile=certfile, ssl_keyfile=keyfile,
+                lifespan="off", log_level="warning", access_log=False, timeout_keep_alive=60)
+
+
+def self_signed_certificate(directory):
+    certfile, keyfile = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", keyfile, "-out", certfile,
+         "-days", "1", "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return certfile, keyfile
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(port, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("fake OpenAI server did not start")
+
+
+def counting_client(transport, counters):
+    """AsyncClient over `transport` that counts TCP connects and TLS handshakes"""
+    import httpx
+
+    from email_assistant.llm_client import request_timeout
+
+    async def trace(event, info):
+        if event == "connection.connect_tcp.complete":
+            counters["connects"] += 1
+        elif event == "connection.start_tls.complete":
+            counters["handshakes"] += 1
+
+    class CountingTransport(httpx.AsyncBaseTransport):
+        async def handle_async_request(self, request):
+            request.extensions["trace"] = trace
+            return await transport.handle_async_request(request)
+
+        async def aclose(self):
+            await transport.aclose()
+
+    return httpx.AsyncClient(transport=CountingTransport(), timeout=request_timeout())
+
+
+def percentile(sorted_values, q):
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_setup(name, base_url, certfile, n_requests, concurrency):
+    import httpx
+    from langchain_openai import ChatOpenAI
+
+    from email_assistant.llm_client import connection_limits, sharded_transport
+
+    counters = {"connects": 0, "handshakes": 0}
+    if name == "per-model":
+        default_limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+        clients = [counting_client(httpx.AsyncHTTPTransport(verify=certfile, limits=default_limits), counters)
+                   for _ in range(3)]
+    else:
+        if name == "no-keepalive":
+            transport = httpx.AsyncHTTPTransport(verify=certfile, limits=httpx.Limits(max_keepalive_connections=0))
+        elif name == "shared-1-pool":
+            transport = httpx.AsyncHTTPTransport(verify=certfile, limits=connection_limits())
+        else:
+            transport = sharded_transport(verify=certfile)
+        clients = [counting_client(transport, counters)] * 3
+    models = [ChatOpenAI(model="gpt-4o", base_url=base_url, http_async_client=c, max_retries=0) for c in clients]
+
+    latencies, queue = [], asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            started = time.perf_counter()
+            await models[i % 3].ainvoke([{"role": "user", "content": "Triage this email, please."}])
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    for c in set(clients):
+        await c.aclose()
+    latencies.sort()
+    return {
+        "setup": name,
+        **counters,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "throughput_rps": n_requests / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=600, help="chat completions per setup")
+    parser.add_argument("--concurrency", type=int, default=32, help="calls in flight")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the fake server takes per completion")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--serve", nargs=3, metavar=("PORT", "CERTFILE", "KEYFILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        port, certfile, keyfile = args.serve
+        serve(int(port), certfile, keyfile, args.latency)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = self_signed_certificate(directory)
+        port = free_port()
+        server = subprocess.Popen([sys.executable, __file__, "--serve", str(port), certfile, keyfile,
+                                   "--latency", str(args.latency)])
+        try:
+            wait_for_server(port)
+            base_url = f"https://127.0.0.1:{port}/v1"
+            results = [asyncio.run(run_setup(name, base_url, certfile, args.requests, args.concurrency))
+                       for name in SETUPS]
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    print(f"{args.requests} calls, {args.concurrency} in flight, server latency {args.latency * 1000:.0f} ms")
+    print(f"{'setup':<14}{'handshakes':>12}{'connects':>10}{'mean (ms)':>11}{'p50 (ms)':>10}{'p95 (ms)':>10}{'req/s':>8}")
+    for r in results:
+        print(f"{r['setup']:<14}{r['handshakes']:>12}{r['connects']:>10}{r['mean_ms']:>11.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['throughput_rps']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Per-request logging overhead of /process-email's graph.
+
+Runs ``aprocess_email`` sequentially against zero-latency stub LLMs, so the
+time per request is mostly graph and logging overhead, with the package
+logger at each level. Records go to /dev/null as JSON lines:
+
+* off     - WARNING, nothing on the hot path is formatted
+* info    - classification and per-node timing records
+* debug   - also the full graph states, what the old prints dumped every time
+
+Usage:
+    python benchmarks/bench_logging.py --requests 500 --rounds 5 --thread-kb 20
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.messages import AIMessage
+
+from email_assistant import agents
+from email_assistant.config import TRIAGE_CACHE_ENABLED
+from email_assistant.log import configure_logging
+from email_assistant.schemas import RouterSchema
+from email_assistant.triage_cache import triage_cache
+
+
+class StubRouter:
+    async def ainvoke(self, messages, config=None, **kwargs):
+        return RouterSchema(classification="respond", reasoning="benchmark", confidence=1.0)
+
+
+class StubToolModel:
+    """writes the email on the first call and calls Done on the second"""
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        if any(getattr(m, "type", None) == "tool" for m in messages):
+            return AIMessage(content="", tool_calls=[{"name": "Done", "args": {"done": True}, "id": "done"}])
+        args = {"to": "alice@company.com", "subject": "Re: benchmark", "body": "Thanks!"}
+        return AIMessage(content="", tool_calls=[{"name": "write_email", "args": args, "id": "write"}])
+
+
+async def run(n_requests, email):
+    timings = []
+    for _ in range(n_requests):
+        triage_cache.clear()
+        start = time.perf_counter()
+        await agents.aprocess_email(email)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="requests per level")
+    parser.add_argument("--rounds", type=int, default=5, help="the levels alternate this many times")
+    parser.add_argument("--thread-kb", type=int, default=20, help="size of the email thread, i.e. of the graph state")
+    args = parser.parse_args()
+
+    router, tool_model = StubRouter(), StubToolModel()
+    agents.get_llm_router = lambda: router
+    agents.get_llm_with_tools = lambda: tool_model
+    email = {
+        "author": "Alice Smith <alice.smith@company.com>",
+        "to": "John Doe <john.doe@company.com>",
+        "subject": "Quick question about API documentation",
+        "email_thread": ("Hi John, could we schedule a quick call this week? " * 20 + "\n") * args.thread_kb,
+    }
+
+    devnull = open(os.devnull, "w")
+    levels = (("off", "WARNING"), ("info", "INFO"), ("debug", "DEBUG"))
+    timings = {name: [] for name, _ in levels}
+    asyncio.run(run(20, email))  # warm up
+    # levels take turns so drift over the run (allocator, gc) doesn't favour the first one
+    for _ in range(args.rounds):
+        for name, level in levels:
+            configure_logging(level, stream=devnull)
+            timings[name] += asyncio.run(run(args.requests // args.rounds, email))
+    rows = [(name, statistics.median(t) * 1000, statistics.mean(t) * 1000) for name, t in timings.items()]
+
+    print(f"{args.requests} sequential requests, ~{args.thread_kb} KB email thread, triage cache {'cleared per request' if TRIAGE_CACHE_ENABLED else 'off'}")
+    print(f"{'logging':<10}{'p50 (ms)':>12}{'mean (ms)':>12}{'overhead vs off':>18}")
+    base = rows[0][1]
+    for name, p50, mean in rows:
+        print(f"{name:<10}{p50:>12.2f}{mean:>12.2f}{(p50 - base) / base:>17.0%}")
+
+
+if __name__ == "__main__":
+    main()
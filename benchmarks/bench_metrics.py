@@ -0,0 +1,61 @@
+"""Cost of recording the /metrics data for one request.
+
+A /process-email request that writes a reply records roughly: 4 node
+latencies, 1 tool latency, 1 loop-iteration observation, 1 classification
+and 4 token counters (plus about 6 checkpoint latencies on the HITL graph).
+This times exactly those calls, on their own registry, and the rendering of
+/metrics.
+
+Usage:
+    python benchmarks/bench_metrics.py --requests 100000
+"""
+
+import argparse
+import time
+
+from email_assistant.metrics import Counter, Histogram, Registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100_000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    nodes = Histogram("node_latency_seconds", "", ["node"], registry=registry)
+    tools = Histogram("tool_latency_seconds", "", ["tool", "status"], registry=registry)
+    checkpoints = Histogram("checkpoint_latency_seconds", "", ["operation"], registry=registry)
+    loop = Histogram("agent_loop_iterations", "", buckets=(1, 2, 3, 5, 10), registry=registry)
+    classifications = Counter("classifications", "", ["classification", "source"], registry=registry)
+    tokens = Counter("llm_tokens", "", ["prompt", "type"], registry=registry)
+
+    def one_request():
+        for node in ("triage_router", "llm_call", "tool_handler", "llm_call"):
+            nodes.labels(node).observe(0.2)
+        tools.labels("write_email", "ok").observe(0.001)
+        loop.observe(2)
+        classifications.labels("respond", "llm").inc()
+        for prompt in ("triage", "agent"):
+            tokens.labels(prompt, "prompt").inc(1200)
+            tokens.labels(prompt, "completion").inc(40)
+        for operation in ("get_tuple", "put", "put_writes", "put", "put_writes", "put"):
+            checkpoints.labels(operation).observe(0.002)
+
+    one_request()
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        one_request()
+    per_request_us = (time.perf_counter() - start) / args.requests * 1e6
+
+    start = time.perf_counter()
+    for _ in range(100):
+        registry.render()
+    render_ms = (time.perf_counter() - start) / 100 * 1000
+
+    print(f"recording one request's metrics (17 observations): {per_request_us:.1f} us")
+    print(f"per observation: {per_request_us / 17 * 1000:.0f} ns")
+    print(f"rendering /metrics: {render_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
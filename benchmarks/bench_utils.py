@@ -0,0 +1,118 @@
+"""Micro-benchmarks of the message-history hot paths, with a regression gate.
+
+Times ``messages_formatter``, ``extract_tool_calls``, ``_extract_final_result``
+and ``agents._format_process_result`` on synthetic threads of increasing size.
+Each thread repeats a response agent turn: AI tool call, tool result, and
+every few turns a human follow-up. The result is printed as microseconds per
+call and compared with benchmarks/baselines/utils.json.
+
+The run fails (exit status 1) when:
+
+* a timing is more than ``--tolerance`` slower than its baseline, or
+* the per-message cost at the largest size is more than ``--max-growth``
+  times the cost at the smallest size, i.e. a function stopped being linear
+
+Usage:
+    python benchmarks/bench_utils.py                    # compare against the baselines
+    python benchmarks/bench_utils.py --update-baseline  # record new baselines
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from email_assistant.agents import _format_process_result
+from email_assistant.utils import _extract_final_result, extract_tool_calls, messages_formatter
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "utils.json")
+SIZES = (10, 100, 500, 2000)
+
+
+def synthetic_history(n_messages: int) -> list:
+    """a thread with n_messages messages that ends with the written reply"""
+    messages = [HumanMessage(content="Respond to the email: \n\n **subject** : Quick question\n" + "Hi John, could we talk? " * 20)]
+    turn = 0
+    while len(messages) < n_messages:
+        turn += 1
+        name = ("check_calendar_availability", "write_email")[turn % 2]
+        args = {"to": "alice@company.com", "subject": f"Re: update {turn}", "body": "Thanks, see below. " * 10}
+        call = {"name": name, "args": args, "id": f"call_{turn}", "type": "tool_call"}
+        openai_call = {"id": f"call_{turn}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+        messages.append(AIMessage(content="", tool_calls=[call], additional_kwargs={"tool_calls": [openai_call]}))
+        messages.append(ToolMessage(content=f"Email sent to alice@company.com with subject Re: update {turn}", tool_call_id=f"call_{turn}"))
+        if turn % 5 == 0:
+            messages.append(HumanMessage(content="Please also mention the deadline."))
+    return messages[:n_messages]
+
+
+def cases(messages):
+    state = {"messages": messages, "classification_response": "respond"}
+    return {
+        "messages_formatter": lambda: messages_formatter(messages),
+        "extract_tool_calls": lambda: extract_tool_calls(messages),
+        "_extract_final_result": lambda: _extract_final_result(state),
+        "_format_process_result": lambda: _format_process_result(state),
+    }
+
+
+def measure(repeat: int) -> dict:
+    results = {}
+    for size in SIZES:
+        messages = synthetic_history(size)
+        for name, call in cases(messages).items():
+            timer = timeit.Timer(call)
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=repeat, number=number)) / number
+            results.setdefault(name, {})[str(size)] = best * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown against the baseline, 0.5 = 50%%")
+    parser.add_argument("--max-growth", type=float, default=3.0, help="allowed growth of the per-message cost")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = measure(args.repeat)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+
+    print(f"{'function':<24}{'messages':>10}{'us/call':>12}{'ns/message':>12}{'baseline us':>13}{'change':>9}")
+    failures = []
+    for name, by_size in results.items():
+        for size, micros in by_size.items():
+            base = baseline.get(name, {}).get(size)
+            change = f"{micros / base - 1:+.0%}" if base else "-"
+            print(f"{name:<24}{size:>10}{micros:>12.1f}{micros * 1000 / int(size):>12.0f}{base or float('nan'):>13.1f}{change:>9}")
+            if base and micros > base * (1 + args.tolerance):
+                failures.append(f"{name} at {size} messages: {micros:.1f} us vs baseline {base:.1f} us")
+        small, large = by_size[str(SIZES[0])] / SIZES[0], by_size[str(SIZES[-1])] / SIZES[-1]
+        if large > small * args.max_growth:
+            failures.append(f"{name}: per-message cost grows {large / small:.1f}x from {SIZES[0]} to {SIZES[-1]} messages")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({name: {size: round(v, 2) for size, v in by_size.items()} for name, by_size in results.items()}, f, indent=2)
+            f.write("\n")
+        print(f"baselines written to {BASELINE_PATH}")
+        return
+    for failure in failures:
+        print("FAIL:", failure)
+    if not failures:
+        print("OK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Async load generator for /process-email and /process-email-hitl.
+
+Replays the emails of email_test_dataset with ``--concurrency`` concurrent
+clients and reports throughput and p50 / p95 / p99 latency per call type.
+HITL workflows that stop at the notify interrupt are resumed with
+``--resume`` (ignore or response), and the resume call is measured separately.
+
+By default the app runs in this process (httpx ASGI transport) with the
+offline FakeChatModel, a temporary SQLite checkpointer, and the triage cache
+and rules turned off. The numbers then measure the FastAPI app and the graph
+with a known LLM latency, not OpenAI. Pass ``--url`` to load a running server
+instead; its own environment decides the provider.
+
+Usage:
+    python benchmarks/load_test.py --requests 400 --concurrency 32 --latency lognormal:0.5:0.2
+    python benchmarks/load_test.py --url http://localhost:8000 --endpoint hitl
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+
+def percentile(sorted_values, q):
+    """nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return math.nan
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def timed(self, name, call):
+        start = time.perf_counter()
+        try:
+            response = await call
+        except Exception:
+            self.errors[name] += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - start)
+        if response.status_code != 200:
+            self.errors[name] += 1
+            return None
+        return response.json()
+
+    def report(self, wall):
+        rows = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies[name])
+            rows[name] = {
+                "requests": len(values),
+                "errors": self.errors[name],
+                "throughput_rps": len(values) / wall,
+                "p50_ms": percentile(values, 50) * 1000,
+                "p95_ms": percentile(values, 95) * 1000,
+                "p99_ms": percentile(values, 99) * 1000,
+            }
+        return rows
+
+
+async def process_email(client, recorder, email, resume):
+    await recorder.timed("process-email", client.post("/process-email", json={"email_input": email}))
+
+
+async def process_email_hitl(client, recorder, email, resume):
+    started = await recorder.timed("hitl-start", client.post("/process-email-hitl", json={"email_input": email}))
+    if started and started["status"] == "interrupted":
+        body = {"thread_id": started["thread_id"], "human_response": {"type": resume, "args": "Please reply and confirm."}}
+        await recorder.timed("hitl-resume", client.post("/process-email-hitl", json=body))
+
+
+async def run(client, endpoints, n_requests, concurrency, resume):
+    from email_assistant.eval.email_test_dataset import email_inputs
+
+    # every email goes to every endpoint, so each endpoint sees the dataset's mix of classifications
+    work = iter(itertools.islice(itertools.cycle([(e, ep) for e in email_inputs for ep in endpoints]), n_requests))
+    recorder = Recorder()
+
+    async def worker():
+        for email, endpoint in work:
+            await endpoint(client, recorder, email, resume)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return recorder.report(wall), wall
+
+
+async def main_async(args):
+    import httpx
+
+    endpoints = {
+        "email": [process_email],
+        "hitl": [process_email_hitl],
+        "both": [process_email, process_email_hitl],
+    }[args.endpoint]
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        from email_assistant.log import configure_logging
+        from email_assistant.main import app
+
+        configure_logging("WARNING")
+        transport, base_url = httpx.ASGITransport(app=app), "http://load-test"
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        # one untimed pass builds the graphs and opens the checkpointer
+        await run(client, endpoints, len(endpoints), 1, args.resume)
+        return await run(client, endpoints, args.requests, args.concurrency, args.resume)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="workflows to start")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--endpoint", choices=["email", "hitl", "both"], default="both")
+    parser.add_argument("--resume", choices=["ignore", "response"], default="response", help="answer to HITL interrupts")
+    parser.add_argument("--latency", default="lognormal:0.3:0.1", help="fake LLM latency, distribution:mean[:jitter] in seconds")
+    parser.add_argument("--with-caches", action="store_true", help="keep the triage cache and rules on")
+    parser.add_argument("--speculative", action="store_true", help="draft speculatively alongside triage")
+    parser.add_argument("--url", help="load a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if not args.url:
+        # must be set before email_assistant.config is imported
+        os.environ["EMAIL_ASSISTANT_LLM_PROVIDER"] = "fake"
+        os.environ["EMAIL_ASSISTANT_FAKE_LLM_LATENCY"] = args.latency
+        os.environ.setdefault("EMAIL_ASSISTANT_CHECKPOINT_PATH", os.path.join(tempfile.mkdtemp(prefix="load-"), "checkpoints.sqlite"))
+        if args.speculative:
+            os.environ["EMAIL_ASSISTANT_SPECULATIVE_DRAFTING"] = "1"
+        if not args.with_caches:
+            os.environ["EMAIL_ASSISTANT_TRIAGE_CACHE"] = "0"
+            os.environ["EMAIL_ASSISTANT_TRIAGE_RULES"] = "0"
+
+    rows, wall = asyncio.run(main_async(args))
+    if args.json:
+        json.dump({"wall_seconds": wall, "calls": rows}, sys.stdout, indent=2)
+        print()
+        return
+    target = args.url or f"in-process app, fake LLM {args.latency}"
+    print(f"{args.requests} workflows, {args.concurrency} concurrent clients, {target}, {wall:.1f}s")
+    print(f"{'call':<16}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}")
+    for name, row in rows.items():
+        print(f"{name:<16}{row['requests']:>10}{row['errors']:>8}{row['throughput_rps']:>9.1f}"
+              f"{row['p50_ms']:>11.0f}{row['p95_ms']:>11.0f}{row['p99_ms']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
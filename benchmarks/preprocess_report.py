@@ -0,0 +1,96 @@
+"""Token reduction of the email preprocessing stage over email_test_dataset.
+
+For every dataset email, prints the estimated tokens of the email body before
+and after ``clean_email_body`` and the time the cleaning took. The dataset
+bodies are short and clean, so ``--reply-chains`` also wraps each one the way
+a real mailbox delivers it: as HTML, with a signature, a legal footer and the
+previous messages of the thread quoted below it.
+
+Usage:
+    python benchmarks/preprocess_report.py
+    python benchmarks/preprocess_report.py --reply-chains 3 --budget 1500 --json
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from email_assistant.eval.email_test_dataset import email_inputs, email_names
+from email_assistant.history import estimate_tokens
+from email_assistant.preprocessing import clean_email_body
+
+SIGNATURE = """
+--
+Lance Martin | Staff Engineer
+Company Inc. | 500 Market Street, San Francisco
++1 (555) 010-0199 | lance@company.com
+"""
+
+FOOTER = """
+CONFIDENTIALITY NOTICE: This e-mail and any attachments are confidential and intended solely for the use of
+the addressee. If you are not the intended recipient, please notify the sender and delete this e-mail. Any
+review, retransmission, dissemination or other use of this information by persons other than the intended
+recipient is prohibited. Company Inc. accepts no liability for the content of this e-mail.
+"""
+
+
+def as_reply_chain(email: dict, depth: int) -> str:
+    """the email body as HTML, signed, with `depth` earlier messages quoted below it"""
+    body = email["email_thread"] + "\n\nSent from my iPhone" + SIGNATURE + FOOTER
+    for level in range(depth):
+        quoted = "\n".join("> " * (level + 1) + line for line in (email["email_thread"] + SIGNATURE + FOOTER).splitlines())
+        body += f"\n\nOn Mon, Jun {3 + level}, 2024 at 9:{10 + level} AM {email['author']} wrote:\n{quoted}"
+    paragraphs = "".join(f"<p>{line}</p>" for line in body.split("\n"))
+    return f"<html><head><style>p {{margin: 0}}</style></head><body><div dir=\"ltr\">{paragraphs}</div></body></html>"
+
+
+def report(depth: int, budget: int) -> dict:
+    rows = []
+    for name, email in zip(email_names, email_inputs):
+        raw = as_reply_chain(email, depth) if depth else email["email_thread"]
+        clean_email_body.cache_clear()
+        started = time.perf_counter()
+        cleaned = clean_email_body(raw, budget)
+        elapsed = time.perf_counter() - started
+        rows.append({
+            "email": name,
+            "tokens_before": estimate_tokens(raw),
+            "tokens_after": estimate_tokens(cleaned),
+            "clean_us": elapsed * 1e6,
+        })
+    before = sum(row["tokens_before"] for row in rows)
+    after = sum(row["tokens_after"] for row in rows)
+    return {
+        "reply_chain_depth": depth,
+        "token_budget": budget,
+        "emails": rows,
+        "tokens_before": before,
+        "tokens_after": after,
+        "reduction": 1 - after / before if before else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reply-chains", type=int, default=0, metavar="DEPTH",
+                        help="wrap each email in HTML, a signature and DEPTH quoted earlier messages")
+    parser.add_argument("--budget", type=int, default=1500, help="token budget of the cleaned body")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    result = report(args.reply_chains, args.budget)
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+    print(f"{'email':<16}{'before':>8}{'after':>8}{'saved':>8}{'clean (us)':>12}")
+    for row in result["emails"]:
+        saved = row["tokens_before"] - row["tokens_after"]
+        print(f"{row['email']:<16}{row['tokens_before']:>8}{row['tokens_after']:>8}{saved:>8}{row['clean_us']:>12.0f}")
+    print(f"{'total':<16}{result['tokens_before']:>8}{result['tokens_after']:>8}"
+          f"{result['tokens_before'] - result['tokens_after']:>8}   ({result['reduction']:.0%} fewer tokens)")
+
+
+if __name__ == "__main__":
+    main()
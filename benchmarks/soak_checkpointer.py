@@ -0,0 +1,103 @@
+"""Soak test: memory and disk growth of the HITL checkpointer over many threads.
+
+Every thread is a notify email that stops at the triage interrupt and is never
+resumed, which is what an unanswered review looks like. The triage LLM is
+stubbed out. Each saver runs in its own process so RSS numbers don't mix:
+
+* memory - the old MemorySaver
+* sqlite - BoundedSqliteSaver, compacted every ``--compact-every`` threads
+  (what the background job does on a timer)
+
+Usage:
+    python benchmarks/soak_checkpointer.py --threads 100000 --max-checkpoints 20000
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def disk_mb(path: str) -> float:
+    return sum(os.path.getsize(p) for p in (path, path + "-wal", path + "-shm") if os.path.exists(p)) / 2**20
+
+
+def soak(saver_name: str, n_threads: int, report_every: int, compact_every: int, max_checkpoints: int) -> None:
+    db_path = os.path.join(tempfile.mkdtemp(prefix="soak-"), "checkpoints.sqlite")
+    os.environ["EMAIL_ASSISTANT_CHECKPOINT_PATH"] = db_path
+    os.environ["EMAIL_ASSISTANT_CHECKPOINT_MAX_CHECKPOINTS"] = str(max_checkpoints)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+    from langgraph.checkpoint.memory import MemorySaver
+
+    from email_assistant import agents_HITL
+    from email_assistant.schemas import RouterSchema
+
+    class StubRouter:
+        def invoke(self, messages, config=None, **kwargs):
+            return RouterSchema(classification="notify", reasoning="soak", confidence=1.0)
+
+    router = StubRouter()
+    agents_HITL.get_llm_router = lambda: router
+    graph = agents_HITL.compiled_email_assistant_hitl
+    if saver_name == "memory":
+        graph = graph.copy(update={"checkpointer": MemorySaver()})
+    saver = graph.checkpointer
+    if saver_name == "sqlite":
+        saver.stop_compaction()
+
+    email = {
+        "author": "System Admin <sysadmin@company.com>",
+        "to": "Development Team <dev@company.com>",
+        "subject": "Scheduled maintenance - database downtime",
+        "email_thread": "Production database maintenance tonight from 2AM to 4AM EST.\n" * 20,
+    }
+    start = time.perf_counter()
+    print(f"{'threads':>10}{'rss (MB)':>12}{'disk (MB)':>12}{'threads/s':>12}", flush=True)
+    for i in range(1, n_threads + 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            graph.invoke({"email_input": email}, {"configurable": {"thread_id": f"soak-{i}"}})
+        if saver_name == "sqlite" and i % compact_every == 0:
+            saver.compact()
+        if i % report_every == 0 or i == n_threads:
+            rate = i / (time.perf_counter() - start)
+            print(f"{i:>10}{rss_mb():>12.1f}{disk_mb(db_path):>12.1f}{rate:>12.0f}", flush=True)
+    if saver_name == "sqlite":
+        print("final", saver.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=100_000)
+    parser.add_argument("--report-every", type=int, default=10_000)
+    parser.add_argument("--compact-every", type=int, default=5_000)
+    parser.add_argument("--max-checkpoints", type=int, default=20_000)
+    parser.add_argument("--saver", choices=["memory", "sqlite"], help="run a single saver in this process")
+    args = parser.parse_args()
+
+    if args.saver:
+        soak(args.saver, args.threads, args.report_every, args.compact_every, args.max_checkpoints)
+        return
+    for saver_name in ("memory", "sqlite"):
+        print(f"\n== {saver_name} ==", flush=True)
+        subprocess.run([sys.executable, __file__, "--saver", saver_name, *sys.argv[1:]], check=True)
+
+
+if __name__ == "__main__":
+    main()
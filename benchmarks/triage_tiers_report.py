@@ -0,0 +1,136 @@
+"""Accuracy, latency and escalation rate of tiered triage against examples_triage.
+
+Every example is classified by both tiers: the small triage model
+(EMAIL_ASSISTANT_TRIAGE_MODEL) and the large model
+(EMAIL_ASSISTANT_LARGE_MODEL). The tiered decision is then replayed from those
+answers for each threshold: the large model's answer is used when the sender
+is a VIP or the small model's confidence is below the threshold. Its latency
+is the small call plus the large call when it escalated (only the large call
+for VIPs). Triage rules and the triage cache are not involved.
+
+The models come from the factory, so EMAIL_ASSISTANT_LLM_PROVIDER=fake runs it
+offline (both tiers are then the same fake model).
+
+Usage:
+    python benchmarks/triage_tiers_report.py --thresholds 0.5,0.7,0.9
+    python benchmarks/triage_tiers_report.py --json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+
+
+def percentile(sorted_values, q):
+    """nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return math.nan
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _latency(values):
+    values = sorted(values)
+    return {
+        "mean_ms": sum(values) / len(values) * 1000 if values else math.nan,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+    }
+
+
+async def _classify(router, email_input, semaphore):
+    from email_assistant.prompt_registry import unwrap_structured
+    from email_assistant.triage import triage_messages
+
+    async with semaphore:
+        started = time.perf_counter()
+        result = unwrap_structured("triage_report", await router.ainvoke(triage_messages(email_input)))
+        return result, time.perf_counter() - started
+
+
+async def run_tiers(concurrency):
+    from email_assistant.eval.email_test_dataset import examples_triage
+    from email_assistant.factory import get_llm_router, get_llm_router_escalation
+
+    small, large = get_llm_router(), get_llm_router_escalation() or get_llm_router()
+    semaphore = asyncio.Semaphore(concurrency)
+    emails = [example["inputs"]["email_input"] for example in examples_triage]
+    small_results = await asyncio.gather(*(_classify(small, email, semaphore) for email in emails))
+    large_results = await asyncio.gather(*(_classify(large, email, semaphore) for email in emails))
+    return [
+        {"email_input": email, "expected": example["outputs"]["classification"], "small": s, "large": l}
+        for email, example, s, l in zip(emails, examples_triage, small_results, large_results)
+    ]
+
+
+def tier_report(rows, tier):
+    correct = [row[tier][0].classification == row["expected"] for row in rows]
+    return {
+        "accuracy": sum(correct) / len(rows),
+        "mean_confidence": sum(row[tier][0].confidence for row in rows) / len(rows),
+        **_latency([row[tier][1] for row in rows]),
+    }
+
+
+def tiered_report(rows, threshold):
+    from email_assistant.triage import is_vip_sender
+
+    correct, latencies, reasons = 0, [], {"vip": 0, "low_confidence": 0}
+    for row in rows:
+        (small, small_s), (large, large_s) = row["small"], row["large"]
+        if is_vip_sender(row["email_input"]):
+            reasons["vip"] += 1
+            decision, latency = large, large_s
+        elif small.confidence < threshold:
+            reasons["low_confidence"] += 1
+            decision, latency = large, small_s + large_s
+        else:
+            decision, latency = small, small_s
+        correct += decision.classification == row["expected"]
+        latencies.append(latency)
+    escalated = sum(reasons.values())
+    return {
+        "threshold": threshold,
+        "accuracy": correct / len(rows),
+        "escalation_rate": escalated / len(rows),
+        "escalations": reasons,
+        **_latency(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--thresholds", default=None, help="comma separated escalation thresholds, default the configured one")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent LLM calls")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    from email_assistant.config import LARGE_MODEL, TRIAGE_ESCALATION_THRESHOLD, TRIAGE_MODEL
+
+    thresholds = [float(t) for t in args.thresholds.split(",")] if args.thresholds else [TRIAGE_ESCALATION_THRESHOLD]
+    rows = asyncio.run(run_tiers(args.concurrency))
+    result = {
+        "examples": len(rows),
+        "models": {"small": TRIAGE_MODEL, "large": LARGE_MODEL},
+        "tiers": {"small": tier_report(rows, "small"), "large": tier_report(rows, "large")},
+        "tiered": [tiered_report(rows, threshold) for threshold in thresholds],
+    }
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+    print(f"{len(rows)} examples, small={TRIAGE_MODEL}, large={LARGE_MODEL}")
+    print(f"{'tier':<22}{'accuracy':>10}{'escalated':>11}{'mean (ms)':>11}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for name, tier in result["tiers"].items():
+        print(f"{name:<22}{tier['accuracy']:>10.1%}{'':>11}{tier['mean_ms']:>11.0f}{tier['p50_ms']:>10.0f}{tier['p95_ms']:>10.0f}")
+    for tiered in result["tiered"]:
+        name = f"tiered @ {tiered['threshold']:.2f}"
+        print(f"{name:<22}{tiered['accuracy']:>10.1%}{tiered['escalation_rate']:>11.1%}"
+              f"{tiered['mean_ms']:>11.0f}{tiered['p50_ms']:>10.0f}{tiered['p95_ms']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,57 @@
+import asyncio
+import json
+import logging
+from collections import Counter
 from langgraph.graph import StateGraph, START, END
-from langchain.chat_models import init_chat_model
 from langgraph.types import Command 
+from langchain_core.runnables import RunnableLambda
 from typing import Literal , TypedDict, Annotated, List
 from langchain_core.messages import HumanMessage, AIMessage ,AnyMessage, ToolMessage, SystemMessage
-from email_assistant.schemas import State , RouterSchema
-from email_assistant.utils import email_parser , format_email_markdown
-from email_assistant.prompts import TRIAGE_SYSTEM_PROMPT, default_triage_instructions, default_background, TRIAGE_USER_PROMPT, Agent_system_prompt, DEFAULT_RESPONSE_PREFERENCES, DEFAULT_CAL_PREFERENCES
-from dotenv import load_dotenv
+from email_assistant.schemas import RouterSchema
+from email_assistant.state import State
+from email_assistant.preprocessing import preprocess_email
+from email_assistant.utils import email_parser , format_email_markdown, _tool_calls, _format_arguments
+from email_assistant.prompt_registry import prompt_registry
 from email_assistant.agent_tools import Tools
-from IPython.display import Image , display
+from email_assistant.tool_execution import run_tool_calls, arun_tool_calls
+from email_assistant.triage import classify_email, aclassify_email, abatch_classify_emails
+from email_assistant.config import AGENT_MAX_IDENTICAL_CALLS, AGENT_MAX_STEPS, AGENT_TERMINAL_TOOLS, BATCH_MAX_CONCURRENCY
+from email_assistant.factory import get_llm_router, get_llm_router_escalation, get_llm_with_tools, get_chat_model, get_response_agent, get_email_assistant
+from email_assistant.log import timed_node
+from email_assistant.metrics import AGENT_LLM_CALLS_SAVED, AGENT_LOOP_ITERATIONS, AGENT_STOPS, HISTORY_TOKENS_SAVED
+from email_assistant.history import compact_history
+from email_assistant.speculation import run_speculatively, sender_history
 
+logger = logging.getLogger(__name__)
 
-load_dotenv()
 
-#initial the llm:
-llm = init_chat_model(model= "gpt-4o", model_provider= "openai" , temperature = 0.0)
-
-#structured output:
-llm_router = llm.with_structured_output(RouterSchema)
-
-#llm with tools
+#the llms and compiled graphs are built lazily by email_assistant.factory and shared with agents_HITL
 tool_names = {tool.name: tool for tool in Tools}
-llm_with_tools = llm.bind_tools(Tools, tool_choice= "any") #we are forcing to call at least on tool
 
-def triage_router(state: State) :#-> Command[Literal["Ignore","Notify","Respond"] , dict ] :
-    """Analyze email content to classify it into ignore, notify and respond"""
-    print("state received at traigae router:",state)
-    author, to, subject, email_thread = email_parser(state["email_input"])
-    system_prompt = TRIAGE_SYSTEM_PROMPT.format(background = default_background, triage_instructions = default_triage_instructions)
-    user_prompt = TRIAGE_USER_PROMPT.format( author = author , to = to , subject = subject ,email_thread = email_thread)
+def _respond_message(email_input: dict) -> dict:
+    """the user message the response agent starts from"""
+    author, to, subject, email_thread = email_parser(preprocess_email(email_input))
+    return {
+        'role' : 'user',
+        'content' : f"Respond to the email: \n\n {format_email_markdown(subject,author,to,email_thread)}"
+    }
 
-    result = llm_router.invoke([
-        {"role":"system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}])
-    print(f"Classification result:", result.classification.upper())
+def _triage_command(state: State, result: RouterSchema, draft: AIMessage | None = None) -> Command:
+    """turns the triage classification into the routing command, a committed speculative draft
+    becomes the response agent's first model turn"""
+    logger.info("classification result: %s", result.classification, extra={"classification": result.classification})
 
     if result.classification == 'respond':
-        print("Routing to response agent...")
+        logger.debug("routing to response agent")
         go_to = "response_agent"
         update1= {'classification_response' : result.classification, 
-                 'messages': [
-                     {
-                         'role' : 'user',
-                         'content' : f"Respond to the email: \n\n {format_email_markdown(subject,author,to,email_thread)}"
-                     }
-                 ]}
+                 'messages': [_respond_message(state["email_input"])] + ([draft] if draft is not None else [])}
     elif result.classification == 'ignore':
-        print("Email has been ignored.")
+        logger.debug("email has been ignored")
         go_to = END
         update1= {'classification_response' : result.classification}
     elif result.classification == 'notify':
-        print("Email has been marked for notification")
+        logger.debug("email has been marked for notification")
         go_to = END
         update1= {'classification_response' : result.classification}
     else:
@@ -58,125 +59,243 @@ def triage_router(state: State) :#-> Command[Literal["Ignore","Notify","Respond"
     
     return Command(goto= go_to, update= update1)
 
+def triage_router(state: State) :#-> Command[Literal["Ignore","Notify","Respond"] , dict ] :
+    """Analyze email content to classify it into ignore, notify and respond"""
+    logger.debug("state received at triage router: %s", state)
+    result = classify_email(get_llm_router(), state["email_input"], get_llm_router_escalation)
+    sender_history.record(state["email_input"], result.classification)
+    return _triage_command(state, result)
+
+async def atriage_router(state: State) :
+    """async variant of triage_router, awaits the triage llm instead of blocking the event loop.
+
+    With speculative drafting on, the first drafting call runs alongside triage
+    for senders that are usually answered.
+    """
+    logger.debug("state received at triage router: %s", state)
+    email_input = state["email_input"]
+    result, draft = await run_speculatively(
+        email_input,
+        aclassify_email(get_llm_router(), email_input, get_llm_router_escalation),
+        get_llm_with_tools(),
+        [_respond_message(email_input)],
+    )
+    return _triage_command(state, result, draft)
+
+def _agent_messages(state : State) -> tuple:
+    """pre-rendered agent system prompt, the conversation compacted to the history budget, then today's date"""
+    history = compact_history(state["messages"])
+    if history.tokens_saved:
+        logger.debug("compacted %d tool results, %d -> %d estimated tokens", history.compacted_results,
+                     history.tokens_before, history.tokens_after)
+    return prompt_registry.agent_messages(history.messages), history.tokens_saved
+
+def _agent_update(response, tokens_saved : int) -> dict:
+    prompt_registry.record_usage("agent", response)
+    update = {"messages" : [response]}
+    if tokens_saved:
+        update["history_tokens_saved"] = tokens_saved
+    return update
+
 def llm_call(state : State) :
     
     """decides which tool to call or if the processing is done"""
-    # print("State received for routing ", state["messages"])
-    system_prompt = Agent_system_prompt.format(
-        background = default_background ,
-        response_preferences = DEFAULT_RESPONSE_PREFERENCES,
-        calendar_preferences = DEFAULT_CAL_PREFERENCES,
-    )
-    response = llm_with_tools.invoke([
-        {
-            "role" : "system" ,
-            "content" : system_prompt
-        }, ]
-        + state["messages"]
-    )
-    # print("response:", response)
-    return {"messages" : [response]}
+    messages, tokens_saved = _agent_messages(state)
+    response = get_llm_with_tools().invoke(messages)
+    return _agent_update(response, tokens_saved)
+
+async def allm_call(state : State) :
+    """async variant of llm_call"""
+    messages, tokens_saved = _agent_messages(state)
+    response = await get_llm_with_tools().ainvoke(messages)
+    return _agent_update(response, tokens_saved)
 
 def tool_handler(state: State) :
-    print("tool handler initiated.")
     last_message = state["messages"][-1]
-    # print("priting the last message:", last_message)
-    results = []
-    for tool_calls in last_message.tool_calls :
-        tool = tool_names[tool_calls["name"]]
-        observation = tool.invoke(tool_calls["args"])
-        results.append({"role": "tool", "content" : observation, "tool_call_id": tool_calls["id"]})
+    #tool calls of one turn run concurrently, results come back in tool_call order
+    results = run_tool_calls(last_message.tool_calls, tool_names)
     return {"messages": results}
 
-
-def should_continue(state: State) -> Literal["tool_handler", "__end__"]:
-    print("should continue started")
+async def atool_handler(state: State) :
+    """async variant of tool_handler"""
     last_message = state["messages"][-1]
-    if last_message.tool_calls:
-        for tool_call in last_message.tool_calls:
-            if tool_call["name"]== 'Done' :
-                print("the process has beenn completed.")
-                return END
-        print("going to tool handler")
-        return "tool_handler"
-    return END
+    results = await arun_tool_calls(last_message.tool_calls, tool_names)
+    return {"messages": results}
 
 
+def _end_of_loop(state: State, reason: str) -> str:
+    """records how the response agent run ended, its llm_call turns, and the tokens compaction saved"""
+    llm_calls = sum(isinstance(m, AIMessage) for m in state["messages"])
+    #ending right after a terminal tool skips the llm_call that would only have called Done
+    llm_calls_saved = 1 if reason == "terminal_tool" else 0
+    tokens_saved = state.get("history_tokens_saved") or 0
+    AGENT_LOOP_ITERATIONS.observe(llm_calls)
+    AGENT_STOPS.labels(reason).inc()
+    if llm_calls_saved:
+        AGENT_LLM_CALLS_SAVED.inc(llm_calls_saved)
+    HISTORY_TOKENS_SAVED.observe(tokens_saved)
+    logger.info("response agent finished", extra={
+        "stop_reason": reason, "llm_calls": llm_calls, "llm_calls_saved": llm_calls_saved,
+        "history_tokens_saved": tokens_saved,
+    })
+    return END
 
-#response_agent subgraph:
-response_agent = StateGraph(State)
-response_agent.add_node('llm_call',llm_call)
-response_agent.add_node('tool_handler', tool_handler)
+def _call_key(tool_call) -> tuple:
+    return tool_call["name"], json.dumps(tool_call["args"], sort_keys=True, default=str)
 
-response_agent.add_edge(START, "llm_call")
-response_agent.add_conditional_edges('llm_call',should_continue)
-response_agent.add_edge('tool_handler', 'llm_call')
+def _repeated_call(messages: list) -> bool:
+    """the last turn repeats a tool call (same name and arguments) already made AGENT_MAX_IDENTICAL_CALLS times"""
+    made = Counter(_call_key(tc) for m in messages[:-1] if isinstance(m, AIMessage) for tc in m.tool_calls)
+    return any(made[_call_key(tc)] >= AGENT_MAX_IDENTICAL_CALLS for tc in messages[-1].tool_calls)
 
-compiled_response_agent = response_agent.compile()
+def should_continue(state: State) -> Literal["tool_handler", "__end__"]:
+    last_message = state["messages"][-1]
+    if not last_message.tool_calls:
+        return _end_of_loop(state, "no_tool_call")
+    for tool_call in last_message.tool_calls:
+        if tool_call["name"]== 'Done' :
+            logger.debug("Done called, the process has been completed")
+            return _end_of_loop(state, "done")
+    if _repeated_call(state["messages"]):
+        logger.warning("the model repeated an identical tool call, ending the run",
+                       extra={"tool_calls": [tc["name"] for tc in last_message.tool_calls]})
+        return _end_of_loop(state, "repeated_call")
+    return "tool_handler"
+
+def after_tools(state: State) -> Literal["llm_call", "__end__"]:
+    """ends the run once a terminal tool (write_email) succeeded or the step budget is used up"""
+    messages = state["messages"]
+    turn = len(messages) - 1
+    while turn >= 0 and not isinstance(messages[turn], AIMessage):
+        turn -= 1
+    succeeded = {m.name for m in messages[turn + 1:] if isinstance(m, ToolMessage) and m.status != "error"}
+    if succeeded & AGENT_TERMINAL_TOOLS:
+        return _end_of_loop(state, "terminal_tool")
+    if sum(isinstance(m, AIMessage) for m in messages) >= AGENT_MAX_STEPS:
+        logger.warning("response agent step budget used up", extra={"max_steps": AGENT_MAX_STEPS})
+        return _end_of_loop(state, "step_budget")
+    return "llm_call"
+
+def _entry(state: State) -> Literal["llm_call", "tool_handler", "__end__"]:
+    """starts with llm_call, unless triage already committed a speculative draft as the first model turn"""
+    if isinstance(state["messages"][-1], AIMessage):
+        return should_continue(state)
+    return "llm_call"
+
+
+
+def _node(name : str, func, afunc) -> RunnableLambda:
+    """graph node with a sync and an async implementation, both timed and logged with the thread_id"""
+    timed = timed_node(name, logger)
+    return RunnableLambda(timed(func), afunc=timed(afunc), name=name)
+
+
+def build_response_agent():
+    """builds and compiles the response agent subgraph"""
+    #response_agent subgraph:
+    response_agent = StateGraph(State)
+    #every node gets a sync and an async implementation so both invoke() and ainvoke() work
+    response_agent.add_node('llm_call', _node('llm_call', llm_call, allm_call))
+    response_agent.add_node('tool_handler', _node('tool_handler', tool_handler, atool_handler))
+
+    response_agent.add_conditional_edges(START, _entry, ["llm_call", "tool_handler", END])
+    response_agent.add_conditional_edges('llm_call',should_continue)
+    response_agent.add_conditional_edges('tool_handler', after_tools)
+
+    return response_agent.compile()
 
 # save1 = compiled_graph.get_graph().draw_mermaid_png()
 # with open("graph.png" , "wb") as f:
 #     f.write(save1)
 
 
-# creating the workflow of our main graph:
-email_assistant = StateGraph(State)
+def build_email_assistant():
+    """builds and compiles the main triage + response graph"""
+    # creating the workflow of our main graph:
+    email_assistant = StateGraph(State)
 
-email_assistant.add_node('triage_router', triage_router)
-email_assistant.add_node('response_agent', compiled_response_agent )
+    email_assistant.add_node('triage_router', _node('triage_router', triage_router, atriage_router),
+                             destinations=('response_agent', END))
+    email_assistant.add_node('response_agent', get_response_agent() )
 
-email_assistant.add_edge(START, 'triage_router')
+    email_assistant.add_edge(START, 'triage_router')
 
-compiled_email_assistant = email_assistant.compile()
+    return email_assistant.compile()
 
 # save1 = compiled_email_assistant.get_graph(xray=True).draw_mermaid_png()
 # with open("compiled_email_asst.png" , "wb") as f:
 #     f.write(save1)
 
-def process_email(email_data : dict) :
-    result = compiled_email_assistant.invoke({ 'email_input': email_data})
+
+_LAZY_ATTRIBUTES = {
+    "llm": get_chat_model,
+    "llm_router": get_llm_router,
+    "llm_with_tools": get_llm_with_tools,
+    "compiled_response_agent": get_response_agent,
+    "compiled_email_assistant": get_email_assistant,
+}
+
+def __getattr__(name):
+    #keeps `from email_assistant.agents import compiled_email_assistant` working, built on first access
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def _format_process_result(result: dict) -> dict:
+    """pulls the classification and the written email out of the final graph state"""
     response_text = "no response generated"
-    # print(f"result by graph:" ,result)
-
-    if result.get("messages"):
-        # Look for the actual email content in tool calls (write_email tool)
-        for message in result["messages"]:
-            # print('##################################################')
-            # print("message:",message)
-            # Check if this is an assistant message with tool calls
-            if message.additional_kwargs :
-                for tool_call in message.additional_kwargs['tool_calls']:
-                    # print('###############################################')
-                    # print("tool_call:" , tool_call)
-                    # print(tool_call["function"]["name"])
-                    if tool_call["function"]["name"] == 'write_email':
-                        # Extract the email content from the tool arguments
-                        args = tool_call['function']['arguments']
-                        #email_content = args.get('content', '')
-                        if args:
-                            response_text = args
-                            break
-            # if response_text != "No response generated":
-            #     break
-            # # Fallback: look for assistant messages with actual content
-            # elif (hasattr(message, 'role') and message.role == "assistant" and 
-            #     hasattr(message, 'content') and message.content.strip()):
-            #     response_text = message.content
-            #     break
+    # the reply is the last write_email call, scan from the end and stop there
+    for message in reversed(result.get("messages") or []):
+        args = next((args for name, args in _tool_calls(message) if name == 'write_email' and args), None)
+        if args:
+            response_text = _format_arguments(args)
+            break
     answer = {
-    "classification": result.get("classification_decision", "unknown"),
-    "response": response_text,
-    "reasoning": f"Email classified as: {result.get('classification_decision', 'unknown')}"
-}
-    print(f"the final answer by processing the email is: {answer}")
-    
-    return {
     "classification": result.get("classification_response", "unknown"),
     "response": response_text,
     "reasoning": f"Email classified as: {result.get('classification_response', 'unknown')}"
 }
+    logger.debug("the final answer by processing the email is: %s", answer)
+    return answer
 
-
+def process_email(email_data : dict) :
+    result = get_email_assistant().invoke({ 'email_input': email_data})
+    return _format_process_result(result)
+
+async def aprocess_email(email_data : dict) :
+    """async variant of process_email, used by the FastAPI endpoints"""
+    result = await get_email_assistant().ainvoke({ 'email_input': email_data})
+    return _format_process_result(result)
+
+
+
+async def aprocess_email_batch(emails : List[dict], max_concurrency : int | None = None) -> List[dict] :
+    """Triages all emails with a single llm_router.abatch call and sends only the
+    'respond' ones on to the response agent.
+
+    Returns one dict per email, in input order. A failing email gets an 'error'
+    entry instead of failing the whole batch.
+    """
+    max_concurrency = max_concurrency or BATCH_MAX_CONCURRENCY
+    states = [{'email_input': email} for email in emails]
+    triage_results = await abatch_classify_emails(get_llm_router(), emails, max_concurrency, get_llm_router_escalation)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def finish(state : dict, triage) -> dict :
+        if isinstance(triage, Exception):
+            return {"error": f"Triage failed: {triage}"}
+        sender_history.record(state['email_input'], triage.classification)
+        try:
+            command = _triage_command(state, triage)
+            if command.goto != "response_agent":
+                return _format_process_result({'classification_response': triage.classification})
+            async with semaphore:
+                result = await get_response_agent().ainvoke({**state, **command.update})
+            return _format_process_result(result)
+        except Exception as e:
+            return {"error": f"Error processing email: {e}"}
+
+    return await asyncio.gather(*(finish(state, triage) for state, triage in zip(states, triage_results)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,285 @@
+"""Disk-backed, bounded checkpointer for the HITL graph.
+
+MemorySaver keeps every interrupted thread in process memory forever and
+loses them all on restart. BoundedSqliteSaver stores checkpoints in SQLite
+and a compaction pass keeps the database bounded:
+
+1. threads with no activity for ``ttl_seconds`` (abandoned reviews) are
+   deleted together with their background jobs (see jobs.py), unless a job is
+   still queued or running on them
+2. superseded checkpoints are dropped, only the latest checkpoint of each
+   thread / namespace is needed to resume an interrupt
+3. if more than ``max_checkpoints`` remain, the least recently active threads
+   without a queued or running job are evicted, so a resume in flight keeps
+   its checkpoints
+4. freed pages are returned to the OS (incremental vacuum, WAL truncate)
+
+Compaction runs on a background thread every ``compaction_interval`` seconds.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from email_assistant.config import (
+    CHECKPOINT_COMPACTION_INTERVAL_SECONDS,
+    CHECKPOINT_MAX_CHECKPOINTS,
+    CHECKPOINT_PATH,
+    CHECKPOINT_PRUNE_HISTORY,
+    CHECKPOINT_TTL_SECONDS,
+)
+from email_assistant.metrics import CHECKPOINT_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# threads a job is about to run or is running (jobs.UNFINISHED), compaction leaves them alone
+_BUSY_THREADS = "SELECT thread_id FROM jobs WHERE status IN ('queued', 'running')"
+
+class BoundedSqliteSaver(SqliteSaver):
+    """SqliteSaver with TTL expiry, a cap on stored checkpoints and background compaction.
+
+    The async methods run the sqlite calls in a worker thread so the graph can
+    be driven with ainvoke / astream without blocking the event loop.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        *,
+        ttl_seconds: float = CHECKPOINT_TTL_SECONDS,
+        max_checkpoints: int = CHECKPOINT_MAX_CHECKPOINTS,
+        prune_history: bool = CHECKPOINT_PRUNE_HISTORY,
+        clock=time.time,
+        **kwargs,
+    ):
+        super().__init__(conn, **kwargs)
+        self.ttl_seconds = ttl_seconds
+        self.max_checkpoints = max_checkpoints
+        self.prune_history = prune_history
+        self._clock = clock
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs) -> "BoundedSqliteSaver":
+        return cls(sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        # only takes effect on a fresh database, lets compaction hand pages back to the OS
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        super().setup()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS thread_activity (
+                thread_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS thread_activity_updated_at ON thread_activity (updated_at);
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                thread_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                callback_url TEXT,
+                owner TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_thread_id ON jobs (thread_id);
+            CREATE TABLE IF NOT EXISTS job_owners (
+                owner TEXT PRIMARY KEY,
+                heartbeat_at REAL NOT NULL
+            );
+            """
+        )
+
+    def _touch(self, config: RunnableConfig) -> None:
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (str(config["configurable"]["thread_id"]), self._clock()),
+            )
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        started = time.perf_counter()
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(config)
+        CHECKPOINT_LATENCY.labels("put").observe(time.perf_counter() - started)
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        started = time.perf_counter()
+        super().put_writes(config, writes, task_id, task_path)
+        self._touch(config)
+        CHECKPOINT_LATENCY.labels("put_writes").observe(time.perf_counter() - started)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        started = time.perf_counter()
+        checkpoint_tuple = super().get_tuple(config)
+        CHECKPOINT_LATENCY.labels("get_tuple").observe(time.perf_counter() - started)
+        return checkpoint_tuple
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+            cur.execute("DELETE FROM jobs WHERE thread_id = ?", (str(thread_id),))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def compact(self) -> Dict[str, int]:
+        """runs one compaction pass and returns how many threads / checkpoints it removed"""
+        with self.cursor() as cur:
+            expired = [
+                row[0]
+                for row in cur.execute(
+                    f"SELECT thread_id FROM thread_activity WHERE updated_at < ? AND thread_id NOT IN ({_BUSY_THREADS})",
+                    (self._clock() - self.ttl_seconds,),
+                )
+            ]
+            self._delete_threads(cur, expired)
+
+            pruned = 0
+            if self.prune_history:
+                pruned = cur.execute(
+                    """
+                    DELETE FROM checkpoints WHERE checkpoint_id < (
+                        SELECT MAX(latest.checkpoint_id) FROM checkpoints AS latest
+                        WHERE latest.thread_id = checkpoints.thread_id
+                          AND latest.checkpoint_ns = checkpoints.checkpoint_ns
+                    )
+                    """
+                ).rowcount
+                cur.execute(
+                    """
+                    DELETE FROM writes WHERE NOT EXISTS (
+                        SELECT 1 FROM checkpoints AS c
+                        WHERE c.thread_id = writes.thread_id
+                          AND c.checkpoint_ns = writes.checkpoint_ns
+                          AND c.checkpoint_id = writes.checkpoint_id
+                    )
+                    """
+                )
+
+            evicted = []
+            excess = cur.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0] - self.max_checkpoints
+            if excess > 0:
+                rows = cur.execute(
+                    f"""
+                    SELECT a.thread_id, COUNT(c.checkpoint_id) FROM thread_activity AS a
+                    LEFT JOIN checkpoints AS c ON c.thread_id = a.thread_id
+                    WHERE a.thread_id NOT IN ({_BUSY_THREADS})
+                    GROUP BY a.thread_id ORDER BY a.updated_at
+                    """
+                )
+                for thread_id, count in rows.fetchall():
+                    if excess <= 0:
+                        break
+                    evicted.append(thread_id)
+                    excess -= count
+                self._delete_threads(cur, evicted)
+
+        with self.lock:
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"expired_threads": len(expired), "pruned_checkpoints": pruned, "evicted_threads": len(evicted)}
+
+    @staticmethod
+    def _delete_threads(cur: sqlite3.Cursor, thread_ids: list) -> None:
+        params = [(thread_id,) for thread_id in thread_ids]
+        for table in ("checkpoints", "writes", "thread_activity", "jobs"):
+            cur.executemany(f"DELETE FROM {table} WHERE thread_id = ?", params)
+
+    def stats(self) -> Dict[str, int]:
+        with self.cursor(transaction=False) as cur:
+            return {
+                "threads": cur.execute("SELECT COUNT(*) FROM thread_activity").fetchone()[0],
+                "checkpoints": cur.execute("SELECT COUNT(*) FROM checkpoints").fetchone()[0],
+                "writes": cur.execute("SELECT COUNT(*) FROM writes").fetchone()[0],
+            }
+
+    def start_compaction(self, interval: float = CHECKPOINT_COMPACTION_INTERVAL_SECONDS) -> None:
+        """starts the background compaction thread (idempotent)"""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.compact()
+                except sqlite3.Error:
+                    logger.exception("checkpoint compaction failed")
+
+        self._compactor = threading.Thread(target=run, name="checkpoint-compaction", daemon=True)
+        self._compactor.start()
+
+    def stop_compaction(self) -> None:
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+
+def build_checkpointer(path: str = CHECKPOINT_PATH) -> BoundedSqliteSaver:
+    """checkpointer for the HITL graph, with background compaction already running"""
+    saver = BoundedSqliteSaver.from_path(path)
+    saver.start_compaction()
+    return saver
@@ -0,0 +1,129 @@
+"""Runtime settings for the email assistant, read from environment variables."""
+import os
+
+from dotenv import load_dotenv
+
+# the only load_dotenv call, every other module reads its settings from here
+load_dotenv()
+
+# max number of emails triaged / answered at the same time by /process-email/batch
+BATCH_MAX_CONCURRENCY = int(os.getenv("EMAIL_ASSISTANT_BATCH_CONCURRENCY", "8"))
+
+# triage cache: in-memory LRU+TTL tier, plus an optional SQLite tier when a path is set
+TRIAGE_CACHE_ENABLED = os.getenv("EMAIL_ASSISTANT_TRIAGE_CACHE", "1") != "0"
+TRIAGE_CACHE_MAX_ENTRIES = int(os.getenv("EMAIL_ASSISTANT_TRIAGE_CACHE_MAX_ENTRIES", "2048"))
+TRIAGE_CACHE_TTL_SECONDS = float(os.getenv("EMAIL_ASSISTANT_TRIAGE_CACHE_TTL_SECONDS", str(24 * 3600)))
+TRIAGE_CACHE_PATH = os.getenv("EMAIL_ASSISTANT_TRIAGE_CACHE_PATH") or None
+
+# rule-based pre-classifier, matches at or above the confidence threshold skip the triage LLM
+TRIAGE_RULES_ENABLED = os.getenv("EMAIL_ASSISTANT_TRIAGE_RULES", "1") != "0"
+TRIAGE_RULES_PATH = os.getenv("EMAIL_ASSISTANT_TRIAGE_RULES_PATH") or None
+TRIAGE_RULES_MIN_CONFIDENCE = float(os.getenv("EMAIL_ASSISTANT_TRIAGE_RULES_MIN_CONFIDENCE", "0.9"))
+
+# HITL checkpoints: SQLite file, abandoned-thread TTL, cap on stored checkpoints and compaction period
+CHECKPOINT_PATH = os.getenv("EMAIL_ASSISTANT_CHECKPOINT_PATH", "email_assistant_checkpoints.sqlite")
+CHECKPOINT_TTL_SECONDS = float(os.getenv("EMAIL_ASSISTANT_CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
+CHECKPOINT_MAX_CHECKPOINTS = int(os.getenv("EMAIL_ASSISTANT_CHECKPOINT_MAX_CHECKPOINTS", "100000"))
+CHECKPOINT_PRUNE_HISTORY = os.getenv("EMAIL_ASSISTANT_CHECKPOINT_PRUNE_HISTORY", "1") != "0"
+CHECKPOINT_COMPACTION_INTERVAL_SECONDS = float(os.getenv("EMAIL_ASSISTANT_CHECKPOINT_COMPACTION_INTERVAL_SECONDS", "300"))
+
+# tool calls of one model turn run concurrently, each with its own timeout
+TOOL_MAX_CONCURRENCY = int(os.getenv("EMAIL_ASSISTANT_TOOL_MAX_CONCURRENCY", "8"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("EMAIL_ASSISTANT_TOOL_TIMEOUT_SECONDS", "30"))
+#tools with side effects run one at a time and without a timeout: an abandoned call may still send
+#the email or book the meeting after the model was told it failed, and its retry would duplicate it
+TOOL_SIDE_EFFECT_TOOLS = frozenset(t.strip() for t in os.getenv("EMAIL_ASSISTANT_TOOL_SIDE_EFFECT_TOOLS", "write_email,schedule_meeting").split(",") if t.strip())
+
+# build the graphs in a background thread right after startup instead of on the first request
+WARM_UP_ON_STARTUP = os.getenv("EMAIL_ASSISTANT_WARM_UP", "1") != "0"
+
+# chat model provider: "openai", or "fake" for the offline FakeChatModel (load tests, local runs)
+LLM_PROVIDER = os.getenv("EMAIL_ASSISTANT_LLM_PROVIDER", "openai")
+# fake model latency as "distribution:mean_seconds[:jitter_seconds]", distribution is fixed|uniform|normal|lognormal
+FAKE_LLM_LATENCY = os.getenv("EMAIL_ASSISTANT_FAKE_LLM_LATENCY", "fixed:0")
+FAKE_LLM_SEED = int(os.environ["EMAIL_ASSISTANT_FAKE_LLM_SEED"]) if os.getenv("EMAIL_ASSISTANT_FAKE_LLM_SEED") else None
+
+# level of the structured JSON logs, records below it are never formatted
+LOG_LEVEL = os.getenv("EMAIL_ASSISTANT_LOG_LEVEL", "INFO")
+
+# response agent history sent to the model: the last turns stay verbatim, older tool results are
+# collapsed into one-line summaries while the estimated input is over the token budget (0 turns it off)
+HISTORY_TOKEN_BUDGET = int(os.getenv("EMAIL_ASSISTANT_HISTORY_TOKEN_BUDGET", "4000"))
+HISTORY_KEEP_TURNS = int(os.getenv("EMAIL_ASSISTANT_HISTORY_KEEP_TURNS", "2"))
+HISTORY_SUMMARY_CHARS = int(os.getenv("EMAIL_ASSISTANT_HISTORY_SUMMARY_CHARS", "160"))
+
+# email bodies are cleaned (HTML, quoted replies, signatures) and cut to this many estimated tokens
+# before triage and the response agent see them
+PREPROCESS_ENABLED = os.getenv("EMAIL_ASSISTANT_PREPROCESS", "1") != "0"
+PREPROCESS_TOKEN_BUDGET = int(os.getenv("EMAIL_ASSISTANT_PREPROCESS_TOKEN_BUDGET", "1500"))
+
+# tiered triage: a small model classifies first, the large (drafting) model is asked again when the
+# small model's confidence is below the threshold or the sender is a VIP (comma separated addresses
+# or @domains). Setting the triage model to the large model turns escalation off.
+TRIAGE_MODEL = os.getenv("EMAIL_ASSISTANT_TRIAGE_MODEL", "gpt-4o-mini")
+LARGE_MODEL = os.getenv("EMAIL_ASSISTANT_LARGE_MODEL", "gpt-4o")
+TRIAGE_ESCALATION_THRESHOLD = float(os.getenv("EMAIL_ASSISTANT_TRIAGE_ESCALATION_THRESHOLD", "0.7"))
+TRIAGE_VIP_SENDERS = [s.strip().lower() for s in os.getenv("EMAIL_ASSISTANT_TRIAGE_VIP_SENDERS", "").split(",") if s.strip()]
+
+# response agent loop limits: llm_call turns per run, how often the exact same tool call may be made,
+# and the tools after whose successful result the run ends without another llm_call (comma separated)
+AGENT_MAX_STEPS = int(os.getenv("EMAIL_ASSISTANT_AGENT_MAX_STEPS", "8"))
+AGENT_MAX_IDENTICAL_CALLS = int(os.getenv("EMAIL_ASSISTANT_AGENT_MAX_IDENTICAL_CALLS", "2"))
+AGENT_TERMINAL_TOOLS = frozenset(t.strip() for t in os.getenv("EMAIL_ASSISTANT_AGENT_TERMINAL_TOOLS", "write_email").split(",") if t.strip())
+
+# speculative drafting (async graph only): the first drafting call starts together with triage when the
+# sender's respond rate is at least the threshold; senders need a few triaged emails before their own
+# rate is used, until then their domain's or the overall rate decides
+SPECULATIVE_DRAFTING = os.getenv("EMAIL_ASSISTANT_SPECULATIVE_DRAFTING", "0") == "1"
+SPECULATION_THRESHOLD = float(os.getenv("EMAIL_ASSISTANT_SPECULATION_THRESHOLD", "0.7"))
+SPECULATION_MIN_OBSERVATIONS = int(os.getenv("EMAIL_ASSISTANT_SPECULATION_MIN_OBSERVATIONS", "3"))
+SPECULATION_HISTORY_MAX_SENDERS = int(os.getenv("EMAIL_ASSISTANT_SPECULATION_HISTORY_MAX_SENDERS", "10000"))
+
+# background HITL jobs (/process-email-hitl/jobs): how many run at once, timeout of the completion callback
+JOB_MAX_CONCURRENCY = int(os.getenv("EMAIL_ASSISTANT_JOB_MAX_CONCURRENCY", "16"))
+JOB_CALLBACK_TIMEOUT_SECONDS = float(os.getenv("EMAIL_ASSISTANT_JOB_CALLBACK_TIMEOUT_SECONDS", "10"))
+# callback_url must be http(s) and match one of these (comma separated): a host name ("hooks.example.com"),
+# a host and port ("hooks.example.com:8443") or a URL prefix ("https://hooks.example.com/email/").
+# Empty (the default) turns callbacks off
+JOB_CALLBACK_ALLOWED_HOSTS = [h.strip() for h in os.getenv("EMAIL_ASSISTANT_JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()]
+# every process heartbeats the jobs it runs; unfinished jobs of a process silent for longer than
+# the lease (a crashed worker) are marked failed when a worker starts
+JOB_OWNER_LEASE_SECONDS = float(os.getenv("EMAIL_ASSISTANT_JOB_OWNER_LEASE_SECONDS", "60"))
+
+# ingestion queue (/ingest): worker pool size, queued + running items before 503s, attempts per email
+# on transient LLM errors with exponential backoff and full jitter, dead letters kept, and an optional
+# SQLite file that keeps the queue across restarts (in memory when unset)
+WORK_QUEUE_WORKERS = int(os.getenv("EMAIL_ASSISTANT_WORK_QUEUE_WORKERS", "4"))
+WORK_QUEUE_MAX_SIZE = int(os.getenv("EMAIL_ASSISTANT_WORK_QUEUE_MAX_SIZE", "1000"))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv("EMAIL_ASSISTANT_WORK_QUEUE_MAX_ATTEMPTS", "4"))
+WORK_QUEUE_BACKOFF_BASE_SECONDS = float(os.getenv("EMAIL_ASSISTANT_WORK_QUEUE_BACKOFF_BASE_SECONDS", "1"))
+WORK_QUEUE_BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_ASSISTANT_WORK_QUEUE_BACKOFF_MAX_SECONDS", "60"))
+WORK_QUEUE_MAX_DEAD_LETTERS = int(os.getenv("EMAIL_ASSISTANT_WORK_QUEUE_MAX_DEAD_LETTERS", "1000"))
+WORK_QUEUE_PATH = os.getenv("EMAIL_ASSISTANT_WORK_QUEUE_PATH") or None
+# on shutdown the workers get this long to empty the queue before they are cancelled
+WORK_QUEUE_DRAIN_SECONDS = float(os.getenv("EMAIL_ASSISTANT_WORK_QUEUE_DRAIN_SECONDS", "10"))
+
+# client-side limits shared by every chat-model call: requests and tokens per minute (0 is unlimited),
+# a call takes its estimated prompt plus this many output tokens until its reported usage is known, and
+# the concurrency limit that is halved on 429s and grows back on successful calls
+LLM_RATE_LIMIT_ENABLED = os.getenv("EMAIL_ASSISTANT_LLM_RATE_LIMIT", "1") != "0"
+LLM_RPM = float(os.getenv("EMAIL_ASSISTANT_LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("EMAIL_ASSISTANT_LLM_TPM", "0"))
+LLM_OUTPUT_TOKENS_ESTIMATE = int(os.getenv("EMAIL_ASSISTANT_LLM_OUTPUT_TOKENS_ESTIMATE", "256"))
+LLM_MAX_CONCURRENCY = int(os.getenv("EMAIL_ASSISTANT_LLM_MAX_CONCURRENCY", "64"))
+LLM_MIN_CONCURRENCY = int(os.getenv("EMAIL_ASSISTANT_LLM_MIN_CONCURRENCY", "1"))
+
+# HTTP connection pool shared by every chat model (split into shards), HTTP/2 needs the optional h2 package; per-model
+# request timeouts (drafting and judging, triage), retries of the OpenAI SDK, and the grader's model
+LLM_MAX_CONNECTIONS = int(os.getenv("EMAIL_ASSISTANT_LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("EMAIL_ASSISTANT_LLM_MAX_KEEPALIVE_CONNECTIONS", "40"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("EMAIL_ASSISTANT_LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+LLM_HTTP2 = os.getenv("EMAIL_ASSISTANT_LLM_HTTP2", "0") == "1"
+LLM_POOL_SHARDS = max(1, int(os.getenv("EMAIL_ASSISTANT_LLM_POOL_SHARDS", "4")))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("EMAIL_ASSISTANT_LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("EMAIL_ASSISTANT_LLM_TIMEOUT_SECONDS", "60"))
+TRIAGE_TIMEOUT_SECONDS = float(os.getenv("EMAIL_ASSISTANT_TRIAGE_TIMEOUT_SECONDS", "20"))
+LLM_MAX_RETRIES = int(os.getenv("EMAIL_ASSISTANT_LLM_MAX_RETRIES", "2"))
+JUDGE_MODEL = os.getenv("EMAIL_ASSISTANT_JUDGE_MODEL", "gpt-4o")
+#persistent LLM-as-judge verdicts of the eval runner, empty disables the cache
+EVAL_VERDICT_CACHE_PATH = os.getenv("EMAIL_ASSISTANT_EVAL_VERDICT_CACHE_PATH", "eval_verdicts.sqlite")
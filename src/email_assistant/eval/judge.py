@@ -0,0 +1,49 @@
+"""LLM-as-judge grading of one assistant run against its response criteria.
+
+The transcript the judge reads is the triage decision followed by the
+response agent's messages (the email, every tool call with its arguments and
+the tool results), so the "no response needed" criteria of ignored and
+notified emails can be graded too.
+"""
+from typing import Optional
+
+from email_assistant.prompts import RESPONSE_CRITERIA_SYSTEM_PROMPT
+from email_assistant.prompt_registry import unwrap_structured
+from email_assistant.schemas import EVAL_SCHEMA
+from email_assistant.utils import messages_formatter
+
+
+def transcript(result: dict) -> str:
+    """what the judge reads of a final graph state"""
+    classification = result.get("classification_response", "unknown")
+    messages = result.get("messages") or []
+    if not messages:
+        return f"TRIAGE : email classified as {classification}, no response written"
+    return f"TRIAGE : email classified as {classification}\n\n{messages_formatter(messages)}"
+
+
+def judge_messages(transcript_text: str, criteria: str) -> list:
+    return [
+        {"role": "system", "content": RESPONSE_CRITERIA_SYSTEM_PROMPT},
+        {"role": "user", "content": f"""Response Criteria: {criteria} \n
+          assistant message: {transcript_text} \n
+          evaluate whether assistant response meet the response criteria and provide justification for your evaluation."""},
+    ]
+
+
+def _judge(llm):
+    if llm is not None:
+        return llm
+    from email_assistant.factory import get_llm_judge
+
+    return get_llm_judge()
+
+
+def grade(transcript_text: str, criteria: str, llm=None, config: Optional[dict] = None) -> EVAL_SCHEMA:
+    result = _judge(llm).invoke(judge_messages(transcript_text, criteria), config=config)
+    return unwrap_structured("judge", result)
+
+
+async def agrade(transcript_text: str, criteria: str, llm=None, config: Optional[dict] = None) -> EVAL_SCHEMA:
+    result = await _judge(llm).ainvoke(judge_messages(transcript_text, criteria), config=config)
+    return unwrap_structured("judge", result)
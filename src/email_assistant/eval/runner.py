@@ -0,0 +1,226 @@
+"""Offline evaluation of the email assistant over the whole test dataset.
+
+Runs the triage + response graph on every email of ``email_test_dataset`` and
+grades each run with the LLM-as-judge (``EVAL_SCHEMA``) against the example's
+response criteria, ``--concurrency`` examples at a time.
+
+Verdicts are cached in EMAIL_ASSISTANT_EVAL_VERDICT_CACHE_PATH (``--verdict-cache``,
+see verdict_cache), a run whose transcript and criteria were already graded by
+the same judge model and prompt reuses the verdict instead of calling the
+judge. The report counts the verdicts that came from the cache.
+
+Every graded example is appended to the ``--output`` JSONL file as soon as it
+finishes, so an interrupted run picks up where it stopped: examples already in
+the file are skipped, examples that errored are run again. ``--fresh`` starts
+over.
+
+The summary prints the pass rate, the triage accuracy, per-example latency and
+the token cost of the graph and of the judge (prices per million tokens in
+PRICES_PER_MILLION, models matched by name prefix).
+
+Usage:
+    python -m email_assistant.eval.runner --concurrency 8 --output eval_results.jsonl
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+
+from email_assistant.config import EVAL_VERDICT_CACHE_PATH
+from email_assistant.eval import judge
+from email_assistant.eval.email_test_dataset import email_inputs, email_names, response_criteria_list, triage_outputs_list
+from email_assistant.eval.verdict_cache import VerdictCache, judge_model_id, verdict_cache_key
+
+#(input, output) USD per million tokens
+PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+
+def price(model_name: str):
+    """prices of the longest PRICES_PER_MILLION entry `model_name` starts with, (0, 0) when unknown"""
+    matches = [name for name in PRICES_PER_MILLION if model_name.startswith(name)]
+    if not matches:
+        return (0.0, 0.0)
+    return PRICES_PER_MILLION[max(matches, key= len)]
+
+
+def usage_cost(usage: Dict[str, dict]) -> float:
+    """USD cost of a UsageMetadataCallbackHandler's usage_metadata"""
+    cost = 0.0
+    for model_name, tokens in usage.items():
+        input_price, output_price = price(model_name)
+        cost += tokens.get("input_tokens", 0) * input_price + tokens.get("output_tokens", 0) * output_price
+    return cost / 1_000_000
+
+
+def _tokens(usage: Dict[str, dict]) -> Dict[str, int]:
+    return {
+        "input_tokens": sum(t.get("input_tokens", 0) for t in usage.values()),
+        "output_tokens": sum(t.get("output_tokens", 0) for t in usage.values()),
+    }
+
+
+def examples(limit: Optional[int] = None) -> List[dict]:
+    items = [
+        {"index": i, "example": name, "email_input": email, "criteria": criteria, "expected": expected}
+        for i, (name, email, criteria, expected) in enumerate(
+            zip(email_names, email_inputs, response_criteria_list, triage_outputs_list))
+    ]
+    return items[:limit] if limit is not None else items
+
+
+def load_results(path: str) -> Dict[str, dict]:
+    """the last recorded result of each example, a line cut off by an interrupted write is ignored"""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[record["example"]] = record
+    return results
+
+
+async def run_example(item: dict, graph, judge_llm, verdicts: Optional[VerdictCache] = None,
+                      judge_model: Optional[str] = None) -> dict:
+    record = {"example": item["example"], "index": item["index"], "expected": item["expected"],
+              "classification": None, "grade": None, "justification": None, "verdict_cached": False,
+              "latency_s": None, "judge_latency_s": None, "tokens": {}, "cost_usd": 0.0, "error": None}
+    agent_usage, judge_usage = UsageMetadataCallbackHandler(), UsageMetadataCallbackHandler()
+    try:
+        started = time.perf_counter()
+        state = await graph.ainvoke({"email_input": item["email_input"]}, config={"callbacks": [agent_usage]})
+        record["latency_s"] = round(time.perf_counter() - started, 4)
+        record["classification"] = state.get("classification_response")
+
+        transcript = judge.transcript(state)
+        key = verdict_cache_key(transcript, item["criteria"], judge_model) if verdicts is not None else None
+        started = time.perf_counter()
+        verdict = verdicts.get(key) if verdicts is not None else None
+        record["verdict_cached"] = verdict is not None
+        if verdict is None:
+            verdict = await judge.agrade(transcript, item["criteria"], llm= judge_llm,
+                                         config={"callbacks": [judge_usage]})
+            if verdicts is not None:
+                verdicts.put(key, verdict)
+        record["judge_latency_s"] = round(time.perf_counter() - started, 4)
+        record["grade"], record["justification"] = verdict.grade, verdict.justification
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["tokens"] = {"agent": _tokens(agent_usage.usage_metadata), "judge": _tokens(judge_usage.usage_metadata)}
+    record["cost_usd"] = round(usage_cost(agent_usage.usage_metadata) + usage_cost(judge_usage.usage_metadata), 6)
+    return record
+
+
+async def run_eval(output: str, concurrency: int = 4, limit: Optional[int] = None, fresh: bool = False,
+                   graph=None, judge_llm=None, verdicts: Optional[VerdictCache] = None,
+                   judge_model: Optional[str] = None) -> List[dict]:
+    """grades every example not yet in `output`, returns the results of all examples in dataset order
+
+    `judge_model` names the judge in the verdict cache key, the configured provider and model by default.
+    """
+    if graph is None:
+        from email_assistant.factory import get_email_assistant
+        graph = get_email_assistant()
+    if fresh and os.path.exists(output):
+        os.remove(output)
+    judge_model = judge_model or judge_model_id()
+
+    done = {name: r for name, r in load_results(output).items() if r.get("error") is None}
+    todo = [item for item in examples(limit) if item["example"] not in done]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    with open(output, "a+") as f:
+        #finish a line cut off by an interrupted write, the next record must start on a line of its own
+        if f.tell() > 0:
+            f.seek(f.tell() - 1)
+            if f.read(1) != "\n":
+                f.write("\n")
+
+        async def worker(item):
+            async with semaphore:
+                record = await run_example(item, graph, judge_llm, verdicts, judge_model)
+            #one write per line, a crash leaves at most one partial line behind
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            done[record["example"]] = record
+            return record
+
+        await asyncio.gather(*(worker(item) for item in todo))
+
+    return [done[item["example"]] for item in examples(limit) if item["example"] in done]
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+
+def summarize(results: List[dict]) -> dict:
+    graded = [r for r in results if r.get("error") is None]
+    latencies = [r["latency_s"] for r in graded]
+    return {
+        "examples": len(results),
+        "errors": len(results) - len(graded),
+        "verdicts_cached": sum(bool(r.get("verdict_cached")) for r in graded),
+        "pass_rate": sum(r["grade"] for r in graded) / len(graded) if graded else 0.0,
+        "triage_accuracy": sum(r["classification"] == r["expected"] for r in graded) / len(graded) if graded else 0.0,
+        "latency_mean_s": sum(latencies) / len(latencies) if latencies else 0.0,
+        "latency_p50_s": percentile(latencies, 50) if latencies else 0.0,
+        "latency_p95_s": percentile(latencies, 95) if latencies else 0.0,
+        "input_tokens": sum(t.get("input_tokens", 0) for r in results for t in r["tokens"].values()),
+        "output_tokens": sum(t.get("output_tokens", 0) for r in results for t in r["tokens"].values()),
+        "cost_usd": sum(r["cost_usd"] for r in results),
+    }
+
+
+def print_report(results: List[dict]) -> None:
+    print(f"{'example':<16}{'triage':>10}{'expected':>10}{'grade':>7}{'latency (s)':>13}{'tokens':>9}{'cost ($)':>11}")
+    for r in results:
+        grade = "ERROR" if r["error"] else ("PASS" if r["grade"] else "FAIL") + ("*" if r.get("verdict_cached") else "")
+        tokens = sum(t.get("input_tokens", 0) + t.get("output_tokens", 0) for t in r["tokens"].values())
+        latency = f"{r['latency_s']:.2f}" if r["latency_s"] is not None else "-"
+        print(f"{r['example']:<16}{str(r['classification']):>10}{r['expected']:>10}{grade:>7}"
+              f"{latency:>13}{tokens:>9}{r['cost_usd']:>11.4f}")
+        if r["error"]:
+            print(f"    {r['error']}")
+    s = summarize(results)
+    print()
+    print(f"pass rate {s['pass_rate']:.1%} ({s['examples'] - s['errors']} graded, {s['errors']} errors), "
+          f"triage accuracy {s['triage_accuracy']:.1%}")
+    print(f"verdicts from the cache (*) {s['verdicts_cached']}, graded by the judge {s['examples'] - s['errors'] - s['verdicts_cached']}")
+    print(f"latency mean {s['latency_mean_s']:.2f}s p50 {s['latency_p50_s']:.2f}s p95 {s['latency_p95_s']:.2f}s")
+    print(f"tokens {s['input_tokens']} in / {s['output_tokens']} out, cost ${s['cost_usd']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="examples run at the same time")
+    parser.add_argument("--output", default="eval_results.jsonl", help="JSONL file the results are appended to")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N examples")
+    parser.add_argument("--fresh", action="store_true", help="discard the results of a previous run")
+    parser.add_argument("--verdict-cache", default=EVAL_VERDICT_CACHE_PATH,
+                        help="SQLite file of cached judge verdicts, empty to always call the judge")
+    args = parser.parse_args()
+
+    verdicts = VerdictCache(args.verdict_cache) if args.verdict_cache else None
+    try:
+        results = asyncio.run(run_eval(args.output, args.concurrency, args.limit, args.fresh, verdicts= verdicts))
+    finally:
+        if verdicts is not None:
+            verdicts.close()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
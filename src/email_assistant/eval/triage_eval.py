@@ -0,0 +1,159 @@
+"""Local triage evaluation over ``examples_triage``, no LangSmith needed.
+
+Classifies every example the way the triage_router node does (triage rules,
+the small router, escalation to the large model) with ``--concurrency``
+emails in flight. The triage cache is bypassed, so every email reaches the
+router and the latencies belong to the configured model and prompt. The
+report is JSON:
+
+* accuracy and a confusion matrix over ignore / notify / respond (rows are
+  the expected class, columns the predicted one)
+* precision and recall per class, null when a class was never predicted or
+  never expected
+* p50 / p95 / mean triage latency and the wall time of the run
+* accuracy and latency per source: ``rule`` (answered by a triage rule, no
+  LLM call), ``llm`` (the small triage model) and ``escalated`` (VIP or
+  low-confidence emails answered by the large model), so rule hits and
+  escalations do not blur the small model's numbers
+* the triage model, the escalation model and the prompt version, so runs of
+  different models and prompts can be compared side by side
+
+Usage:
+    EMAIL_ASSISTANT_TRIAGE_MODEL=gpt-4o-mini python -m email_assistant.eval.triage_eval --concurrency 8 --output triage.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+from email_assistant.eval.email_test_dataset import examples_triage
+from email_assistant.eval.runner import percentile
+
+LABELS = ("ignore", "notify", "respond")
+SOURCES = ("rule", "llm", "escalated")
+
+
+def confusion_matrix(expected: Sequence[str], predicted: Sequence[str], labels: Sequence[str] = LABELS) -> Dict[str, Dict[str, int]]:
+    """counts[expected][predicted]"""
+    matrix = {e: {p: 0 for p in labels} for e in labels}
+    for e, p in zip(expected, predicted):
+        matrix[e][p] += 1
+    return matrix
+
+
+def per_class_metrics(matrix: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, Optional[float]]]:
+    metrics = {}
+    for label in matrix:
+        true_positives = matrix[label][label]
+        predicted = sum(row[label] for row in matrix.values())
+        support = sum(matrix[label].values())
+        metrics[label] = {
+            "precision": true_positives / predicted if predicted else None,
+            "recall": true_positives / support if support else None,
+            "support": support,
+        }
+    return metrics
+
+
+async def classify_examples(examples: List[dict], concurrency: int = 4, router=None, escalate=None) -> List[dict]:
+    """triage of every example, `router` / `escalate` default to the factory's routers"""
+    from email_assistant.triage import aclassify_email_with_source
+
+    if router is None:
+        from email_assistant.factory import get_llm_router, get_llm_router_escalation
+        router, escalate = get_llm_router(), get_llm_router_escalation
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def classify(index, example):
+        email_input = example["inputs"]["email_input"]
+        record = {"index": index, "subject": email_input.get("subject", ""),
+                  "expected": example["outputs"]["classification"], "predicted": None, "source": None,
+                  "latency_s": None, "error": None}
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result, record["source"] = await aclassify_email_with_source(router, email_input, escalate, use_cache= False)
+                record["predicted"] = result.classification
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+            record["latency_s"] = round(time.perf_counter() - started, 4)
+        return record
+
+    return await asyncio.gather(*(classify(i, example) for i, example in enumerate(examples)))
+
+
+def _accuracy(records: List[dict]) -> Optional[float]:
+    return sum(r["expected"] == r["predicted"] for r in records) / len(records) if records else None
+
+
+def _latency(records: List[dict]) -> Dict[str, Optional[float]]:
+    latencies = [r["latency_s"] for r in records]
+    return {
+        "p50": percentile(latencies, 50) if latencies else None,
+        "p95": percentile(latencies, 95) if latencies else None,
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+    }
+
+
+def per_source(records: List[dict]) -> Dict[str, dict]:
+    """count, accuracy and latency of the classified records of every source"""
+    result = {}
+    for source in SOURCES:
+        matching = [r for r in records if r["error"] is None and r["source"] == source]
+        result[source] = {"examples": len(matching), "accuracy": _accuracy(matching), "latency_s": _latency(matching)}
+    return result
+
+
+def report(records: List[dict], wall_time_s: float, concurrency: int) -> dict:
+    from email_assistant.config import LARGE_MODEL, LLM_PROVIDER, TRIAGE_ESCALATION_THRESHOLD, TRIAGE_MODEL
+    from email_assistant.prompt_registry import triage_prompt_version
+
+    classified = [r for r in records if r["error"] is None]
+    matrix = confusion_matrix([r["expected"] for r in classified], [r["predicted"] for r in classified])
+    escalates = TRIAGE_MODEL != LARGE_MODEL
+    return {
+        "model": f"{LLM_PROVIDER}:{TRIAGE_MODEL}",
+        "escalation_model": f"{LLM_PROVIDER}:{LARGE_MODEL}" if escalates else None,
+        "escalation_threshold": TRIAGE_ESCALATION_THRESHOLD if escalates else None,
+        "prompt_version": triage_prompt_version(),
+        "concurrency": concurrency,
+        "examples": len(records),
+        "errors": len(records) - len(classified),
+        "accuracy": _accuracy(classified),
+        "labels": list(LABELS),
+        "confusion_matrix": matrix,
+        "per_class": per_class_metrics(matrix),
+        "latency_s": _latency(classified),
+        "per_source": per_source(records),
+        "wall_time_s": round(wall_time_s, 4),
+        "mismatches": [r for r in records if r["error"] is not None or r["expected"] != r["predicted"]],
+    }
+
+
+async def evaluate(concurrency: int = 4, limit: Optional[int] = None, router=None, escalate=None) -> dict:
+    examples = examples_triage[:limit] if limit is not None else examples_triage
+    started = time.perf_counter()
+    records = await classify_examples(examples, concurrency, router, escalate)
+    return report(records, time.perf_counter() - started, concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="emails classified at the same time")
+    parser.add_argument("--limit", type=int, default=None, help="only the first N examples")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    result = asyncio.run(evaluate(args.concurrency, args.limit))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
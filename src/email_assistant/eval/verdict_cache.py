@@ -0,0 +1,89 @@
+"""Persistent cache of LLM-as-judge verdicts.
+
+A verdict only depends on what the judge reads, so the key is a hash of the
+transcript (the triage decision plus the ``messages_formatter`` output), the
+response criteria, the judge model and the judge prompt version. Re-running
+the eval after changing the agent only sends the transcripts that actually
+changed to the grader. Editing RESPONSE_CRITERIA_SYSTEM_PROMPT or switching
+the judge model invalidates every earlier verdict.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from email_assistant.prompts import JUDGE_PROMPT_VERSION, RESPONSE_CRITERIA_SYSTEM_PROMPT
+from email_assistant.schemas import EVAL_SCHEMA
+
+
+def judge_prompt_version() -> str:
+    """template version plus a short hash of the judge system prompt"""
+    digest = hashlib.sha256(RESPONSE_CRITERIA_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+    return f"{JUDGE_PROMPT_VERSION}-{digest}"
+
+
+def judge_model_id() -> str:
+    """provider and model of the judge, verdicts of the fake provider never mix with real ones"""
+    from email_assistant.config import JUDGE_MODEL, LLM_PROVIDER
+
+    return f"{LLM_PROVIDER}:{JUDGE_MODEL}"
+
+
+def verdict_cache_key(transcript: str, criteria: str, judge_model: Optional[str] = None,
+                      prompt_version: Optional[str] = None) -> str:
+    digest = hashlib.sha256()
+    for part in (prompt_version or judge_prompt_version(), judge_model or judge_model_id(), criteria, transcript):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class VerdictCache:
+    """EVAL_SCHEMA verdicts in a SQLite file, verdicts never expire.
+
+    Args:
+        path: SQLite file, ":memory:" keeps the verdicts for the life of the object
+    """
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, verdict TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[EVAL_SCHEMA]:
+        """returns the stored verdict or None, counting a hit or a miss"""
+        with self._lock:
+            row = self._db.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return EVAL_SCHEMA.model_validate_json(row[0])
+
+    def put(self, key: str, verdict: EVAL_SCHEMA) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, created_at) VALUES (?, ?, ?)",
+                (key, verdict.model_dump_json(), time.time()),
+            )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = self._db.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,195 @@
+"""Lazily built, process-wide chat models and graphs.
+
+Nothing heavy (langchain, langgraph, the OpenAI client) is imported or built
+when this module is imported. Each component is created on first use, then
+cached and shared by every caller: the plain graph, the HITL graph, the
+batch endpoint and the evaluation scripts. The models that are called go
+through the process-wide rate limiter (rate_limit.py) and share one HTTP
+connection pool (llm_client.py).
+"""
+import threading
+from functools import wraps
+
+_lock = threading.RLock()
+
+
+def _build_once(build):
+    """caches the first result of a zero-argument builder, safe to call from several threads"""
+    missing = object()
+    value = missing
+
+    @wraps(build)
+    def get():
+        nonlocal value
+        if value is missing:
+            with _lock:
+                if value is missing:
+                    value = build()
+        return value
+
+    def reset():
+        nonlocal value
+        with _lock:
+            value = missing
+
+    get.cache_clear = reset
+    return get
+
+
+@_build_once
+def get_http_client():
+    """pooled sync HTTP client shared by every chat model"""
+    from email_assistant.llm_client import build_http_client
+
+    return build_http_client()
+
+
+@_build_once
+def get_async_http_client():
+    """pooled async HTTP client shared by every chat model"""
+    from email_assistant.llm_client import build_async_http_client
+
+    return build_async_http_client()
+
+
+def _init_chat_model(model: str, timeout: float | None = None):
+    from email_assistant.config import LLM_MAX_RETRIES, LLM_PROVIDER, LLM_TIMEOUT_SECONDS
+
+    if LLM_PROVIDER == "fake":
+        from email_assistant.fake_llm import FakeChatModel
+
+        return FakeChatModel.from_config()
+    from langchain.chat_models import init_chat_model
+    from email_assistant.llm_client import request_timeout
+
+    return init_chat_model(
+        model= model, model_provider= "openai" , temperature = 0.0,
+        http_client= get_http_client(), http_async_client= get_async_http_client(),
+        timeout= request_timeout(timeout or LLM_TIMEOUT_SECONDS), max_retries= LLM_MAX_RETRIES,
+    )
+
+
+@_build_once
+def get_chat_model():
+    """the shared large chat model, used for drafting and for escalated triage"""
+    from email_assistant.config import LARGE_MODEL
+
+    return _init_chat_model(LARGE_MODEL)
+
+
+@_build_once
+def get_triage_model():
+    """the small chat model that triages first, the large model when both are configured the same"""
+    from email_assistant.config import LARGE_MODEL, TRIAGE_MODEL, TRIAGE_TIMEOUT_SECONDS
+
+    if TRIAGE_MODEL == LARGE_MODEL:
+        return get_chat_model()
+    return _init_chat_model(TRIAGE_MODEL, TRIAGE_TIMEOUT_SECONDS)
+
+
+@_build_once
+def get_judge_model():
+    """chat model of the LLM-as-judge grader, the drafting model when both are configured the same"""
+    from email_assistant.config import JUDGE_MODEL, LARGE_MODEL
+
+    if JUDGE_MODEL == LARGE_MODEL:
+        return get_chat_model()
+    return _init_chat_model(JUDGE_MODEL)
+
+
+@_build_once
+def get_llm_judge():
+    """judge model with EVAL_SCHEMA structured output, include_raw keeps the usage of the raw message"""
+    from email_assistant.rate_limit import rate_limited
+    from email_assistant.schemas import EVAL_SCHEMA
+
+    return rate_limited(get_judge_model().with_structured_output(EVAL_SCHEMA, include_raw= True))
+
+
+@_build_once
+def get_llm_router():
+    """small chat model with RouterSchema structured output, for triage.
+
+    include_raw keeps the raw message so its token usage (prompt cache hits)
+    can be recorded, triage.classify_email unwraps the parsed RouterSchema.
+    """
+    from email_assistant.rate_limit import rate_limited
+    from email_assistant.schemas import RouterSchema
+
+    return rate_limited(get_triage_model().with_structured_output(RouterSchema, include_raw= True))
+
+
+@_build_once
+def get_llm_router_escalation():
+    """large chat model with RouterSchema structured output for escalated triage, None when triage
+    already runs on the large model"""
+    from email_assistant.config import LARGE_MODEL, TRIAGE_MODEL
+    from email_assistant.rate_limit import rate_limited
+    from email_assistant.schemas import RouterSchema
+
+    if TRIAGE_MODEL == LARGE_MODEL:
+        return None
+    return rate_limited(get_chat_model().with_structured_output(RouterSchema, include_raw= True))
+
+
+@_build_once
+def get_llm_with_tools():
+    """chat model bound to the agent tools, forced to call at least one tool"""
+    from email_assistant.agent_tools import Tools
+    from email_assistant.rate_limit import rate_limited
+
+    return rate_limited(get_chat_model().bind_tools(Tools, tool_choice= "any"))
+
+
+@_build_once
+def get_response_agent():
+    """compiled response agent subgraph, shared by both assistant graphs"""
+    from email_assistant.agents import build_response_agent
+
+    return build_response_agent()
+
+
+@_build_once
+def get_email_assistant():
+    """compiled triage + response graph"""
+    from email_assistant.agents import build_email_assistant
+
+    return build_email_assistant()
+
+
+@_build_once
+def get_checkpointer():
+    """SQLite checkpointer of the HITL graph, starts its background compaction"""
+    from email_assistant.checkpointer import build_checkpointer
+
+    return build_checkpointer()
+
+
+@_build_once
+def get_job_runner():
+    """background job runner, its jobs are stored next to the HITL checkpoints (the app lifespan starts it)"""
+    from email_assistant.jobs import JobRunner, JobStore
+
+    return JobRunner(JobStore(get_checkpointer()))
+
+
+@_build_once
+def get_work_queue():
+    """ingestion queue of /ingest, its workers run emails through the async graph"""
+    from email_assistant.work_queue import WorkQueue, build_backend, ingest_email
+
+    return WorkQueue(build_backend(), ingest_email)
+
+
+@_build_once
+def get_email_assistant_hitl():
+    """compiled human-in-the-loop graph with its persistent checkpointer"""
+    from email_assistant.agents_HITL import build_email_assistant_hitl
+
+    return build_email_assistant_hitl(get_checkpointer())
+
+
+def warm_up() -> None:
+    """builds every component ahead of the first request"""
+    get_email_assistant()
+    get_email_assistant_hitl()
@@ -0,0 +1,172 @@
+"""Offline chat model for load tests and local runs without OpenAI.
+
+FakeChatModel is a real langchain ``BaseChatModel``, so the factory can hand
+it out instead of the ``init_chat_model`` result
+(EMAIL_ASSISTANT_LLM_PROVIDER=fake) and the graphs, ``bind_tools(Tools)``,
+``with_structured_output(RouterSchema, include_raw=True)`` and the usage
+metadata based metrics all run exactly as in production. Only the answers and
+the latency are made up:
+
+* triage: the first matching regex of ``triage_rules`` picks the
+  classification (confidence 0.95), ``respond`` otherwise (confidence 0.6, so
+  tiered triage escalates it)
+* response agent: emails about meetings check the calendar and schedule the
+  meeting before writing the reply, everything else gets a reply, then Done
+* LLM-as-judge (``EVAL_SCHEMA``): every response passes
+* ``responses``: a fixed script of AIMessages replayed in order instead
+
+Every call sleeps for a latency drawn from ``latency_distribution``.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from email_assistant.config import FAKE_LLM_LATENCY, FAKE_LLM_SEED
+from email_assistant.history import estimate_tokens
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+DEFAULT_FAKE_TRIAGE_RULES: List[Tuple[str, str]] = [
+    (r"newsletter|unsubscribe|promotion|% off|digest|subscription", "ignore"),
+    (r"liked your|mentioned you|new follower|tagged you", "ignore"),
+    (r"maintenance|downtime|alert|notification|reminder|deployed|build (failed|succeeded)|fyi|out sick", "notify"),
+    (r"github|pull request|commented on", "notify"),
+]
+
+MEETING_PATTERN = r"meeting|schedule|call\b|availability|available|discuss"
+
+
+def parse_latency(spec: str) -> Tuple[str, float, float]:
+    """'lognormal:0.8:0.3' -> (distribution, mean seconds, jitter seconds), the jitter is optional"""
+    distribution, _, rest = spec.partition(":")
+    mean, _, jitter = rest.partition(":")
+    if distribution not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"unknown latency distribution {distribution!r}, expected one of {LATENCY_DISTRIBUTIONS}")
+    return distribution, float(mean or 0), float(jitter or 0)
+
+
+def _text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content)
+
+
+class FakeChatModel(BaseChatModel):
+    """Rule-driven or scripted chat model with a configurable latency distribution.
+
+    Args:
+        latency_distribution: fixed, uniform (mean +- jitter), normal or lognormal (mean, std = jitter)
+        latency_mean: mean seconds per call
+        latency_jitter: spread in seconds, ignored by fixed
+        triage_rules: (regex, classification) pairs tried in order on the email text
+        responses: scripted replies, used in order instead of the rules
+        seed: seed of the latency sampler, None for a random seed
+        model_name: reported in the response metadata, usage is tracked per model name
+    """
+
+    latency_distribution: str = "fixed"
+    latency_mean: float = 0.0
+    latency_jitter: float = 0.0
+    triage_rules: List[Tuple[str, str]] = DEFAULT_FAKE_TRIAGE_RULES
+    responses: Optional[List[AIMessage]] = None
+    seed: Optional[int] = None
+    model_name: str = "fake-chat-model"
+
+    _rng: random.Random = PrivateAttr()
+    _script_position: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"unknown latency distribution {self.latency_distribution!r}")
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def from_config(cls, latency: str = FAKE_LLM_LATENCY, seed: Optional[int] = FAKE_LLM_SEED) -> "FakeChatModel":
+        distribution, mean, jitter = parse_latency(latency)
+        return cls(latency_distribution=distribution, latency_mean=mean, latency_jitter=jitter, seed=seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: Optional[str] = None, **kwargs: Any):
+        """binds the tool schemas like the OpenAI model does, they reach _generate as `tools`"""
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], tool_choice=tool_choice, **kwargs)
+
+    def sample_latency(self) -> float:
+        mean, jitter = self.latency_mean, self.latency_jitter
+        if self.latency_distribution == "uniform":
+            return max(0.0, self._rng.uniform(mean - jitter, mean + jitter))
+        if self.latency_distribution == "normal":
+            return max(0.0, self._rng.gauss(mean, jitter))
+        if self.latency_distribution == "lognormal" and mean > 0:
+            sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+            return self._rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+        return mean
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.sample_latency())
+        return self._result(messages, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.sample_latency())
+        return self._result(messages, **kwargs)
+
+    def _result(self, messages: List[BaseMessage], tools: Optional[list] = None, **kwargs) -> ChatResult:
+        if self.responses is not None:
+            reply = self.responses[self._script_position % len(self.responses)]
+            self._script_position += 1
+        else:
+            tool_names = [tool["function"]["name"] for tool in tools or []]
+            reply = self._reply(messages, tool_names)
+        output_tokens = max(1, estimate_tokens(reply.content + json.dumps([tc["args"] for tc in reply.tool_calls])))
+        input_tokens = max(1, sum(estimate_tokens(_text(m)) for m in messages))
+        reply = reply.model_copy(update={
+            "usage_metadata": {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+            "response_metadata": {**reply.response_metadata, "model_name": self.model_name},
+        })
+        return ChatResult(generations=[ChatGeneration(message=reply)])
+
+    def _reply(self, messages: List[BaseMessage], tool_names: List[str]) -> AIMessage:
+        if "RouterSchema" in tool_names:
+            return self._tool_call("RouterSchema", self._triage(messages))
+        if "EVAL_SCHEMA" in tool_names:
+            return self._tool_call("EVAL_SCHEMA", {"justification": "fake judge, every response passes", "grade": True})
+        if not tool_names:
+            return AIMessage(content="This is a response from the fake chat model.")
+
+        called = [tc["name"] for m in messages if isinstance(m, AIMessage) for tc in m.tool_calls]
+        email = next((_text(m) for m in messages if m.type == "human"), "")
+        wants_meeting = re.search(MEETING_PATTERN, email, re.IGNORECASE) is not None
+        for name, args in (
+            ("check_calendar_availability", {"attendees": ["attendee@company.com"], "preferred_day": "2025-05-20T10:00:00", "duration_minutes": 30}),
+            ("schedule_meeting", {"attendees": ["attendee@company.com"], "subject": "Meeting", "preferred_day": "2025-05-20T10:00:00", "start_time": 10, "duration_minutes": 30}),
+        ):
+            if wants_meeting and name in tool_names and name not in called:
+                return self._tool_call(name, args)
+        if "write_email" in tool_names and "write_email" not in called:
+            return self._tool_call("write_email", {"to": "sender@company.com", "subject": "Re: your email", "body": "Thanks for reaching out, I will get back to you shortly."})
+        return self._tool_call("Done", {"done": True})
+
+    def _triage(self, messages: List[BaseMessage]) -> dict:
+        email = _text(messages[-1]) if messages else ""
+        for pattern, classification in self.triage_rules:
+            if re.search(pattern, email, re.IGNORECASE):
+                return {"classification": classification, "reasoning": f"fake model matched {pattern!r}", "confidence": 0.95}
+        return {"classification": "respond", "reasoning": "fake model default", "confidence": 0.6}
+
+    def _tool_call(self, name: str, args: dict) -> AIMessage:
+        call_id = f"call_{name}_{self._rng.randrange(16 ** 8):08x}"
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id, "type": "tool_call"}])
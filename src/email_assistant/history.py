@@ -0,0 +1,111 @@
+"""Token-budgeted view of the response agent's conversation.
+
+``llm_call`` sends the whole conversation on every turn of the
+llm_call / tool_handler loop, so the input grows with every tool round trip
+and the total input of a run grows quadratically. ``compact_history`` builds
+the view that is actually sent:
+
+* the email (everything before the first model turn) and the last
+  ``keep_turns`` turns are kept verbatim; a turn is one AIMessage plus the
+  ToolMessages answering it
+* while the view is over ``token_budget``, the oldest remaining tool results
+  are replaced by a one-line summary, oldest first
+
+Only the content of a ToolMessage is replaced, the message itself and its
+tool_call_id stay, so every tool call of an AIMessage still has its result
+and the provider accepts the history. The graph state is never modified, the
+full conversation stays in the state and in the checkpoints.
+"""
+import json
+import math
+from dataclasses import dataclass
+from typing import List, Sequence
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from email_assistant.config import HISTORY_KEEP_TURNS, HISTORY_SUMMARY_CHARS, HISTORY_TOKEN_BUDGET
+
+# role, separators and name of a chat message, roughly what OpenAI bills on top of the content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token, close enough for English text and JSON to budget with"""
+    return math.ceil(len(text) / 4)
+
+
+def _content_text(content) -> str:
+    return content if isinstance(content, str) else json.dumps(content, default=str)
+
+
+def message_tokens(message) -> int:
+    """estimated tokens of one message: content, tool call arguments and the per-message overhead"""
+    if not isinstance(message, BaseMessage):
+        #plain dicts as passed to the llm
+        return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(_content_text(message.get("content", "")))
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(_content_text(message.content))
+    if message.type == "ai":
+        for tool_call in message.tool_calls:
+            tokens += estimate_tokens(tool_call["name"]) + estimate_tokens(json.dumps(tool_call["args"], default=str))
+    return tokens
+
+
+def summarize_tool_result(message: ToolMessage, max_chars: int = HISTORY_SUMMARY_CHARS) -> str:
+    """first line of the result, cut at max_chars, marked as compacted"""
+    text = " ".join(_content_text(message.content).split())
+    if len(text) > max_chars:
+        text = text[:max_chars].rstrip() + "..."
+    return f"[earlier {message.name or 'tool'} result, compacted] {text}"
+
+
+@dataclass
+class CompactedHistory:
+    messages: List
+    tokens_before: int
+    tokens_after: int
+    compacted_results: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def compact_history(
+    messages: Sequence,
+    token_budget: int = HISTORY_TOKEN_BUDGET,
+    keep_turns: int = HISTORY_KEEP_TURNS,
+    summary_chars: int = HISTORY_SUMMARY_CHARS,
+) -> CompactedHistory:
+    """Conversation to send to the model, with old tool results collapsed until it fits token_budget.
+
+    A budget of 0 or less turns compaction off. If the kept turns alone are
+    over the budget the view is returned over budget, nothing recent is cut.
+    """
+    messages = list(messages)
+    sizes = [message_tokens(message) for message in messages]
+    total = sum(sizes)
+    result = CompactedHistory(messages, total, total)
+    if token_budget <= 0 or total <= token_budget:
+        return result
+
+    turn_starts = [i for i, message in enumerate(messages) if isinstance(message, BaseMessage) and message.type == "ai"]
+    if len(turn_starts) <= keep_turns:
+        return result
+    protected_from = turn_starts[-keep_turns] if keep_turns > 0 else len(messages)
+
+    for i in range(turn_starts[0], protected_from):
+        if total <= token_budget:
+            break
+        message = messages[i]
+        if not isinstance(message, ToolMessage):
+            continue
+        summary = message.model_copy(update={"content": summarize_tool_result(message, summary_chars)})
+        size = message_tokens(summary)
+        if size >= sizes[i]:
+            continue
+        messages[i] = summary
+        total -= sizes[i] - size
+        result.compacted_results += 1
+
+    result.tokens_after = total
+    return result
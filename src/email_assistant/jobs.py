@@ -0,0 +1,284 @@
+"""Background jobs for HITL runs that take many LLM round trips.
+
+``POST /process-email-hitl/jobs`` records a job and returns its id right
+away; the graph then runs on the event loop in the background (at most
+EMAIL_ASSISTANT_JOB_MAX_CONCURRENCY at a time). Clients poll
+``GET /jobs/{job_id}`` or pass a ``callback_url`` that receives the finished
+job as JSON. The job carries the draft and the email, so callbacks only go to
+EMAIL_ASSISTANT_JOB_CALLBACK_ALLOWED_HOSTS, other URLs are rejected when the job
+is submitted.
+
+Jobs live in the ``jobs`` table of the checkpoint database, next to the
+thread they run, and are removed with it when the checkpointer expires or
+evicts the thread. A thread has at most one unfinished job: the sync and
+streaming resume endpoints record theirs as running jobs too, so no two
+resumes of the same interrupt run at once.
+
+Each job records the process that runs it (its owner), and a running
+JobRunner heartbeats its owner row. When a worker starts it marks failed the
+queued or running jobs whose owner stopped, or has not heartbeated for
+EMAIL_ASSISTANT_JOB_OWNER_LEASE_SECONDS; jobs of the other live workers
+sharing the database are left alone. The thread of a failed job can simply
+be resumed again.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Set
+from urllib.parse import urlsplit
+
+from email_assistant.config import (
+    JOB_CALLBACK_ALLOWED_HOSTS, JOB_CALLBACK_TIMEOUT_SECONDS, JOB_MAX_CONCURRENCY, JOB_OWNER_LEASE_SECONDS,
+)
+from email_assistant.log import bind_thread_id
+from email_assistant.metrics import JOB_LATENCY
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED = ("queued", "running")
+
+
+def callback_allowed(url: str, allowed: Sequence[str]) -> bool:
+    """whether `url` is an http(s) URL on an allowed host, host:port or under an allowed URL prefix"""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return False
+    for entry in allowed:
+        if "://" in entry:
+            if url.startswith(entry if entry.endswith("/") else entry + "/") or url == entry:
+                return True
+        elif entry.lower() in (parts.hostname, parts.netloc.lower()):
+            return True
+    return False
+
+
+@dataclass
+class Job:
+    job_id: str
+    thread_id: str
+    kind: str
+    status: str
+    created_at: float
+    updated_at: float
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    callback_url: Optional[str] = None
+
+
+class JobStore:
+    """jobs table in the checkpointer's SQLite database, sharing its connection and lock"""
+
+    def __init__(self, saver, clock=time.time, owner: Optional[str] = None):
+        self.saver = saver
+        self._clock = clock
+        #boot id of this process, stored on the jobs it creates
+        self.owner = owner or str(uuid.uuid4())
+        saver.setup()
+
+    def create(self, thread_id: str, kind: str, callback_url: Optional[str] = None) -> Job:
+        now = self._clock()
+        job = Job(str(uuid.uuid4()), thread_id, kind, "queued", now, now, callback_url=callback_url)
+        with self.saver.cursor() as cur:
+            cur.execute(
+                "INSERT INTO jobs (job_id, thread_id, kind, status, callback_url, owner, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.job_id, thread_id, kind, job.status, callback_url, self.owner, now, now),
+            )
+        return job
+
+    def create_if_idle(self, thread_id: str, kind: str, callback_url: Optional[str] = None,
+                       status: str = "queued") -> Optional[Job]:
+        """creates the job unless the thread already has a queued or running one, then returns None.
+
+        Check and insert are one statement, atomic even for processes sharing the database file.
+        """
+        now = self._clock()
+        job = Job(str(uuid.uuid4()), thread_id, kind, status, now, now, callback_url=callback_url)
+        with self.saver.cursor() as cur:
+            inserted = cur.execute(
+                "INSERT INTO jobs (job_id, thread_id, kind, status, callback_url, owner, created_at, updated_at) "
+                "SELECT ?, ?, ?, ?, ?, ?, ?, ? WHERE NOT EXISTS "
+                "(SELECT 1 FROM jobs WHERE thread_id = ? AND status IN (?, ?))",
+                (job.job_id, thread_id, kind, status, callback_url, self.owner, now, now, thread_id, *UNFINISHED),
+            ).rowcount
+        return job if inserted else None
+
+    def update(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        with self.saver.cursor() as cur:
+            cur.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, json.dumps(result) if result is not None else None, error, self._clock(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.saver.cursor(transaction=False) as cur:
+            row = cur.execute(
+                "SELECT job_id, thread_id, kind, status, created_at, updated_at, result, error, callback_url "
+                "FROM jobs WHERE job_id = ?", (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, thread_id, kind, status, created_at, updated_at, result, error, callback_url = row
+        return Job(job_id, thread_id, kind, status, created_at, updated_at,
+                   json.loads(result) if result is not None else None, error, callback_url)
+
+    def active_job(self, thread_id: str) -> Optional[str]:
+        """id of a queued or running job of the thread"""
+        with self.saver.cursor(transaction=False) as cur:
+            row = cur.execute(
+                "SELECT job_id FROM jobs WHERE thread_id = ? AND status IN (?, ?) LIMIT 1", (thread_id, *UNFINISHED),
+            ).fetchone()
+        return row[0] if row else None
+
+    def heartbeat(self) -> None:
+        """marks this process alive, its unfinished jobs are not failed while the lease holds"""
+        with self.saver.cursor() as cur:
+            cur.execute(
+                "INSERT INTO job_owners (owner, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT(owner) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (self.owner, self._clock()),
+            )
+
+    def release(self) -> None:
+        """drops the owner row on shutdown, the jobs this process leaves unfinished are failed on the next start"""
+        with self.saver.cursor() as cur:
+            cur.execute("DELETE FROM job_owners WHERE owner = ?", (self.owner,))
+
+    def fail_orphaned(self, lease: float = JOB_OWNER_LEASE_SECONDS,
+                      reason: str = "interrupted by a restart, resume the thread again") -> int:
+        """marks failed the unfinished jobs of other processes that stopped or missed their heartbeat for `lease`"""
+        now = self._clock()
+        with self.saver.cursor() as cur:
+            cur.execute("DELETE FROM job_owners WHERE heartbeat_at < ? AND owner != ?", (now - lease, self.owner))
+            return cur.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE status IN (?, ?) "
+                "AND owner IS NOT ? AND (owner IS NULL OR owner NOT IN (SELECT owner FROM job_owners))",
+                (reason, now, *UNFINISHED, self.owner),
+            ).rowcount
+
+
+class JobRunner:
+    """runs jobs as background tasks on the event loop, records their outcome and sends the callback"""
+
+    def __init__(self, store: JobStore, max_concurrency: int = JOB_MAX_CONCURRENCY,
+                 callback_timeout: float = JOB_CALLBACK_TIMEOUT_SECONDS, callback_transport=None,
+                 callback_allowed_hosts: Sequence[str] = JOB_CALLBACK_ALLOWED_HOSTS,
+                 lease: float = JOB_OWNER_LEASE_SECONDS):
+        self.store = store
+        self.lease = lease
+        self._heartbeat: Optional[asyncio.Task] = None
+        self.callback_timeout = callback_timeout
+        self.callback_allowed_hosts = list(callback_allowed_hosts)
+        self.callback_transport = callback_transport
+        self._max_concurrency = max_concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        #strong references, the event loop only keeps weak ones to running tasks
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self) -> int:
+        """starts heartbeating, then fails the orphaned jobs of stopped workers and returns how many"""
+        await asyncio.to_thread(self.store.heartbeat)
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._keep_alive(), name="job-heartbeat")
+        failed = await asyncio.to_thread(self.store.fail_orphaned, self.lease)
+        if failed:
+            logger.warning("failed jobs left unfinished by a stopped worker", extra={"jobs": failed})
+        return failed
+
+    async def stop(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+        await asyncio.to_thread(self.store.release)
+
+    async def _keep_alive(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await asyncio.to_thread(self.store.heartbeat)
+            except Exception:
+                logger.warning("job heartbeat failed", exc_info=True)
+
+    def callback_allowed(self, url: str) -> bool:
+        return callback_allowed(url, self.callback_allowed_hosts)
+
+    async def submit(self, thread_id: str, kind: str, work: Callable[[], Awaitable[dict]],
+                     callback_url: Optional[str] = None) -> Optional[Job]:
+        """stores a queued job and starts `work` (returning the JSON result) in the background.
+
+        Returns None, without running `work`, when the thread already has an unfinished job.
+        Raises ValueError for a callback_url that is not allowed.
+        """
+        if callback_url is not None and not self.callback_allowed(callback_url):
+            raise ValueError(f"callback_url {callback_url} is not an allowed callback host")
+        job = await asyncio.to_thread(self.store.create_if_idle, thread_id, kind, callback_url)
+        if job is None:
+            return None
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def active_job(self, thread_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.store.active_job, thread_id)
+
+    async def claim(self, thread_id: str, kind: str) -> Optional[Job]:
+        """a running job for a resume the caller runs inline (sync and streaming endpoints),
+        None when the thread already has an unfinished job. Close it with finish()"""
+        return await asyncio.to_thread(self.store.create_if_idle, thread_id, kind, None, "running")
+
+    def finish(self, job: Job, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        #synchronous, callers on the event loop use afinish
+        self.store.update(job.job_id, status, result, error)
+
+    async def afinish(self, job: Job, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        """finish() off the event loop, shielded: the update still lands when the caller is being cancelled"""
+        await asyncio.shield(asyncio.to_thread(self.finish, job, status, result, error))
+
+    async def _run(self, job: Job, work: Callable[[], Awaitable[dict]]) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._semaphore = loop, asyncio.Semaphore(self._max_concurrency)
+        with bind_thread_id(job.thread_id):
+            started = time.perf_counter()
+            async with self._semaphore:
+                await asyncio.to_thread(self.store.update, job.job_id, "running")
+                try:
+                    result, status, error = await work(), "completed", None
+                except Exception as e:
+                    logger.exception("job failed", extra={"job_id": job.job_id})
+                    result, status, error = None, "failed", getattr(e, "detail", None) or str(e)
+                await asyncio.to_thread(self.store.update, job.job_id, status, result, error)
+            JOB_LATENCY.labels(job.kind, status).observe(time.perf_counter() - started)
+            logger.info("job finished", extra={"job_id": job.job_id, "status": status})
+            if job.callback_url:
+                await self._callback(job.job_id, job.callback_url)
+
+    async def _callback(self, job_id: str, url: str) -> None:
+        """POSTs the finished job to its callback url, one attempt, failures are only logged"""
+        import httpx
+
+        if not self.callback_allowed(url):
+            #submit() refuses these, a job stored before the allowlist changed is not called back
+            logger.warning("job callback url not allowed", extra={"job_id": job_id, "callback_url": url})
+            return
+        job = await self.get(job_id)
+        try:
+            async with httpx.AsyncClient(timeout=self.callback_timeout, transport=self.callback_transport) as client:
+                response = await client.post(url, json=asdict(job))
+                response.raise_for_status()
+        except httpx.HTTPError:
+            logger.warning("job callback failed", extra={"job_id": job_id, "callback_url": url}, exc_info=True)
+
+    async def drain(self) -> None:
+        """waits for the running jobs, for shutdown and tests"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
@@ -0,0 +1,184 @@
+"""Pooled HTTP clients shared by every chat model of the process.
+
+Each ``init_chat_model`` call used to get the OpenAI SDK's default HTTP client:
+default pool sizes, no say over keep-alive or HTTP/2, and a separate pool
+for every distinct timeout. The factory now builds one sync and one async
+``httpx`` client from these settings and hands them to every chat model, the
+triage and drafting models of both graphs and the LLM-as-judge grader, so
+they all reuse the same warm TLS connections:
+
+* EMAIL_ASSISTANT_LLM_MAX_CONNECTIONS / _MAX_KEEPALIVE_CONNECTIONS /
+  _KEEPALIVE_EXPIRY_SECONDS size the pool
+* EMAIL_ASSISTANT_LLM_HTTP2=1 multiplexes calls over HTTP/2 connections, it
+  needs the optional ``h2`` package (``pip install httpx[http2]``) and falls
+  back to HTTP/1.1 without it
+* timeouts are per model (EMAIL_ASSISTANT_LLM_TIMEOUT_SECONDS,
+  EMAIL_ASSISTANT_TRIAGE_TIMEOUT_SECONDS), the SDK sends them with every
+  request, so models with different timeouts still share the pool
+* the pool is split into EMAIL_ASSISTANT_LLM_POOL_SHARDS transports, a request
+  goes to the shard with the fewest requests in flight (until its response body
+  is closed, so streamed completions count for their whole length). httpcore's pool does
+  work quadratic in its connection count on every request (1.0.x scans all
+  connections per connection while pruning), with one pool of 32 warm
+  connections that cost more than the reuse saved, see
+  benchmarks/bench_llm_client.py
+
+The async client belongs to the event loop that first uses it, the serving
+loop in the app.
+"""
+import logging
+import math
+
+import httpx
+
+from email_assistant.config import (
+    LLM_CONNECT_TIMEOUT_SECONDS,
+    LLM_HTTP2,
+    LLM_KEEPALIVE_EXPIRY_SECONDS,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_POOL_SHARDS,
+    LLM_TIMEOUT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def http2_enabled(requested: bool = LLM_HTTP2) -> bool:
+    if not requested:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("EMAIL_ASSISTANT_LLM_HTTP2=1 but the h2 package is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def connection_limits(shards: int = 1) -> httpx.Limits:
+    """the configured pool limits, divided between `shards` pools"""
+    return httpx.Limits(
+        max_connections= math.ceil(LLM_MAX_CONNECTIONS / shards),
+        max_keepalive_connections= math.ceil(LLM_MAX_KEEPALIVE_CONNECTIONS / shards),
+        keepalive_expiry= LLM_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def request_timeout(total: float = LLM_TIMEOUT_SECONDS) -> httpx.Timeout:
+    """`total` seconds for a call, connecting gets EMAIL_ASSISTANT_LLM_CONNECT_TIMEOUT_SECONDS of it"""
+    return httpx.Timeout(total, connect= min(total, LLM_CONNECT_TIMEOUT_SECONDS))
+
+
+class _Shards:
+    """the pools of a sharded transport, a request goes to the one with the fewest requests in flight.
+
+    A request stays in flight until its response body is closed, a streamed
+    completion holds its connection for the whole generation.
+    """
+
+    def __init__(self, transports: list):
+        self.transports = transports
+        self.in_flight = [0] * len(transports)
+
+    def pick(self) -> int:
+        #the sync client is used from several threads, a racy count only makes the choice less even
+        index = self.in_flight.index(min(self.in_flight))
+        self.in_flight[index] += 1
+        return index
+
+    def releaser(self, index: int):
+        """decrements the shard's count once, however often it is called"""
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight[index] -= 1
+        return release
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream, release):
+        self._stream, self._release = stream, release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream, self._release = stream, release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class ShardedTransport(httpx.BaseTransport):
+    def __init__(self, transports: list):
+        self.shards = _Shards(transports)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        index = self.shards.pick()
+        release = self.shards.releaser(index)
+        try:
+            response = self.shards.transports[index].handle_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def close(self) -> None:
+        for transport in self.shards.transports:
+            transport.close()
+
+
+class AsyncShardedTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transports: list):
+        self.shards = _Shards(transports)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        index = self.shards.pick()
+        release = self.shards.releaser(index)
+        try:
+            response = await self.shards.transports[index].handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _AsyncReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        for transport in self.shards.transports:
+            await transport.aclose()
+
+
+def sharded_transport(shards: int = LLM_POOL_SHARDS, asynchronous: bool = True, **kwargs):
+    """one transport over `shards` connection pools, `kwargs` go to every pool's HTTPTransport"""
+    kwargs.setdefault("limits", connection_limits(shards))
+    kwargs.setdefault("http2", http2_enabled())
+    if asynchronous:
+        return AsyncShardedTransport([httpx.AsyncHTTPTransport(**kwargs) for _ in range(shards)])
+    return ShardedTransport([httpx.HTTPTransport(**kwargs) for _ in range(shards)])
+
+
+def build_http_client() -> httpx.Client:
+    return httpx.Client(transport= sharded_transport(asynchronous= False), timeout= request_timeout())
+
+
+def build_async_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport= sharded_transport(), timeout= request_timeout())
@@ -0,0 +1,130 @@
+"""Leveled, structured JSON logging for the assistant.
+
+Modules log through the standard library (``logging.getLogger(__name__)``)
+with %-style arguments, so a message and its arguments (graph states, stream
+chunks) are only rendered when the record's level is enabled. Enabled records
+are written as one JSON object per line and carry the thread_id and node that
+were active when they were logged.
+
+``timed_node`` wraps graph node functions: it binds the thread_id from the run
+config and the node name for the duration of the node, logs how long the
+node took and records it in the node latency histogram.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import sys
+import time
+import traceback
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from email_assistant.config import LOG_LEVEL
+from email_assistant.metrics import NODE_LATENCY
+
+thread_id_var: ContextVar[Optional[str]] = ContextVar("thread_id", default=None)
+node_var: ContextVar[Optional[str]] = ContextVar("node", default=None)
+
+_ROOT = "email_assistant"
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """one JSON object per record; extra= fields are added as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        thread_id, node = thread_id_var.get(), node_var.get()
+        if thread_id is not None:
+            payload["thread_id"] = thread_id
+        if node is not None:
+            payload["node"] = node
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = "".join(traceback.format_exception(*record.exc_info)).rstrip()
+        return json.dumps(payload, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, stream=None) -> logging.Logger:
+    """installs the JSON handler on the package logger, calling it again only changes the level"""
+    logger = logging.getLogger(_ROOT)
+    logger.setLevel(level.upper())
+    if not any(getattr(handler, "_email_assistant", False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        handler._email_assistant = True
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
+
+
+@contextlib.contextmanager
+def bind_thread_id(thread_id: Optional[str]) -> Iterator[None]:
+    """records logged inside the block carry this thread_id"""
+    token = thread_id_var.set(thread_id)
+    try:
+        yield
+    finally:
+        thread_id_var.reset(token)
+
+
+def _bind(name: str, config: Optional[dict]):
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    return node_var.set(name), thread_id_var.set(thread_id or thread_id_var.get())
+
+
+def _unbind(tokens) -> None:
+    node_token, thread_token = tokens
+    thread_id_var.reset(thread_token)
+    node_var.reset(node_token)
+
+
+def _finished(logger: logging.Logger, latency, started: float, tokens) -> None:
+    elapsed = time.perf_counter() - started
+    latency.observe(elapsed)
+    logger.info("node finished", extra={"duration_ms": round(elapsed * 1000, 3)})
+    _unbind(tokens)
+
+
+def timed_node(name: str, logger: logging.Logger) -> Callable:
+    """decorator for graph nodes, logs the node duration at INFO with the thread_id and node bound
+    and observes it in NODE_LATENCY.
+
+    The wrapper takes the run config so RunnableLambda passes it in; the
+    wrapped function is still called with the state only.
+    """
+    latency = NODE_LATENCY.labels(name)
+
+    def decorate(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            async def anode(state, config):
+                tokens = _bind(name, config)
+                started = time.perf_counter()
+                try:
+                    return await func(state)
+                finally:
+                    _finished(logger, latency, started, tokens)
+            anode.__name__ = anode.__qualname__ = func.__name__
+            anode.__doc__ = func.__doc__
+            return anode
+
+        def node(state, config):
+            tokens = _bind(name, config)
+            started = time.perf_counter()
+            try:
+                return func(state)
+            finally:
+                _finished(logger, latency, started, tokens)
+        node.__name__ = node.__qualname__ = func.__name__
+        node.__doc__ = func.__doc__
+        return node
+
+    return decorate
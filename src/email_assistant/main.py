@@ -1,23 +1,71 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI , HTTPException
-from typing import Dict
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Any, Dict, List
 from email_assistant.schemas import ProcessEmailResponse , ProcessEmailRequest
-from email_assistant.agents import process_email
 from email_assistant.schemas import ProcessEmailHITLRequest, ProcessEmailHITLResponse, InterruptInfo
+from email_assistant.schemas import ProcessEmailHITLJobRequest, JobResponse, IngestResponse
+from email_assistant.schemas import ProcessEmailBatchRequest, ProcessEmailBatchResponse, BatchItemResult
 import uuid
-from email_assistant.agents_HITL import compiled_email_assistant_hitl
+from email_assistant import factory
+from email_assistant.config import WARM_UP_ON_STARTUP, WORK_QUEUE_DRAIN_SECONDS
 from email_assistant.utils import _get_allowed_actions , _extract_final_result
+from email_assistant.triage_cache import triage_cache
+from email_assistant.triage_rules import triage_rules
+from email_assistant.prompt_registry import prompt_registry
+from email_assistant.log import configure_logging, bind_thread_id
+from email_assistant.metrics import REGISTRY
 
+#langgraph / langchain / the agent modules are heavy, they are imported on first use (or by the warm up)
+#so the process starts serving fast
 
-from langgraph.types import Command
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app : FastAPI):
+    warm_up = asyncio.create_task(asyncio.to_thread(factory.warm_up)) if WARM_UP_ON_STARTUP else None
+    #workers start right away, emails left in a SQLite queue by the last run are picked up
+    work_queue = factory.get_work_queue()
+    work_queue.start()
+    #heartbeats this worker's jobs, fails the ones a stopped worker left unfinished
+    job_runner = factory.get_job_runner()
+    await job_runner.start()
+    yield
+    await work_queue.stop(timeout= WORK_QUEUE_DRAIN_SECONDS)
+    await job_runner.stop()
+    if warm_up is not None:
+        await warm_up
 
 app = FastAPI(
     title= "Email Assistant App",
     description= "This services connects a complex email agent build on langgraph to FastAPI",
-    version= "0.1.0"
+    version= "0.1.0",
+    lifespan= lifespan,
 )
 
 
 
+def _interrupt_info(interrupts) -> InterruptInfo:
+    """builds the InterruptInfo from the '__interrupt__' entry of a stream chunk"""
+    interrupt_data = interrupts[0].value[0]
+    return InterruptInfo(
+        action= interrupt_data['action_request']['action'],
+        args= interrupt_data['action_request']['args'],
+        description=interrupt_data['description'],
+        allowed_actions= _get_allowed_actions(interrupt_data['config'])
+    )
+
+def _sse(event : str, data) -> str:
+    """formats one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), default=str)}\n\n"
+
 @app.get("/")
 async def root() -> Dict[str,str] :
     """Basic health checkpoint"""
@@ -45,23 +93,148 @@ async def process_email_endpoint(request :ProcessEmailRequest ) -> ProcessEmailR
             'subject': request.email_input.subject,
             'email_thread': request.email_input.email_thread
         }
-        print("created email_dict fron input:",email_dict)
+        logger.debug("created email_dict from input: %s", email_dict)
 
-        result = process_email(email_dict)
+        from email_assistant.agents import aprocess_email
+        result = await aprocess_email(email_dict)
 
-        print("sending response: {result}")
+        logger.debug("sending response: %s", result)
         return ProcessEmailResponse(
             classification = result["classification"],
             response = result["response"],
             reasoning = result["reasoning"]
         )
     except Exception as e:
+        logger.exception("error processing email")
         raise HTTPException(
             status_code = 500,
             detail = f"Error processing email: {str(e)}" 
 
         )
     
+@app.post("/process-email/batch", response_model= ProcessEmailBatchResponse)
+async def process_email_batch_endpoint(request : ProcessEmailBatchRequest) -> ProcessEmailBatchResponse:
+    """
+    Process many emails in one request.
+
+    All emails are triaged together with a batched LLM call, then only the ones
+    classified as 'respond' go through the response agent. A failing email is
+    reported in its own result and does not fail the batch.
+
+    Args:
+        request: ProcessEmailBatchRequest with the emails and an optional concurrency limit
+
+    Returns:
+        ProcessEmailBatchResponse with one result per email, in request order
+    """
+    try:
+        from email_assistant.agents import aprocess_email_batch
+        email_dicts = [email.model_dump() for email in request.email_inputs]
+        results = await aprocess_email_batch(email_dicts, max_concurrency= request.max_concurrency)
+        items = [BatchItemResult(index= i, **result) for i, result in enumerate(results)]
+        failed = sum(item.error is not None for item in items)
+        return ProcessEmailBatchResponse(results= items, succeeded= len(items) - failed, failed= failed)
+    except Exception as e:
+        logger.exception("error processing email batch")
+        raise HTTPException(
+            status_code = 500,
+            detail = f"Error processing email batch: {str(e)}"
+        )
+
+def _hitl_mode(request : ProcessEmailHITLRequest) -> tuple:
+    """(is_resume, thread_id) of a HITL request, a new thread_id for new workflows"""
+    #determine if the incoming request is a new workflow or resume request
+    is_resume = request.thread_id is not None and request.human_response is not None
+    is_new = request.email_input is not None and request.thread_id is None
+    logger.debug("hitl request is_resume=%s is_new=%s", is_resume, is_new, extra={"thread_id": request.thread_id})
+    if not is_resume and not is_new:
+        raise HTTPException(
+            status_code= 400,
+            detail= "Either provide 'email_input' for new request or 'thread_id'+ 'human_response' for resume" 
+        )
+    return is_resume, request.thread_id if is_resume else str(uuid.uuid4())
+
+async def _start_hitl(request : ProcessEmailHITLRequest, thread_id : str) -> ProcessEmailHITLResponse:
+    """Start new HITL worflow, runs until the first interrupt or the end"""
+    config = {'configurable' : {'thread_id': thread_id}}
+    compiled_email_assistant_hitl = factory.get_email_assistant_hitl()
+    email_dict = {
+        'author': request.email_input.author,
+        'to':request.email_input.to,
+        'subject': request.email_input.subject,
+        'email_thread': request.email_input.email_thread
+    }
+    
+    async for chunk in compiled_email_assistant_hitl.astream( #chunk is state after every node
+        {'email_input': email_dict},
+        config= config,  ):
+        logger.debug("stream chunk: %s", chunk, extra={"thread_id": thread_id})
+        if '__interrupt__' in chunk:
+            return ProcessEmailHITLResponse(
+                status= 'interrupted',
+                thread_id= thread_id,
+                interrupt=_interrupt_info(chunk['__interrupt__'])
+            )
+    #no interrupt: respond / ignore emails run to the end in one go
+    final_state = await compiled_email_assistant_hitl.aget_state(config=config)
+    return ProcessEmailHITLResponse(
+        status= 'completed',
+        thread_id= thread_id,
+        result= _extract_final_result(final_state.values),
+    )
+
+async def _thread_exists(thread_id : str) -> None:
+    state = await factory.get_email_assistant_hitl().aget_state(config={'configurable' : {'thread_id': thread_id}})
+    logger.debug("state before resume: %s", state, extra={"thread_id": thread_id})
+    if not state or not state.values :
+        raise HTTPException(
+            status_code= 400,
+            detail= f"Thread id :{thread_id} either invalid "
+        )
+
+def _resume_command(request : ProcessEmailHITLRequest):
+    from langgraph.types import Command
+    human_response = request.human_response
+    return Command(resume=[
+        {
+            'type' : human_response.type,
+            'args' : human_response.args or {}
+        }
+    ])
+
+async def _claim_thread(thread_id : str):
+    """records an inline resume as the thread's running job, 409 when another job runs on the thread"""
+    job = await factory.get_job_runner().claim(thread_id, "resume")
+    if job is None:
+        raise await _thread_busy(thread_id)
+    return job
+
+async def _thread_busy(thread_id : str) -> HTTPException:
+    active = await factory.get_job_runner().active_job(thread_id)
+    return HTTPException(status_code= 409, detail= f"Thread {thread_id} already has a running job: {active}")
+
+async def _resume_hitl(request : ProcessEmailHITLRequest, thread_id : str) -> ProcessEmailHITLResponse:
+    """resume from interrupt, the endpoints check the thread with _thread_exists before claiming it"""
+    config = {'configurable' : {'thread_id': thread_id}}
+    compiled_email_assistant_hitl = factory.get_email_assistant_hitl()
+    try:
+        resume_command = _resume_command(request)
+        final_run_results = await compiled_email_assistant_hitl.ainvoke(resume_command, config=config,)
+        logger.debug("final run results: %s", final_run_results, extra={"thread_id": thread_id})
+        result = _extract_final_result(final_run_results)
+
+        return ProcessEmailHITLResponse(
+            status='completed',
+            thread_id=thread_id,
+            result=result,
+        )
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(
+            status_code=400, detail=f"Failed to resume thread: {str(e)}"
+        )
+
 @app.post('/process-email-hitl' , response_model= ProcessEmailHITLResponse)
 async def process_email_hitl_endpoint(request : ProcessEmailHITLRequest) :
     """
@@ -77,6 +250,8 @@ async def process_email_hitl_endpoint(request : ProcessEmailHITLRequest) :
     **Resume Workflow:**
     - Provide `thread_id` and `human_response`
     - System resumes from interrupt point
+
+    Long resumes can run as background jobs instead, see /process-email-hitl/jobs.
     
     Args:
         request: HITL request with email, thread_id, and/or human_response
@@ -85,101 +260,209 @@ async def process_email_hitl_endpoint(request : ProcessEmailHITLRequest) :
         HITL response with status, thread_id, and interrupt/result data
     """
     try:    
-        #determine if the incoming request is a new workflow or resume request
-        print(type(request))
-        print(request.email_input)
-        is_resume = request.thread_id is not None and request.human_response is not None
-        is_new = request.email_input is not None and request.thread_id is None
-        print('#'*40)
-        print("is_resume:",is_resume)
-        print("is_new:",is_new)
-        if not is_resume and not is_new:
-            raise HTTPException(
-                status_code= 400,
-                detail= "Either provide 'email_input' for new request or 'thread_id'+ 'human_response' for resume" 
-            )
-        thread_id = request.thread_id if is_resume else str(uuid.uuid4())
-        config = {'configurable' : {'thread_id': thread_id}}
-
-        if is_new:
-            #Start new HITL worflow
-            email_dict = {
-                'author': request.email_input.author,
-                'to':request.email_input.to,
-                'subject': request.email_input.subject,
-                'email_thread': request.email_input.email_thread
-            }
-            
-            for chunk in compiled_email_assistant_hitl.stream( #chunk is state after every node
-                {'email_input': email_dict},
-                config= config,  ):
-                print("#"*40)
-                print('Printing the chunks at each step:',chunk)
-                if '__interrupt__' in chunk:
-                    print("printing the interrupt part of the chunk")
-                    print(chunk['__interrupt__'])
-                    interrupt_data = chunk['__interrupt__'][0].value[0]
-                    return ProcessEmailHITLResponse(
-                        status= 'interrupted',
-                        thread_id= thread_id,
-                        interrupt=InterruptInfo(
-                            action= interrupt_data['action_request']['action'],
-                            args= interrupt_data['action_request']['args'],
-                            description=interrupt_data['description'],
-                            allowed_actions= _get_allowed_actions(interrupt_data['config'])
-                        )
-                    )
-        else:
-            #resume from interrupt
-            try:
-                state = compiled_email_assistant_hitl.get_state(config=config)
-                print('#'*40)
-                print(state)
-                print("Printing state.values :", state)
-                if not state or not state.values :
-                    raise HTTPException(
-                        status_code= 400,
-                        detail= f"Thread id :{thread_id} either invalid "
-                    )
-                human_response = request.human_response
-                resume_command = Command(resume=[
-                    {
-                        'type' : human_response.type,
-                        'args' : human_response.args or {}
-                    }
-                ])
-                final_run_results = compiled_email_assistant_hitl.invoke(resume_command, config=config,)
-                print('#'*40)
-                print(type(final_run_results))
-                print(final_run_results)
-                #print('Printing final_run_results :', final_run_results.values)
-                result = _extract_final_result(final_run_results)
-
-                return ProcessEmailHITLResponse(
-                    status='completed',
-                    thread_id=thread_id,
-                    result=result,
-                )
-            except Exception as e:
-                if isinstance(e, HTTPException):
-                    raise
-                raise HTTPException(
-                    status_code=400, detail=f"Failed to resume thread: {str(e)}"
-                )
-        raise HTTPException(
-            status_code=500, detail="Unexpected workflow state."
-        )
-         
+        is_resume, thread_id = _hitl_mode(request)
+        if not is_resume:
+            return await _start_hitl(request, thread_id)
+        await _thread_exists(thread_id)
+        job = await _claim_thread(thread_id)
+        #the job is closed however the resume ends, a cancelled request included
+        outcome = {"status": "failed", "result": None, "error": "request cancelled before the workflow finished"}
+        try:
+            response = await _resume_hitl(request, thread_id)
+            outcome = {"status": "completed", "result": jsonable_encoder(response), "error": None}
+        except Exception as e:
+            outcome["error"] = getattr(e, "detail", None) or str(e)
+            raise
+        finally:
+            await factory.get_job_runner().afinish(job, **outcome)
+        return response
     except Exception as e:
         if isinstance(e, HTTPException):
             raise
-        
+        logger.exception("error processing HITL email")
         raise HTTPException(
             status_code=500,
             detail=f"Error processing HITL email: {str(e)}"
         )
+
+
+def _job_response(job) -> JobResponse:
+    return JobResponse(
+        job_id= job.job_id,
+        thread_id= job.thread_id,
+        kind= job.kind,
+        status= job.status,
+        created_at= job.created_at,
+        updated_at= job.updated_at,
+        result= job.result,
+        error= job.error,
+    )
+
+@app.post('/process-email-hitl/jobs', response_model= JobResponse, status_code= 202)
+async def process_email_hitl_job_endpoint(request : ProcessEmailHITLJobRequest) :
+    """
+    Runs a /process-email-hitl request (new or resume) as a background job.
+
+    Returns the queued job right away, the graph then runs in the background.
+    Poll `GET /jobs/{job_id}` for the result, or pass `callback_url` to get the
+    finished job POSTed to it. A thread runs one job at a time (409 otherwise),
+    and an unknown thread_id or a callback_url outside
+    EMAIL_ASSISTANT_JOB_CALLBACK_ALLOWED_HOSTS is rejected before a job is created.
+    """
+    is_resume, thread_id = _hitl_mode(request)
+    runner = factory.get_job_runner()
+    if request.callback_url is not None and not runner.callback_allowed(request.callback_url):
+        raise HTTPException(status_code=400, detail="callback_url is not an allowed callback host")
+    if is_resume:
+        await _thread_exists(thread_id)
+
+    async def work() -> dict:
+        response = await (_resume_hitl(request, thread_id) if is_resume else _start_hitl(request, thread_id))
+        return jsonable_encoder(response)
+
+    job = await runner.submit(thread_id, "resume" if is_resume else "new", work, request.callback_url)
+    if job is None:
+        raise await _thread_busy(thread_id)
+    return _job_response(job)
+
+@app.get('/jobs/{job_id}', response_model= JobResponse)
+async def get_job(job_id : str) :
+    """State of a background job, with the HITL response once it completed"""
+    job = await factory.get_job_runner().get(job_id)
+    if job is None:
+        raise HTTPException(status_code= 404, detail= f"Unknown job {job_id}")
+    return _job_response(job)
   
     
+@app.post('/process-email-hitl/stream')
+async def process_email_hitl_stream_endpoint(request : ProcessEmailHITLRequest) -> StreamingResponse:
+    """
+    Streaming variant of /process-email-hitl, as server-sent events.
+
+    Accepts the same new / resume requests and emits, as soon as they are produced:
+
+    - `thread`: the thread_id, sent first
+    - `node`: every node completion with its state update (subgraph nodes included)
+    - `token`: LLM tokens of the response agent's llm_call (text and tool call argument chunks),
+      so the draft can be rendered while it is written
+    - `interrupt`: the interrupt payload when the workflow waits for a human
+    - `result`: the final result when the workflow completes
+    - `error`: if the workflow fails mid-stream
+    """
+    is_resume, thread_id = _hitl_mode(request)
+    config = {'configurable' : {'thread_id': thread_id}}
+    compiled_email_assistant_hitl = factory.get_email_assistant_hitl()
+
+    job = None
+    if is_resume:
+        await _thread_exists(thread_id)
+        job = await _claim_thread(thread_id)
+        graph_input = _resume_command(request)
+    else:
+        graph_input = {'email_input': request.email_input.model_dump()}
+
+    released = False
+
+    async def release(status : str, error = None) -> None:
+        """ends the claimed resume job once, however the response ends"""
+        nonlocal released
+        if job is None or released:
+            return
+        released = True
+        #afinish is shielded, the update still lands when a client disconnect cancels the response task
+        await factory.get_job_runner().afinish(job, status, error= error)
+
+    async def events():
+        #a stream closed by the client ends its resume job as failed
+        outcome = {"status": "failed", "error": "stream closed before the workflow finished"}
+        try:
+            yield _sse("thread", {"thread_id": thread_id})
+            #the generator runs in the response task, bind the thread_id here for the logs
+            with bind_thread_id(thread_id):
+                try:
+                    async for namespace, mode, data in compiled_email_assistant_hitl.astream(
+                        graph_input, config= config, stream_mode= ["updates", "messages"], subgraphs= True):
+                        if mode == "messages":
+                            message, metadata = data
+                            if message.type == "AIMessageChunk" and metadata.get("langgraph_node") == "llm_call":
+                                yield _sse("token", {
+                                    "content": message.content,
+                                    "tool_call_chunks": [{"name": tc.get("name"), "args": tc.get("args")} for tc in message.tool_call_chunks],
+                                })
+                        elif '__interrupt__' in data:
+                            outcome = {"status": "completed", "error": None}
+                            yield _sse("interrupt", {"thread_id": thread_id, "interrupt": _interrupt_info(data['__interrupt__'])})
+                            return
+                        else:
+                            for node, update in data.items():
+                                yield _sse("node", {"node": node, "namespace": list(namespace), "update": update})
+                    final_state = await compiled_email_assistant_hitl.aget_state(config=config)
+                    outcome = {"status": "completed", "error": None}
+                    yield _sse("result", {"thread_id": thread_id, "result": _extract_final_result(final_state.values)})
+                except Exception as e:
+                    logger.exception("error streaming HITL email")
+                    outcome = {"status": "failed", "error": str(e)}
+                    yield _sse("error", {"thread_id": thread_id, "error": f"Error processing HITL email: {str(e)}"})
+        finally:
+            await release(outcome["status"], outcome["error"])
+
+    #runs after the body, also when the client went away before it was iterated; a no-op once events() released
+    background = BackgroundTask(release, "failed", "stream closed before the workflow finished")
+    return StreamingResponse(events(), media_type= "text/event-stream", headers= {"Cache-Control": "no-cache"},
+                             background= background)
+
+@app.post('/ingest', response_model= IngestResponse, status_code= 202)
+async def ingest_endpoint(request : ProcessEmailRequest) :
+    """
+    Queues an email for processing, for mailbox webhooks.
+
+    Returns 202 as soon as the email is queued, a worker pool then runs it
+    through the same graph as /process-email. Transient LLM errors are retried
+    with backoff, emails that keep failing end up in the dead letters
+    (`GET /ingest/dead-letters`). When the queue is full the answer is 503 with
+    a Retry-After header.
+    """
+    from email_assistant.work_queue import QueueFull
+
+    try:
+        item = await factory.get_work_queue().submit(request.email_input.model_dump())
+    except QueueFull as e:
+        raise HTTPException(status_code= 503, detail= str(e), headers= {"Retry-After": "1"})
+    return IngestResponse(item_id= item.item_id)
+
+@app.get("/ingest/stats")
+def ingest_stats() -> Dict[str, int]:
+    """Depth, size limit, workers and dead letter count of the ingestion queue"""
+    return factory.get_work_queue().stats()
+
+@app.get("/ingest/dead-letters")
+def ingest_dead_letters(limit : int = 100) -> List[Dict[str, Any]]:
+    """Most recent emails that failed for good, with their last error"""
+    from dataclasses import asdict
+
+    return [asdict(item) for item in factory.get_work_queue().dead_letters(limit)]
+
+@app.get("/triage-cache/stats")
+def triage_cache_stats() -> Dict[str, float]:
+    """Hit and miss counters of the triage cache, each hit is one triage LLM call saved"""
+    return triage_cache.stats()
+
+@app.get("/triage-rules/stats")
+def triage_rules_stats() -> Dict[str, Any]:
+    """Hit counts of the rule-based pre-classifier"""
+    return {"min_confidence": triage_rules.min_confidence, "rules": triage_rules.stats()}
+
+@app.get("/prompts/stats")
+def prompt_stats() -> Dict[str, Any]:
+    """Prompt versions per profile and the share of input tokens served from the provider prompt cache"""
+    return prompt_registry.stats()
+
+@app.get("/metrics", response_class= PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Prometheus text exposition: per-node, per-tool and checkpoint latency histograms,
+    response agent loop iterations, classification and token counters"""
+    return PlainTextResponse(REGISTRY.render(), media_type= "text/plain; version=0.0.4")
+
 @app.get("/health")
 def health() -> Dict[str,str]:
     return {"status": "running", "health" : "OK"}
@@ -0,0 +1,292 @@
+"""In-process metrics exported in the Prometheus text format on /metrics.
+
+A small Counter / Gauge / Histogram implementation: no extra dependency, and
+recording a value is a dict lookup plus a short locked update (about a
+microsecond), so the handful of observations per request stay well below the
+cost of a single graph step.
+
+The assistant's metrics are defined at the bottom of this module and recorded
+by the node wrapper (log.timed_node), the tool runner, the checkpointer, the
+triage classifier and the prompt registry.
+"""
+import math
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Registry:
+    """the set of metrics rendered by /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name!r} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+    def reset(self) -> None:
+        """drops every recorded value, keeps the metric definitions"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lookup: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values) -> object:
+        """the child for these label values, created on first use"""
+        # hot path: one dict lookup on the values as passed
+        child = self._lookup.get(values)
+        if child is None:
+            child = self._create(values)
+        return child
+
+    def _create(self, values: tuple) -> object:
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+        with self._lock:
+            child = self._children.setdefault(key, self._new_child())
+            self._lookup[values] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, labels: Tuple[str, ...], child) -> List[str]:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        with self._lock:
+            self._children.clear()
+            self._lookup.clear()
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for labels, child in children:
+            lines.extend(self._samples(labels, child))
+        return "\n".join(lines) + "\n"
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        with self.lock:
+            self.value = value
+
+
+class Counter(_Metric):
+    """monotonically increasing count, rendered with the _total suffix"""
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        """for counters without labels"""
+        self.labels().inc(amount)
+
+    def _samples(self, labels, child):
+        return [f"{self.name}_total{_format_labels(self.labelnames, labels)} {_format_value(child.value)}"]
+
+
+class Gauge(_Metric):
+    """value that goes up and down"""
+    type = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float) -> None:
+        """for gauges without labels"""
+        self.labels().set(value)
+
+    def _samples(self, labels, child):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child.value)}"]
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """distribution over fixed buckets, rendered cumulative with _bucket / _sum / _count"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.upper_bounds = tuple(sorted(float(bound) for bound in buckets if bound != math.inf))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        """for histograms without labels"""
+        self.labels().observe(value)
+
+    def _samples(self, labels, child):
+        with child.lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.upper_bounds + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+# the assistant's metrics
+
+NODE_LATENCY = Histogram(
+    "email_assistant_node_latency_seconds", "Wall time of one graph node run", ["node"],
+)
+TOOL_LATENCY = Histogram(
+    "email_assistant_tool_latency_seconds", "Wall time of one tool call", ["tool", "status"],
+)
+CHECKPOINT_LATENCY = Histogram(
+    "email_assistant_checkpoint_latency_seconds", "Wall time of one checkpointer operation", ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+AGENT_LOOP_ITERATIONS = Histogram(
+    "email_assistant_agent_loop_iterations", "llm_call turns of the response agent per run",
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30),
+)
+CLASSIFICATIONS = Counter(
+    "email_assistant_classifications", "Triage decisions by classification and by where they came from",
+    ["classification", "source"],
+)
+LLM_TOKENS = Counter(
+    "email_assistant_llm_tokens", "Tokens reported in the usage metadata of LLM responses",
+    ["prompt", "type"],
+)
+HISTORY_TOKENS_SAVED = Histogram(
+    "email_assistant_history_tokens_saved", "Estimated input tokens saved by history compaction per response agent run",
+    buckets=(0, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000),
+)
+TRIAGE_ESCALATIONS = Counter(
+    "email_assistant_triage_escalations", "Triage decisions sent on to the large model, by reason (vip, low_confidence)",
+    ["reason"],
+)
+AGENT_STOPS = Counter(
+    "email_assistant_agent_stops", "Response agent runs by why they ended "
+    "(done, terminal_tool, step_budget, repeated_call, no_tool_call)",
+    ["reason"],
+)
+AGENT_LLM_CALLS_SAVED = Counter(
+    "email_assistant_agent_llm_calls_saved", "llm_call round trips skipped by ending runs after a terminal tool",
+)
+SPECULATION_DECISIONS = Counter(
+    "email_assistant_speculation_decisions", "Triage runs that started a speculative draft (speculate) or not (skip)",
+    ["decision"],
+)
+SPECULATIVE_DRAFTS = Counter(
+    "email_assistant_speculative_drafts", "Speculative drafts by outcome (committed, cancelled, failed)",
+    ["outcome"],
+)
+SPECULATION_WASTED_TOKENS = Counter(
+    "email_assistant_speculation_wasted_tokens", "Tokens spent on speculative drafts that were cancelled",
+)
+SPECULATION_LATENCY_GAINED = Histogram(
+    "email_assistant_speculation_latency_gained_seconds", "Time triage and a committed speculative draft overlapped",
+)
+JOB_LATENCY = Histogram(
+    "email_assistant_job_latency_seconds", "Time from submission to the end of a background job, queueing included",
+    ["kind", "status"],
+)
+WORK_QUEUE_DEPTH = Gauge(
+    "email_assistant_work_queue_depth", "Ingestion queue items queued or running, retries included",
+)
+WORK_QUEUE_ITEMS = Counter(
+    "email_assistant_work_queue_items", "Ingestion queue events (enqueued, rejected, completed, retried, dead_lettered)",
+    ["outcome"],
+)
+WORK_QUEUE_WAIT = Histogram(
+    "email_assistant_work_queue_wait_seconds", "Time an ingested email waited for its first attempt",
+)
+LLM_RATE_LIMIT = Gauge(
+    "email_assistant_llm_rate_limit", "Current client-side LLM limits (rpm, tpm, adaptive concurrency), 0 is unlimited",
+    ["limit"],
+)
+LLM_IN_FLIGHT = Gauge(
+    "email_assistant_llm_in_flight", "Chat-model calls currently sent to the provider",
+)
+LLM_RATE_LIMIT_WAIT = Histogram(
+    "email_assistant_llm_rate_limit_wait_seconds", "Time a chat-model call waited for the client-side rate limiter",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0),
+)
+LLM_RATE_LIMITED = Counter(
+    "email_assistant_llm_rate_limited", "Chat-model calls rejected by the provider with a 429",
+)
@@ -0,0 +1,131 @@
+"""Cleans email bodies before they reach the triage and response agent prompts.
+
+A real reply chain carries every earlier message quoted below the new one,
+signatures, legal footers and often HTML; all of it was sent to the model on
+every triage call and every response agent turn. ``clean_email_body``:
+
+1. converts HTML to text (scripts, styles and ``<blockquote>`` quotes are dropped)
+2. cuts the quoted history: ``>`` lines and everything from the first reply
+   header on ("On ... wrote:", "-----Original Message-----", an Outlook
+   From:/Sent: block that does not follow a forwarded-message marker)
+3. cuts the signature after a ``-- `` delimiter, "Sent from my ..." lines and
+   trailing confidentiality / disclaimer footers
+4. truncates what is left to a token budget (``estimate_tokens``, no tokenizer)
+
+Forwarded messages and unsubscribe footers are kept on purpose: the forwarded
+text is usually what the email is about, and "unsubscribe" is one of the
+strongest triage signals for newsletters. If a step would leave nothing, the
+text from before that step is kept.
+"""
+import html
+import re
+from functools import lru_cache
+
+from email_assistant.config import PREPROCESS_ENABLED, PREPROCESS_TOKEN_BUDGET
+from email_assistant.history import estimate_tokens
+
+TRUNCATION_MARKER = "\n[... truncated]"
+
+_HTML_HINT = re.compile(r"<(?:html|body|div|p|br|table|span|blockquote|a)\b", re.IGNORECASE)
+_HTML_DROP = re.compile(r"<(script|style|head|blockquote)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_HTML_BREAK = re.compile(r"<br\s*/?>|</(?:p|div|tr|h[1-6]|ul|ol|table)\s*>", re.IGNORECASE)
+_HTML_ITEM = re.compile(r"<li\b[^>]*>", re.IGNORECASE)
+_HTML_TAG = re.compile(r"<[^>]+>")
+
+_REPLY_HEADERS = (
+    re.compile(r"^on\b.{0,200}\bwrote:\s*$", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*original message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"^_{10,}\s*$"),
+)
+_FORWARD_MARKER = re.compile(r"^(-{2,}\s*forwarded message\s*-{2,}|begin forwarded message:)", re.IGNORECASE)
+_OUTLOOK_FROM = re.compile(r"^\*?from:\*?\s", re.IGNORECASE)
+_OUTLOOK_FIELD = re.compile(r"^\*?(sent|date|to|subject):\*?\s", re.IGNORECASE)
+_SIGNATURE_DELIMITER = re.compile(r"^--\s?$")
+_MOBILE_FOOTER = re.compile(r"^(sent from my \w+|sent from (outlook|mail) for \w+|get outlook for \w+)", re.IGNORECASE)
+_DISCLAIMER = re.compile(
+    r"^(confidentiality notice|disclaimer|this (e-?mail|message)(,? and any (files|attachments)[^.]*,?)? (is|are|may contain|contains) (confidential|privileged|intended))",
+    re.IGNORECASE,
+)
+_BLANK_RUNS = re.compile(r"\n{3,}")
+
+
+def html_to_text(text: str) -> str:
+    text = _HTML_DROP.sub("", text)
+    text = _HTML_BREAK.sub("\n", text)
+    text = _HTML_ITEM.sub("\n- ", text)
+    text = _HTML_TAG.sub("", text)
+    return html.unescape(text).replace("\xa0", " ")
+
+
+def _reply_header_at(lines: list, i: int) -> bool:
+    line = lines[i].strip()
+    if any(pattern.match(line) for pattern in _REPLY_HEADERS):
+        return True
+    # "On Mon, 3 Jun 2024 at 10:00, Alice <alice@company.com>" wrapped onto a second "wrote:" line
+    if line.lower().startswith("on ") and i + 1 < len(lines) and lines[i + 1].strip().lower().endswith("wrote:"):
+        return True
+    # Outlook: From: followed by Sent: / To: / Subject: lines
+    if not _OUTLOOK_FROM.match(line) or not any(_OUTLOOK_FIELD.match(l.strip()) for l in lines[i + 1:i + 4]):
+        return False
+    # the same header block opens a Gmail / Apple Mail forward, whose text is kept
+    return not _forwarded_header(lines, i)
+
+
+def _forwarded_header(lines: list, i: int) -> bool:
+    """a forwarded-message marker within the 3 lines above the From: line"""
+    return any(_FORWARD_MARKER.match(l.strip()) for l in lines[max(0, i - 3):i])
+
+
+def strip_quoted_history(text: str) -> str:
+    lines = text.split("\n")
+    kept = []
+    for i, line in enumerate(lines):
+        if _reply_header_at(lines, i):
+            break
+        if not line.lstrip().startswith(">"):
+            kept.append(line)
+    return "\n".join(kept)
+
+
+def strip_signature(text: str) -> str:
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        if _SIGNATURE_DELIMITER.match(line.rstrip()) or _DISCLAIMER.match(line.strip()):
+            lines = lines[:i]
+            break
+    return "\n".join(line for line in lines if not _MOBILE_FOOTER.match(line.strip()))
+
+
+def truncate_to_budget(text: str, token_budget: int) -> str:
+    """keeps the start of the text, cut at a whitespace boundary, when it is over token_budget"""
+    if token_budget <= 0 or estimate_tokens(text) <= token_budget:
+        return text
+    limit = token_budget * 4 - len(TRUNCATION_MARKER)
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip() + TRUNCATION_MARKER
+
+
+def _non_empty(cleaned: str, fallback: str) -> str:
+    return cleaned if cleaned.strip() else fallback
+
+
+@lru_cache(maxsize=512)
+def clean_email_body(text: str, token_budget: int = PREPROCESS_TOKEN_BUDGET) -> str:
+    """email body without HTML, quoted history and signature, truncated to token_budget.
+
+    Cached: triage and the response agent clean the same body of every email.
+    """
+    cleaned = text.replace("\r\n", "\n").replace("\r", "\n")
+    if _HTML_HINT.search(cleaned):
+        cleaned = _non_empty(html_to_text(cleaned), cleaned)
+    cleaned = _non_empty(strip_quoted_history(cleaned), cleaned)
+    cleaned = _non_empty(strip_signature(cleaned), cleaned)
+    cleaned = _BLANK_RUNS.sub("\n\n", "\n".join(line.rstrip() for line in cleaned.split("\n"))).strip()
+    return truncate_to_budget(cleaned, token_budget)
+
+
+def preprocess_email(email_input: dict) -> dict:
+    """copy of the email with a cleaned email_thread, the input itself is left as it is"""
+    if not PREPROCESS_ENABLED or not email_input.get("email_thread"):
+        return email_input
+    return {**email_input, "email_thread": clean_email_body(email_input["email_thread"])}
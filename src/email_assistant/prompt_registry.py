@@ -0,0 +1,195 @@
+"""Pre-rendered, versioned prompts laid out for provider prompt caching.
+
+The static parts of the triage and agent system prompts depend only on the
+profile (background, triage instructions, preferences), so they are rendered
+once per profile instead of on every LLM call. Every request then starts with
+the same byte-identical prefix, which is what OpenAI prompt caching matches
+on. Volatile data (today's date) is sent last, after the conversation, so it
+never breaks that prefix.
+
+The registry also reads ``input_token_details.cache_read`` from the usage
+metadata of every response and reports the cached-token ratio per prompt.
+"""
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Dict, List, Optional
+
+from email_assistant.metrics import LLM_TOKENS
+from email_assistant.prompts import (
+    AGENT_DATE_PROMPT,
+    AGENT_PROMPT_VERSION,
+    DEFAULT_CAL_PREFERENCES,
+    DEFAULT_RESPONSE_PREFERENCES,
+    TRIAGE_PROMPT_VERSION,
+    TRIAGE_SYSTEM_PROMPT,
+    TRIAGE_USER_PROMPT,
+    Agent_system_prompt,
+    default_background,
+    default_triage_instructions,
+)
+from email_assistant.utils import email_parser
+
+DEFAULT_PROFILE = "default"
+
+
+@dataclass(frozen=True)
+class PromptProfile:
+    """the user specific text that fills the static prompt templates"""
+    name: str
+    background: str = default_background
+    triage_instructions: str = default_triage_instructions
+    response_preferences: str = DEFAULT_RESPONSE_PREFERENCES
+    calendar_preferences: str = DEFAULT_CAL_PREFERENCES
+
+
+@dataclass(frozen=True)
+class RenderedPrompts:
+    """system prompts of one profile, rendered once"""
+    profile: str
+    triage_system: str
+    agent_system: str
+    triage_version: str
+    agent_version: str
+
+
+def _version(template_version: str, rendered: str) -> str:
+    """template version plus a short hash of the rendered text, changes with the profile too"""
+    return f"{template_version}-{hashlib.sha256(rendered.encode('utf-8')).hexdigest()[:12]}"
+
+
+def render_profile(profile: PromptProfile) -> RenderedPrompts:
+    triage_system = TRIAGE_SYSTEM_PROMPT.format(
+        background = profile.background, triage_instructions = profile.triage_instructions
+    )
+    agent_system = Agent_system_prompt.format(
+        background = profile.background,
+        response_preferences = profile.response_preferences,
+        calendar_preferences = profile.calendar_preferences,
+    )
+    return RenderedPrompts(
+        profile= profile.name,
+        triage_system= triage_system,
+        agent_system= agent_system,
+        triage_version= _version(TRIAGE_PROMPT_VERSION, triage_system),
+        agent_version= _version(AGENT_PROMPT_VERSION, agent_system),
+    )
+
+
+@dataclass
+class _CacheUsage:
+    calls: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    calls_with_cache_hit: int = 0
+
+
+@dataclass
+class PromptRegistry:
+    """Rendered prompts per profile, plus prompt cache usage per prompt name.
+
+    Args:
+        profiles: profiles known up front, the default profile is always registered
+        today: source of the date appended to agent prompts, read on every call
+    """
+    profiles: List[PromptProfile] = field(default_factory=list)
+    today: Callable[[], date] = date.today
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._rendered: Dict[str, RenderedPrompts] = {}
+        self._usage: Dict[str, _CacheUsage] = {}
+        self.register(PromptProfile(DEFAULT_PROFILE))
+        for profile in self.profiles:
+            self.register(profile)
+
+    def register(self, profile: PromptProfile) -> RenderedPrompts:
+        """renders a profile, replacing an earlier profile with the same name"""
+        rendered = render_profile(profile)
+        with self._lock:
+            self._rendered[profile.name] = rendered
+        return rendered
+
+    def get(self, profile: str = DEFAULT_PROFILE) -> RenderedPrompts:
+        try:
+            return self._rendered[profile]
+        except KeyError:
+            raise KeyError(f"unknown prompt profile {profile!r}") from None
+
+    def triage_messages(self, email_input: dict, profile: str = DEFAULT_PROFILE) -> list:
+        """static system prompt first, the email last"""
+        author, to, subject, email_thread = email_parser(email_input)
+        user_prompt = TRIAGE_USER_PROMPT.format( author = author , to = to , subject = subject ,email_thread = email_thread)
+        return [
+            {"role": "system", "content": self.get(profile).triage_system},
+            {"role": "user", "content": user_prompt}]
+
+    def agent_messages(self, messages: list, profile: str = DEFAULT_PROFILE) -> list:
+        """static system prompt, the conversation so far, then today's date"""
+        date_prompt = AGENT_DATE_PROMPT.format(today = self.today().strftime('%Y-%m-%d'))
+        return (
+            [{"role": "system", "content": self.get(profile).agent_system}]
+            + list(messages)
+            + [{"role": "system", "content": date_prompt}]
+        )
+
+    def record_usage(self, prompt: str, message) -> None:
+        """adds the usage metadata of one response (an AIMessage) to the stats of `prompt`"""
+        usage = getattr(message, "usage_metadata", None)
+        if not usage:
+            return
+        cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+        LLM_TOKENS.labels(prompt, "prompt").inc(usage.get("input_tokens", 0))
+        LLM_TOKENS.labels(prompt, "completion").inc(usage.get("output_tokens", 0))
+        with self._lock:
+            stats = self._usage.setdefault(prompt, _CacheUsage())
+            stats.calls += 1
+            stats.input_tokens += usage.get("input_tokens", 0)
+            stats.cached_tokens += cached
+            stats.calls_with_cache_hit += cached > 0
+
+    def stats(self) -> Dict[str, Dict]:
+        """prompt versions per profile and cached-token ratio per prompt"""
+        with self._lock:
+            usage = {
+                prompt: {
+                    "calls": u.calls,
+                    "input_tokens": u.input_tokens,
+                    "cached_tokens": u.cached_tokens,
+                    "cached_token_ratio": u.cached_tokens / u.input_tokens if u.input_tokens else 0.0,
+                    "calls_with_cache_hit": u.calls_with_cache_hit,
+                }
+                for prompt, u in self._usage.items()
+            }
+            versions = {
+                name: {"triage": r.triage_version, "agent": r.agent_version}
+                for name, r in self._rendered.items()
+            }
+        return {"versions": versions, "usage": usage}
+
+    def reset_usage(self) -> None:
+        with self._lock:
+            self._usage.clear()
+
+
+prompt_registry = PromptRegistry()
+
+
+def triage_prompt_version(profile: str = DEFAULT_PROFILE) -> str:
+    return prompt_registry.get(profile).triage_version
+
+
+def unwrap_structured(prompt: str, result):
+    """returns the parsed output of a ``with_structured_output(..., include_raw=True)`` result.
+
+    The raw message's usage is recorded under `prompt`. Plain results (e.g. a
+    router built without include_raw) pass through unchanged.
+    """
+    if not isinstance(result, dict) or "parsed" not in result:
+        return result
+    prompt_registry.record_usage(prompt, result.get("raw"))
+    if result["parsed"] is None:
+        error: Optional[BaseException] = result.get("parsing_error")
+        raise error or ValueError("structured output could not be parsed")
+    return result["parsed"]
@@ -0,0 +1,300 @@
+"""Client-side rate limiting shared by every chat-model call of the process.
+
+Triage, the response agent and the LLM-as-judge grader all call the provider
+on their own; under a burst they overrun the account's quota, get 429s and
+retry blindly. Every model the factory hands out is wrapped in
+``RateLimitedRunnable``, and all of them share one ``RateLimiter``:
+
+* requests per minute and tokens per minute are token buckets
+  (EMAIL_ASSISTANT_LLM_RPM / EMAIL_ASSISTANT_LLM_TPM, 0 is unlimited). A call
+  takes its estimated tokens (the prompt plus
+  EMAIL_ASSISTANT_LLM_OUTPUT_TOKENS_ESTIMATE) before it is sent, once it
+  returns the estimate is swapped for the usage the provider reported
+* concurrency adapts AIMD-style, between EMAIL_ASSISTANT_LLM_MIN_CONCURRENCY
+  and EMAIL_ASSISTANT_LLM_MAX_CONCURRENCY: every successful call adds
+  1 / limit (about one more slot per round of calls), a 429 halves it. Only a
+  429 from a call started after the last decrease lowers it again, so one burst
+  of rejections counts once. Other failures (timeouts, 5xx, connection errors)
+  and cancelled calls leave it unchanged
+
+The current limits, calls in flight and the time calls waited are exported as
+metrics.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from email_assistant.config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MIN_CONCURRENCY,
+    LLM_OUTPUT_TOKENS_ESTIMATE,
+    LLM_RATE_LIMIT_ENABLED,
+    LLM_RPM,
+    LLM_TPM,
+)
+from email_assistant.history import estimate_tokens, message_tokens
+from email_assistant.metrics import LLM_IN_FLIGHT, LLM_RATE_LIMIT, LLM_RATE_LIMITED, LLM_RATE_LIMIT_WAIT
+
+#calls waiting for a concurrency slot are woken by the call that frees it, this is only a safety net
+SLOT_WAIT_SECONDS = 0.05
+
+
+class TokenBucket:
+    """`per_minute` units refilled continuously, holding at most one minute's worth.
+
+    The balance may go negative when a reconciled call used more than it took,
+    the next calls then wait for the debt to be refilled.
+    """
+
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """seconds until `amount` is available, 0 if it is now. Larger than the
+        capacity waits for a full bucket"""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount
+
+    def give_back(self, amount: float) -> None:
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass
+class Permit:
+    estimated_tokens: int
+    generation: int
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+class RateLimiter:
+    """RPM / TPM token buckets plus an AIMD concurrency limit, safe to share between threads and event loops"""
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 min_concurrency: int = LLM_MIN_CONCURRENCY, clock=time.monotonic):
+        self.requests = TokenBucket(rpm, clock) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, clock) if tpm > 0 else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.in_flight = 0
+        #bumped by every decrease, a 429 of a call started before it does not decrease again
+        self.generation = 0
+        self._waiters: "deque[Callable[[], None]]" = deque()
+        self._lock = threading.Lock()
+        LLM_RATE_LIMIT.labels("rpm").set(rpm)
+        LLM_RATE_LIMIT.labels("tpm").set(tpm)
+        self._export()
+
+    def _export(self) -> None:
+        LLM_RATE_LIMIT.labels("concurrency").set(math.floor(self.concurrency))
+        LLM_IN_FLIGHT.set(self.in_flight)
+
+    def try_acquire(self, estimated_tokens: int, waker: Optional[Callable[[], None]] = None) -> "tuple[float, Optional[Permit]]":
+        """a Permit when the call may start now, else how long to wait before asking again.
+
+        When all slots are taken `waker` is registered and called once a slot frees up.
+        """
+        with self._lock:
+            if self.in_flight >= math.floor(self.concurrency):
+                if waker is not None:
+                    self._waiters.append(waker)
+                return SLOT_WAIT_SECONDS, None
+            wait = max(
+                self.requests.wait_time(1) if self.requests else 0.0,
+                self.tokens.wait_time(estimated_tokens) if self.tokens else 0.0,
+            )
+            if wait > 0:
+                return wait, None
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(estimated_tokens)
+            self.in_flight += 1
+            self._export()
+            return 0.0, Permit(estimated_tokens, self.generation)
+
+    def release(self, permit: Permit, used_tokens: Optional[int] = None, rate_limited: bool = False,
+                success: bool = True) -> None:
+        """ends a call: reconciles its tokens with the reported usage and adapts the concurrency.
+
+        Only a successful call raises the concurrency, only a rate-limited one lowers it.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if self.tokens and used_tokens is not None:
+                self.tokens.give_back(permit.estimated_tokens - used_tokens)
+            if rate_limited:
+                if permit.generation == self.generation:
+                    self.concurrency = max(float(self.min_concurrency), self.concurrency / 2)
+                    self.generation += 1
+            elif success:
+                self.concurrency = min(float(self.max_concurrency), self.concurrency + 1 / self.concurrency)
+            self._export()
+            free = math.floor(self.concurrency) - self.in_flight
+            wake = [self._waiters.popleft() for _ in range(min(free, len(self._waiters)))]
+        for waker in wake:
+            waker()
+
+    def _forget(self, waker: Callable[[], None]) -> None:
+        with self._lock:
+            try:
+                self._waiters.remove(waker)
+            except ValueError:
+                pass
+
+    def acquire(self, estimated_tokens: int) -> Permit:
+        """blocks the thread until the call may start"""
+        event = threading.Event()
+        while True:
+            event.clear()
+            wait, permit = self.try_acquire(estimated_tokens, event.set)
+            if permit is not None:
+                return permit
+            if not event.wait(wait):
+                self._forget(event.set)
+
+    async def aacquire(self, estimated_tokens: int) -> Permit:
+        """waits on the event loop until the call may start"""
+        loop = asyncio.get_running_loop()
+        while True:
+            woken = loop.create_future()
+
+            def wake():
+                try:
+                    loop.call_soon_threadsafe(lambda: woken.done() or woken.set_result(None))
+                except RuntimeError:
+                    #the waiting loop is already closed
+                    pass
+
+            wait, permit = self.try_acquire(estimated_tokens, wake)
+            if permit is not None:
+                return permit
+            try:
+                await asyncio.wait_for(woken, wait)
+            except asyncio.TimeoutError:
+                self._forget(wake)
+            except BaseException:
+                self._forget(wake)
+                raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": math.floor(self.concurrency),
+                "in_flight": self.in_flight,
+                "requests_available": self.requests.tokens if self.requests else None,
+                "tokens_available": self.tokens.tokens if self.tokens else None,
+            }
+
+
+rate_limiter = RateLimiter()
+
+
+def estimate_input_tokens(value: Any) -> int:
+    """estimated prompt tokens of a model input: a message list, a string or a prompt value"""
+    if isinstance(value, str):
+        return estimate_tokens(value)
+    if hasattr(value, "to_messages"):
+        value = value.to_messages()
+    if isinstance(value, BaseMessage):
+        value = [value]
+    if isinstance(value, (list, tuple)):
+        return sum(message_tokens(m) if isinstance(m, (BaseMessage, dict)) else estimate_tokens(str(m)) for m in value)
+    return estimate_tokens(str(value))
+
+
+def reported_tokens(output: Any) -> Optional[int]:
+    """total tokens in the usage metadata of a model output (raw message of a structured output included)"""
+    if isinstance(output, dict) and "raw" in output:
+        output = output["raw"]
+    usage = getattr(output, "usage_metadata", None)
+    if not usage:
+        return None
+    return usage.get("total_tokens") or usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+class RateLimitedRunnable(Runnable):
+    """runs `bound` (a chat model, with tools or structured output) through the shared limiter.
+
+    batch / abatch / stream fall back to the Runnable defaults, which go through
+    invoke / ainvoke, so every call is limited.
+    """
+
+    def __init__(self, bound: Runnable, limiter: RateLimiter, output_tokens: int = LLM_OUTPUT_TOKENS_ESTIMATE):
+        self.bound = bound
+        self.limiter = limiter
+        self.output_tokens = output_tokens
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def _estimate(self, input: Any) -> int:
+        return estimate_input_tokens(input) + self.output_tokens
+
+    def _end(self, permit: Permit, output: Any = None, error: Optional[BaseException] = None) -> None:
+        rate_limited = error is not None and is_rate_limit_error(error)
+        if rate_limited:
+            LLM_RATE_LIMITED.inc()
+        #a failed call's usage is unknown, its estimate stays taken
+        self.limiter.release(permit, reported_tokens(output) if error is None else None, rate_limited, error is None)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        permit = self.limiter.acquire(self._estimate(input))
+        LLM_RATE_LIMIT_WAIT.observe(time.perf_counter() - started)
+        try:
+            output = self.bound.invoke(input, config, **kwargs)
+        except BaseException as e:
+            self._end(permit, error=e)
+            raise
+        self._end(permit, output)
+        return output
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        permit = await self.limiter.aacquire(self._estimate(input))
+        LLM_RATE_LIMIT_WAIT.observe(time.perf_counter() - started)
+        try:
+            output = await self.bound.ainvoke(input, config, **kwargs)
+        except BaseException as e:
+            self._end(permit, error=e)
+            raise
+        self._end(permit, output)
+        return output
+
+
+def rate_limited(runnable: Runnable, limiter: Optional[RateLimiter] = None) -> Runnable:
+    """`runnable` behind the shared limiter, unchanged when EMAIL_ASSISTANT_LLM_RATE_LIMIT=0"""
+    if not LLM_RATE_LIMIT_ENABLED:
+        return runnable
+    return RateLimitedRunnable(runnable, limiter or rate_limiter)
@@ -1,13 +1,7 @@
 """Pydantic models and type definitions for the email assistant"""
-from langgraph.graph import MessagesState
 from typing import Literal , Optional , Dict, Any, List
 from pydantic import BaseModel , Field
 
-class State(MessagesState):
-    """State for thr email assistant graph"""
-    email_input : dict
-    classification_response : Literal["ignore","respond","notify"]
-
 class RouterSchema(BaseModel):
     """Schema for email triage routing decisions.""" 
     classification: Literal["ignore", "respond", "notify"] = Field(
@@ -18,6 +12,17 @@ class RouterSchema(BaseModel):
     reasoning: str = Field(
         description="Step-by-step reasoning behind the classification."
     )
+    #required: a model that leaves it out must not count as certain and skip escalation
+    confidence: float = Field(
+        ge= 0.0,
+        le= 1.0,
+        description="Confidence in the classification, from 0 (a guess) to 1 (certain).",
+    )
+
+class EVAL_SCHEMA(BaseModel):
+    """Score the response against specific criteria"""
+    justification : str = Field(description="the justification for grade. also provide example from the response")
+    grade : bool = Field(description="Mark true if response satisfy all bullet point criteria, else mark false.")
 
 class ProcessEmailResponse(BaseModel):
     """Response schema for processing email"""
@@ -90,3 +95,51 @@ class ProcessEmailHITLResponse(BaseModel):
         description="Error message when status=error"
     )
 
+class ProcessEmailHITLJobRequest(ProcessEmailHITLRequest):
+    """A HITL request run as a background job"""
+    callback_url : Optional[str] = Field(
+        default= None,
+        description= "URL that receives the finished job as a JSON POST."
+    )
+
+class JobResponse(BaseModel):
+    """State of a background job"""
+    job_id : str
+    thread_id : str = Field(description="Thread the job runs, resume it with this id")
+    kind : Literal["new", "resume"]
+    status : Literal["queued", "running", "completed", "failed"]
+    created_at : float
+    updated_at : float
+    result : Optional[ProcessEmailHITLResponse] = Field(
+        default= None,
+        description= "The /process-email-hitl response, when status=completed"
+    )
+    error : Optional[str] = Field(default= None, description= "Error message when status=failed")
+
+class IngestResponse(BaseModel):
+    """An email accepted by /ingest"""
+    item_id : str
+    status : Literal["queued"] = "queued"
+
+class ProcessEmailBatchRequest(BaseModel):
+    """Defines the batch input request schema"""
+    email_inputs : List[EmailInput] = Field(description="Emails to triage and, if needed, respond to.")
+    max_concurrency : Optional[int] = Field(
+        default= None,
+        ge= 1,
+        description= "Max emails processed at the same time, defaults to EMAIL_ASSISTANT_BATCH_CONCURRENCY."
+    )
+
+class BatchItemResult(BaseModel):
+    """Result for one email of a batch, either the processing result or the error"""
+    index : int = Field(description="Position of the email in the request")
+    classification : Optional[Literal["ignore","respond","notify"]] = None
+    response : Optional[str] = None
+    reasoning : Optional[str] = None
+    error : Optional[str] = Field(default=None, description="Error message when this email failed")
+
+class ProcessEmailBatchResponse(BaseModel):
+    """Response schema for batch email processing"""
+    results : List[BatchItemResult]
+    succeeded : int
+    failed : int
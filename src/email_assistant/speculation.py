@@ -0,0 +1,167 @@
+"""Speculative drafting: the response agent's first llm_call runs alongside triage.
+
+For an email that will be answered, the async graph normally runs triage and
+then the first drafting call back to back. When speculation is on
+(EMAIL_ASSISTANT_SPECULATIVE_DRAFTING=1) and the sender's triage history says
+the email is likely a ``respond`` (at least EMAIL_ASSISTANT_SPECULATION_THRESHOLD),
+``run_speculatively`` starts that first drafting call at the same moment as
+triage:
+
+* triage says respond: the draft is committed, the response agent starts from
+  it instead of calling the model again, and the time the two calls overlapped
+  is the latency gained
+* anything else: the draft is cancelled, and its tokens are counted as wasted
+  (the usage of a finished draft, the estimated prompt of a cancelled one)
+* a failed draft is dropped and the response agent drafts as usual
+
+``SenderHistory`` holds the respond rate per sender address, per domain and
+overall, learned from every triage decision the graph makes.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import parseaddr
+from typing import Awaitable, Dict, List, Optional, Tuple
+
+from email_assistant.config import (
+    SPECULATION_HISTORY_MAX_SENDERS,
+    SPECULATION_MIN_OBSERVATIONS,
+    SPECULATION_THRESHOLD,
+    SPECULATIVE_DRAFTING,
+)
+from email_assistant.history import message_tokens
+from email_assistant.metrics import SPECULATION_DECISIONS, SPECULATION_LATENCY_GAINED, SPECULATIVE_DRAFTS, SPECULATION_WASTED_TOKENS
+from email_assistant.prompt_registry import prompt_registry
+
+logger = logging.getLogger(__name__)
+
+ALL_SENDERS = "*"
+
+
+@dataclass
+class _Counts:
+    respond: int = 0
+    total: int = 0
+
+
+class SenderHistory:
+    """respond rate per sender, per sender domain and overall, bounded to the most recent senders"""
+
+    def __init__(self, max_senders: int = SPECULATION_HISTORY_MAX_SENDERS, min_observations: int = SPECULATION_MIN_OBSERVATIONS):
+        self.max_senders = max_senders
+        self.min_observations = min_observations
+        self._counts: "OrderedDict[str, _Counts]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(email_input: dict) -> List[str]:
+        address = parseaddr(email_input.get("author", ""))[1].lower()
+        keys = [address, "@" + address.rpartition("@")[2]] if address else []
+        return keys + [ALL_SENDERS]
+
+    def record(self, email_input: dict, classification: str) -> None:
+        with self._lock:
+            for key in self._keys(email_input):
+                counts = self._counts.get(key)
+                if counts is None:
+                    counts = self._counts[key] = _Counts()
+                self._counts.move_to_end(key)
+                counts.total += 1
+                counts.respond += classification == "respond"
+            while len(self._counts) > self.max_senders:
+                oldest = next(iter(self._counts))
+                if oldest == ALL_SENDERS:
+                    self._counts.move_to_end(oldest)
+                    continue
+                del self._counts[oldest]
+
+    def respond_probability(self, email_input: dict) -> float:
+        """Laplace-smoothed respond rate of the most specific key with enough observations"""
+        with self._lock:
+            for key in self._keys(email_input):
+                counts = self._counts.get(key)
+                if counts is not None and (counts.total >= self.min_observations or key == ALL_SENDERS):
+                    return (counts.respond + 1) / (counts.total + 2)
+        return 0.5
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+sender_history = SenderHistory()
+
+
+def should_speculate(email_input: dict, threshold: Optional[float] = None) -> bool:
+    if not SPECULATIVE_DRAFTING:
+        return False
+    threshold = SPECULATION_THRESHOLD if threshold is None else threshold
+    speculate = sender_history.respond_probability(email_input) >= threshold
+    SPECULATION_DECISIONS.labels("speculate" if speculate else "skip").inc()
+    return speculate
+
+
+def _wasted_tokens(task: asyncio.Task, prompt: list) -> int:
+    if task.done() and not task.cancelled() and task.exception() is None:
+        usage = getattr(task.result(), "usage_metadata", None) or {}
+        if usage:
+            return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+    #cancelled in flight: the prompt was most likely sent and billed already
+    return sum(message_tokens(message) for message in prompt)
+
+
+async def run_speculatively(email_input: dict, triage: Awaitable, llm, draft_messages: list) -> Tuple[object, Optional[object]]:
+    """awaits `triage` while `llm` drafts from `draft_messages` (the response agent's first conversation).
+
+    Returns the triage result and the committed draft (an AIMessage), or None
+    when nothing was speculated or the draft was cancelled.
+    """
+    if not should_speculate(email_input):
+        result = await triage
+        sender_history.record(email_input, result.classification)
+        return result, None
+
+    prompt = prompt_registry.agent_messages(draft_messages)
+    draft_seconds: Dict[str, float] = {}
+
+    async def draft():
+        started = time.perf_counter()
+        response = await llm.ainvoke(prompt)
+        draft_seconds["value"] = time.perf_counter() - started
+        return response
+
+    task = asyncio.ensure_future(draft())
+    started = time.perf_counter()
+    try:
+        result = await triage
+    except BaseException:
+        task.cancel()
+        raise
+    triage_seconds = time.perf_counter() - started
+    sender_history.record(email_input, result.classification)
+
+    if result.classification != "respond":
+        task.cancel()
+        wasted = _wasted_tokens(task, prompt)
+        SPECULATIVE_DRAFTS.labels("cancelled").inc()
+        SPECULATION_WASTED_TOKENS.inc(wasted)
+        logger.info("speculative draft cancelled", extra={"classification": result.classification, "wasted_tokens": wasted})
+        return result, None
+
+    try:
+        response = await task
+    except Exception:
+        #the response agent drafts as usual
+        SPECULATIVE_DRAFTS.labels("failed").inc()
+        logger.warning("speculative draft failed, drafting after triage instead", exc_info=True)
+        return result, None
+    prompt_registry.record_usage("agent", response)
+    #back to back would have taken triage + draft, in parallel it took the longer of the two
+    gained = min(triage_seconds, draft_seconds["value"])
+    SPECULATIVE_DRAFTS.labels("committed").inc()
+    SPECULATION_LATENCY_GAINED.observe(gained)
+    logger.info("speculative draft committed", extra={"latency_gained_ms": round(gained * 1000, 3)})
+    return result, response
@@ -0,0 +1,13 @@
+"""Graph state of the email assistant."""
+import operator
+from typing import Annotated, Literal
+
+from langgraph.graph import MessagesState
+
+
+class State(MessagesState):
+    """State for thr email assistant graph"""
+    email_input : dict
+    classification_response : Literal["ignore","respond","notify"]
+    #estimated input tokens history compaction kept out of the llm_call requests of this run
+    history_tokens_saved : Annotated[int, operator.add]
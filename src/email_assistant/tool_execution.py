@@ -0,0 +1,177 @@
+"""Runs the tool calls of one model turn concurrently.
+
+When the model emits several tool calls at once (e.g. check_calendar_availability
+for several days) they run side by side instead of one after the other. The
+returned ToolMessages keep the order of the tool calls, and a failing or timed
+out call becomes an error ToolMessage instead of aborting the run.
+
+Every read-only call gets its own timeout, counted from when the call starts
+running, not from when it was queued for a pool thread. Waiting for a pool
+thread is bounded by the same timeout: timed out calls cannot be cancelled and
+keep their threads, so once hung calls hold the whole pool a queued call gives
+up with an error instead of blocking the graph forever. Tools with side effects
+(EMAIL_ASSISTANT_TOOL_SIDE_EFFECT_TOOLS: write_email, schedule_meeting) run one
+after the other and without a timeout: a started call cannot be stopped, so
+reporting it as timed out would let the model retry an email that still goes out.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, List, Mapping, Optional
+
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.tools import BaseTool
+
+from email_assistant.config import TOOL_MAX_CONCURRENCY, TOOL_SIDE_EFFECT_TOOLS, TOOL_TIMEOUT_SECONDS
+from email_assistant.metrics import TOOL_LATENCY
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=TOOL_MAX_CONCURRENCY, thread_name_prefix="tool")
+
+
+def _timeout_for(tool_call: ToolCall, timeouts: Optional[Mapping[str, float]]) -> float:
+    return (timeouts or {}).get(tool_call["name"], TOOL_TIMEOUT_SECONDS)
+
+
+def _has_side_effects(tool_call: ToolCall) -> bool:
+    return tool_call["name"] in TOOL_SIDE_EFFECT_TOOLS
+
+
+def _observe(tool_call: ToolCall, status: str, started: float) -> None:
+    TOOL_LATENCY.labels(tool_call["name"], status).observe(time.monotonic() - started)
+
+
+class _Started:
+    """when a pooled call began running, set by _invoke"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.at = 0.0
+
+
+def _invoke(tool: BaseTool, tool_call: ToolCall, started: Optional[_Started] = None):
+    """times the call itself rather than the wait for a free worker"""
+    began = time.monotonic()
+    if started is not None:
+        started.at = began
+        started.event.set()
+    try:
+        result = tool.invoke(tool_call["args"])
+    except Exception:
+        _observe(tool_call, "error", began)
+        raise
+    _observe(tool_call, "ok", began)
+    return result
+
+
+def _tool_message(tool_call: ToolCall, observation) -> ToolMessage:
+    return ToolMessage(content=str(observation), tool_call_id=tool_call["id"], name=tool_call["name"])
+
+
+def _error_message(tool_call: ToolCall, error: str) -> ToolMessage:
+    logger.warning("tool call %s failed: %s", tool_call["name"], error, extra={"tool": tool_call["name"]})
+    return ToolMessage(
+        content=f"Error: {error}", tool_call_id=tool_call["id"], name=tool_call["name"], status="error"
+    )
+
+
+def _describe(tool_call: ToolCall, e: BaseException) -> str:
+    return f"{tool_call['name']} raised {type(e).__name__}: {e}"
+
+
+def _timed_out(tool_call: ToolCall, timeout: float, started: float) -> ToolMessage:
+    _observe(tool_call, "timeout", started)
+    return _error_message(tool_call, f"{tool_call['name']} timed out after {timeout:g}s")
+
+
+def _not_started(tool_call: ToolCall, timeout: float) -> ToolMessage:
+    return _error_message(tool_call, f"{tool_call['name']} did not start within {timeout:g}s, all tool threads are busy")
+
+
+def run_tool_calls(
+    tool_calls: List[ToolCall],
+    tools_by_name: Dict[str, BaseTool],
+    timeouts: Optional[Mapping[str, float]] = None,
+) -> List[ToolMessage]:
+    """runs the read-only calls on the shared thread pool and the side-effecting ones here, in order.
+
+    Results come back in tool call order.
+    """
+    results: List[Optional[ToolMessage]] = [None] * len(tool_calls)
+    pooled = []
+    for i, tool_call in enumerate(tool_calls):
+        tool = tools_by_name.get(tool_call["name"])
+        if tool is None:
+            results[i] = _error_message(tool_call, f"unknown tool {tool_call['name']}")
+        elif not _has_side_effects(tool_call):
+            started = _Started()
+            pooled.append((i, started, time.monotonic(), _executor.submit(_invoke, tool, tool_call, started)))
+
+    #side effects one at a time while the read-only calls run on the pool
+    for i, tool_call in enumerate(tool_calls):
+        if results[i] is None and _has_side_effects(tool_call):
+            try:
+                results[i] = _tool_message(tool_call, _invoke(tools_by_name[tool_call["name"]], tool_call))
+            except Exception as e:
+                results[i] = _error_message(tool_call, _describe(tool_call, e))
+
+    for i, started, submitted, future in pooled:
+        tool_call = tool_calls[i]
+        timeout = _timeout_for(tool_call, timeouts)
+        #the wait for a free pool thread does not count against the timeout, it has a budget of its own;
+        #a call that cannot be cancelled any more has just started and sets the event right away
+        if not started.event.wait(max(0.0, submitted + timeout - time.monotonic())) and future.cancel():
+            results[i] = _not_started(tool_call, timeout)
+            continue
+        try:
+            started.event.wait()
+            results[i] = _tool_message(tool_call, future.result(timeout=max(0.0, started.at + timeout - time.monotonic())))
+        except FutureTimeoutError:
+            results[i] = _timed_out(tool_call, timeout, started.at)
+        except Exception as e:
+            results[i] = _error_message(tool_call, _describe(tool_call, e))
+    return results
+
+
+async def arun_tool_calls(
+    tool_calls: List[ToolCall],
+    tools_by_name: Dict[str, BaseTool],
+    timeouts: Optional[Mapping[str, float]] = None,
+) -> List[ToolMessage]:
+    """async variant of run_tool_calls, gathers the read-only calls with at most TOOL_MAX_CONCURRENCY running"""
+    semaphore = asyncio.Semaphore(TOOL_MAX_CONCURRENCY)
+    side_effects = asyncio.Lock()
+
+    async def run(tool_call: ToolCall) -> ToolMessage:
+        tool = tools_by_name.get(tool_call["name"])
+        if tool is None:
+            return _error_message(tool_call, f"unknown tool {tool_call['name']}")
+        if _has_side_effects(tool_call):
+            #asyncio.Lock wakes waiters in order, the calls run in tool call order
+            async with side_effects:
+                started = time.monotonic()
+                try:
+                    result = await tool.ainvoke(tool_call["args"])
+                except Exception as e:
+                    _observe(tool_call, "error", started)
+                    return _error_message(tool_call, _describe(tool_call, e))
+            _observe(tool_call, "ok", started)
+            return _tool_message(tool_call, result)
+        timeout = _timeout_for(tool_call, timeouts)
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(tool.ainvoke(tool_call["args"]), timeout)
+            except asyncio.TimeoutError:
+                return _timed_out(tool_call, timeout, started)
+            except Exception as e:
+                _observe(tool_call, "error", started)
+                return _error_message(tool_call, _describe(tool_call, e))
+        _observe(tool_call, "ok", started)
+        return _tool_message(tool_call, result)
+
+    return list(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
@@ -0,0 +1,192 @@
+"""Triage classification shared by both agent graphs and the batch endpoint.
+
+Builds the triage prompt from the prompt registry, with the preprocessed email
+body, and calls the router LLM.
+Emails matched by a high-confidence triage rule, or already in the triage
+cache, skip the LLM call.
+
+Triage is tiered: the small triage model answers first with a confidence.
+When a router for the large model is available, emails from VIP senders go
+straight to it and emails the small model is unsure about (confidence below
+EMAIL_ASSISTANT_TRIAGE_ESCALATION_THRESHOLD) are asked again there.
+"""
+import logging
+from email.utils import parseaddr
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from email_assistant.config import (
+    TRIAGE_CACHE_ENABLED,
+    TRIAGE_ESCALATION_THRESHOLD,
+    TRIAGE_RULES_ENABLED,
+    TRIAGE_VIP_SENDERS,
+)
+from email_assistant.metrics import CLASSIFICATIONS, TRIAGE_ESCALATIONS
+from email_assistant.preprocessing import preprocess_email
+from email_assistant.prompt_registry import prompt_registry, unwrap_structured
+from email_assistant.schemas import RouterSchema
+from email_assistant.triage_cache import triage_cache, triage_cache_key
+from email_assistant.triage_rules import triage_rules
+
+logger = logging.getLogger(__name__)
+
+
+def triage_messages(email_input: dict) -> list:
+    """the pre-rendered triage system prompt followed by the cleaned email"""
+    return prompt_registry.triage_messages(preprocess_email(email_input))
+
+
+def _counted(result: RouterSchema, source: str) -> RouterSchema:
+    """counts the decision by classification and source (rule, cache, llm or escalated)"""
+    CLASSIFICATIONS.labels(result.classification, source).inc()
+    return result
+
+
+def _rule_decision(email_input: dict):
+    return triage_rules.classify(email_input) if TRIAGE_RULES_ENABLED else None
+
+
+def is_vip_sender(email_input: dict, vip_senders: Optional[Sequence[str]] = None) -> bool:
+    """the author's address, or its @domain, is on the VIP list (EMAIL_ASSISTANT_TRIAGE_VIP_SENDERS by default)"""
+    vip_senders = TRIAGE_VIP_SENDERS if vip_senders is None else vip_senders
+    if not vip_senders:
+        return False
+    address = parseaddr(email_input.get("author", ""))[1].lower()
+    domain = "@" + address.rpartition("@")[2]
+    return address in vip_senders or domain in vip_senders
+
+
+def needs_escalation(result: RouterSchema, threshold: Optional[float] = None) -> bool:
+    return result.confidence < (TRIAGE_ESCALATION_THRESHOLD if threshold is None else threshold)
+
+
+def _large_router(escalate: Optional[Callable]):
+    """the large model's router, only built once an email needs it"""
+    return escalate() if escalate is not None else None
+
+
+def _escalated(result: RouterSchema, reason: str) -> RouterSchema:
+    TRIAGE_ESCALATIONS.labels(reason).inc()
+    logger.info("triage escalated to the large model", extra={"reason": reason, "classification": result.classification})
+    return result
+
+
+def classify_email(router, email_input: dict, escalate: Optional[Callable] = None) -> RouterSchema:
+    """classifies one email, answering from the triage rules or the triage cache when possible.
+
+    `escalate` returns the large model's router (or None). VIP emails go to it
+    directly, others only when the small model's confidence is too low.
+    """
+    ruled = _rule_decision(email_input)
+    if ruled is not None:
+        return _counted(ruled, "rule")
+    key = triage_cache_key(email_input)
+    if TRIAGE_CACHE_ENABLED:
+        cached = triage_cache.get(key)
+        if cached is not None:
+            return _counted(cached, "cache")
+    reason = "vip" if is_vip_sender(email_input) else None
+    large = _large_router(escalate) if reason else None
+    if large is None:
+        result, source = unwrap_structured("triage", router.invoke(triage_messages(email_input))), "llm"
+        reason = "low_confidence" if needs_escalation(result) else None
+        large = _large_router(escalate) if reason else None
+    if large is not None:
+        result = _escalated(unwrap_structured("triage_escalation", large.invoke(triage_messages(email_input))), reason)
+        source = "escalated"
+    if TRIAGE_CACHE_ENABLED:
+        triage_cache.put(key, result)
+    return _counted(result, source)
+
+
+async def aclassify_email(router, email_input: dict, escalate: Optional[Callable] = None,
+                          use_cache: bool = True) -> RouterSchema:
+    """async variant of classify_email, `use_cache=False` always asks the router (evaluations)"""
+    result, _ = await aclassify_email_with_source(router, email_input, escalate, use_cache)
+    return result
+
+
+async def aclassify_email_with_source(router, email_input: dict, escalate: Optional[Callable] = None,
+                                      use_cache: bool = True) -> Tuple[RouterSchema, str]:
+    """aclassify_email plus where the decision came from: rule, cache, llm or escalated"""
+    ruled = _rule_decision(email_input)
+    if ruled is not None:
+        return _counted(ruled, "rule"), "rule"
+    use_cache = use_cache and TRIAGE_CACHE_ENABLED
+    key = triage_cache_key(email_input)
+    if use_cache:
+        cached = triage_cache.get(key)
+        if cached is not None:
+            return _counted(cached, "cache"), "cache"
+    reason = "vip" if is_vip_sender(email_input) else None
+    large = _large_router(escalate) if reason else None
+    if large is None:
+        result, source = unwrap_structured("triage", await router.ainvoke(triage_messages(email_input))), "llm"
+        reason = "low_confidence" if needs_escalation(result) else None
+        large = _large_router(escalate) if reason else None
+    if large is not None:
+        result = _escalated(unwrap_structured("triage_escalation", await large.ainvoke(triage_messages(email_input))), reason)
+        source = "escalated"
+    if use_cache:
+        triage_cache.put(key, result)
+    return _counted(result, source), source
+
+
+async def _abatch_structured(router, prompt: str, emails: List[dict], indices: List[int], max_concurrency: int) -> List[Any]:
+    """one router.abatch call, a RouterSchema or the raised exception per index"""
+    fresh = await router.abatch(
+        [triage_messages(emails[i]) for i in indices],
+        config= {'max_concurrency': max_concurrency},
+        return_exceptions= True,
+    )
+    results = []
+    for result in fresh:
+        if not isinstance(result, Exception):
+            try:
+                result = unwrap_structured(prompt, result)
+            except Exception as e:
+                result = e
+        results.append(result)
+    return results
+
+
+async def abatch_classify_emails(router, emails: List[dict], max_concurrency: int, escalate: Optional[Callable] = None) -> List[Any]:
+    """classifies many emails with one router.abatch call over the rule and cache misses, plus one
+    call of the large model for the VIP and low-confidence ones when `escalate` gives a router.
+
+    Returns a RouterSchema or the raised exception for every email, in input order.
+    """
+    keys = [triage_cache_key(email) for email in emails]
+    results: List[Any] = [_rule_decision(email) for email in emails]
+    for result in results:
+        if result is not None:
+            _counted(result, "rule")
+    if TRIAGE_CACHE_ENABLED:
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                cached = triage_cache.get(key)
+                results[i] = cached if cached is None else _counted(cached, "cache")
+    misses = [i for i, result in enumerate(results) if result is None]
+    vip = [i for i in misses if is_vip_sender(emails[i])]
+    large = _large_router(escalate) if vip else None
+    reasons = {i: "vip" for i in vip} if large is not None else {}
+    small = [i for i in misses if i not in reasons]
+    if small:
+        for i, result in zip(small, await _abatch_structured(router, "triage", emails, small, max_concurrency)):
+            results[i] = result
+            if not isinstance(result, Exception) and needs_escalation(result):
+                reasons[i] = "low_confidence"
+        if reasons and large is None:
+            large = _large_router(escalate)
+            if large is None:
+                reasons = {}
+    escalated = sorted(reasons)
+    if escalated:
+        for i, result in zip(escalated, await _abatch_structured(large, "triage_escalation", emails, escalated, max_concurrency)):
+            results[i] = result if isinstance(result, Exception) else _escalated(result, reasons[i])
+    for i in misses:
+        result = results[i]
+        if not isinstance(result, Exception):
+            _counted(result, "escalated" if i in reasons else "llm")
+            if TRIAGE_CACHE_ENABLED:
+                triage_cache.put(keys[i], result)
+    return results
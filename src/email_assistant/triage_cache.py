@@ -0,0 +1,159 @@
+"""Content-addressed cache for triage decisions.
+
+Newsletters, build notifications and GitHub mails arrive many times with
+near-identical content. The cache key is a hash of the normalized author,
+subject and email body plus the triage prompt version and the triage models,
+so a repeated email reuses the stored RouterSchema instead of paying for
+another LLM call.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from email_assistant.config import TRIAGE_CACHE_MAX_ENTRIES, TRIAGE_CACHE_PATH, TRIAGE_CACHE_TTL_SECONDS
+from email_assistant.prompt_registry import triage_prompt_version
+from email_assistant.schemas import RouterSchema
+from email_assistant.utils import email_parser
+
+_WHITESPACE = re.compile(r"\s+")
+_DIGITS = re.compile(r"\d+")
+
+
+def _normalize(text: str) -> str:
+    """casefold, collapse whitespace and mask numbers (build ids, PR numbers, dates)"""
+    return _DIGITS.sub("#", _WHITESPACE.sub(" ", text.casefold()).strip())
+
+
+def triage_model_id() -> str:
+    """provider and triage model, plus the escalation model and threshold when triage escalates"""
+    from email_assistant.config import LARGE_MODEL, LLM_PROVIDER, TRIAGE_ESCALATION_THRESHOLD, TRIAGE_MODEL
+
+    model_id = f"{LLM_PROVIDER}:{TRIAGE_MODEL}"
+    if TRIAGE_MODEL != LARGE_MODEL:
+        model_id += f"+{LLM_PROVIDER}:{LARGE_MODEL}@{TRIAGE_ESCALATION_THRESHOLD:g}"
+    return model_id
+
+
+def triage_cache_key(email_input: dict, prompt_version: Optional[str] = None, model_id: Optional[str] = None) -> str:
+    """hash of the prompt version, the triage models and the normalized author / subject / email_thread
+
+    The version defaults to the registry's triage prompt version and the models
+    to triage_model_id(), so editing the prompt or the profile, or switching
+    the triage or escalation model, invalidates earlier decisions. Version and
+    models are hashed as they are, only the email is normalized.
+    """
+    prompt_version = prompt_version or triage_prompt_version()
+    model_id = model_id or triage_model_id()
+    author, _, subject, email_thread = email_parser(email_input)
+    digest = hashlib.sha256()
+    for part in (prompt_version, model_id, _normalize(author), _normalize(subject), _normalize(email_thread)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class TriageCache:
+    """Two tier cache of RouterSchema results: in-memory LRU with TTL, optionally backed by SQLite.
+
+    Args:
+        max_entries: size of the in-memory LRU tier
+        ttl_seconds: how long a triage decision stays valid, in both tiers
+        sqlite_path: file for the on-disk tier, None keeps the cache in memory only
+        clock: time source, wall clock so disk entries survive restarts
+    """
+
+    def __init__(
+        self,
+        max_entries: int = TRIAGE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = TRIAGE_CACHE_TTL_SECONDS,
+        sqlite_path: Optional[str] = TRIAGE_CACHE_PATH,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS triage_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS triage_cache_expiry ON triage_cache (expires_at)")
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[RouterSchema]:
+        """returns the cached decision or None, counting a hit or a miss"""
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return RouterSchema.model_validate_json(value)
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM triage_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return RouterSchema.model_validate_json(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, key: str, result: RouterSchema) -> None:
+        """stores a decision in every tier"""
+        expires_at = self._clock() + self.ttl_seconds
+        value = result.model_dump_json()
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO triage_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                self._db.execute("DELETE FROM triage_cache WHERE expires_at <= ?", (self._clock(),))
+                self._db.commit()
+
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """drops every entry (both tiers) and resets the counters"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM triage_cache")
+                self._db.commit()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """hit / miss counters, every hit is one triage LLM call saved"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+triage_cache = TriageCache()
@@ -0,0 +1,181 @@
+"""Deterministic rule-based pre-classifier that runs before the triage LLM.
+
+Many emails can be triaged from their headers alone (GitHub notifications,
+noreply senders, CI bots, marketing lists). Rules are indexed by sender
+domain, sender local part and subject token, so a lookup only evaluates the
+few rules that can possibly match, however many rules are loaded.
+
+Rules load from a JSON file (EMAIL_ASSISTANT_TRIAGE_RULES_PATH) shaped like
+``{"rules": [{"name": ..., "classification": ..., "confidence": ...,
+"sender_domains": [...], "sender_local_parts": [...], "subject_tokens": [...]}]}``.
+Without a file the DEFAULT_TRIAGE_RULES below are used.
+"""
+import json
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from email.utils import parseaddr
+from typing import Dict, Iterable, List, Literal, Optional
+
+from email_assistant.config import TRIAGE_RULES_MIN_CONFIDENCE, TRIAGE_RULES_PATH
+from email_assistant.schemas import RouterSchema
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+DEFAULT_TRIAGE_RULES = [
+    {
+        "name": "github-notifications",
+        "classification": "notify",
+        "confidence": 0.95,
+        "sender_domains": ["github.com"],
+        "sender_local_parts": ["notifications", "noreply"],
+    },
+    {
+        "name": "ci-bots",
+        "classification": "notify",
+        "confidence": 0.95,
+        "sender_domains": ["circleci.com", "travis-ci.com", "buildkite.com", "jenkins.io"],
+    },
+    {
+        "name": "noreply-senders",
+        "classification": "notify",
+        "confidence": 0.9,
+        "sender_local_parts": ["noreply", "no-reply", "donotreply", "do-not-reply"],
+    },
+    {
+        "name": "social-notifications",
+        "classification": "ignore",
+        "confidence": 0.9,
+        "sender_domains": ["facebookmail.com", "linkedin.com", "twitter.com", "x.com"],
+    },
+    {
+        # newsletters are sometimes worth a notification, so this sits below the default
+        # minimum confidence and the LLM decides unless the minimum is lowered
+        "name": "marketing-lists",
+        "classification": "ignore",
+        "confidence": 0.7,
+        "sender_local_parts": ["marketing", "newsletter", "newsletters", "promo", "promotions"],
+    },
+]
+
+
+@dataclass
+class TriageRule:
+    """A triage rule: every condition that is set must match (domains and local parts match any listed value,
+    all subject tokens must appear in the subject)."""
+    name: str
+    classification: Literal["ignore", "respond", "notify"]
+    confidence: float = 1.0
+    sender_domains: List[str] = field(default_factory=list)
+    sender_local_parts: List[str] = field(default_factory=list)
+    subject_tokens: List[str] = field(default_factory=list)
+    hits: int = 0
+
+    def __post_init__(self):
+        self.sender_domains = [domain.lower() for domain in self.sender_domains]
+        self.sender_local_parts = [local.lower() for local in self.sender_local_parts]
+        self.subject_tokens = [token for value in self.subject_tokens for token in _TOKEN.findall(value.lower())]
+        if not (self.sender_domains or self.sender_local_parts or self.subject_tokens):
+            raise ValueError(f"Triage rule '{self.name}' has no conditions")
+
+    def matches(self, domains: List[str], local_part: str, subject_tokens: set) -> bool:
+        if self.sender_domains and not any(domain in self.sender_domains for domain in domains):
+            return False
+        if self.sender_local_parts and local_part not in self.sender_local_parts:
+            return False
+        return all(token in subject_tokens for token in self.subject_tokens)
+
+
+def _sender_parts(author: str) -> tuple:
+    """'GitHub <notifications@mail.github.com>' -> (['mail.github.com', 'github.com', 'com'], 'notifications')"""
+    address = parseaddr(author)[1].lower()
+    local_part, _, domain = address.rpartition("@")
+    labels = domain.split(".") if domain else []
+    return [".".join(labels[i:]) for i in range(len(labels))], local_part
+
+
+class TriageRuleEngine:
+    """Indexes rules once so classify() only evaluates candidate rules.
+
+    Each rule is indexed on its most selective condition: its sender domains,
+    else its sender local parts, else its first subject token.
+    """
+
+    def __init__(self, rules: Iterable[TriageRule], min_confidence: float = TRIAGE_RULES_MIN_CONFIDENCE):
+        self.rules = list(rules)
+        self.min_confidence = min_confidence
+        self._by_domain: Dict[str, List[int]] = defaultdict(list)
+        self._by_local_part: Dict[str, List[int]] = defaultdict(list)
+        self._by_subject_token: Dict[str, List[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+        for position, rule in enumerate(self.rules):
+            if rule.sender_domains:
+                for domain in rule.sender_domains:
+                    self._by_domain[domain].append(position)
+            elif rule.sender_local_parts:
+                for local_part in rule.sender_local_parts:
+                    self._by_local_part[local_part].append(position)
+            else:
+                self._by_subject_token[rule.subject_tokens[0]].append(position)
+
+    @classmethod
+    def from_dicts(cls, rules: Iterable[dict], **kwargs) -> "TriageRuleEngine":
+        return cls((TriageRule(**{k: v for k, v in rule.items() if k != "hits"}) for rule in rules), **kwargs)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "TriageRuleEngine":
+        """loads rules from a JSON config file"""
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        return cls.from_dicts(config["rules"] if isinstance(config, dict) else config, **kwargs)
+
+    def match(self, email_input: dict) -> Optional[TriageRule]:
+        """returns the highest confidence matching rule (first defined wins ties)"""
+        domains, local_part = _sender_parts(email_input.get("author", ""))
+        subject_tokens = set(_TOKEN.findall(email_input.get("subject", "").lower()))
+        candidates = set(self._by_local_part.get(local_part, ()))
+        for domain in domains:
+            candidates.update(self._by_domain.get(domain, ()))
+        for token in subject_tokens:
+            candidates.update(self._by_subject_token.get(token, ()))
+
+        best = None
+        for position in sorted(candidates):
+            rule = self.rules[position]
+            if (best is None or rule.confidence > best.confidence) and rule.matches(domains, local_part, subject_tokens):
+                best = rule
+        return best
+
+    def classify(self, email_input: dict) -> Optional[RouterSchema]:
+        """triage decision for a high-confidence match, None means ask the LLM
+
+        Only a match that decides the classification counts as a hit of its rule.
+        """
+        rule = self.match(email_input)
+        if rule is None or rule.confidence < self.min_confidence:
+            return None
+        with self._lock:
+            rule.hits += 1
+        return RouterSchema(
+            classification= rule.classification,
+            reasoning= f"Matched triage rule '{rule.name}' (confidence {rule.confidence:.2f}).",
+            confidence= rule.confidence,
+        )
+
+    def stats(self) -> List[Dict[str, object]]:
+        """hit counts per rule, how many emails each rule classified"""
+        return [
+            {"name": rule.name, "classification": rule.classification, "confidence": rule.confidence, "hits": rule.hits}
+            for rule in self.rules
+        ]
+
+
+def load_triage_rules() -> TriageRuleEngine:
+    """rules from EMAIL_ASSISTANT_TRIAGE_RULES_PATH, or the built-in defaults"""
+    if TRIAGE_RULES_PATH:
+        return TriageRuleEngine.from_file(TRIAGE_RULES_PATH)
+    return TriageRuleEngine.from_dicts(DEFAULT_TRIAGE_RULES)
+
+
+triage_rules = load_triage_rules()
@@ -1,8 +1,10 @@
-from .schemas import State
-from typing import Tuple, List, Any, Dict
-from langchain_core.messages.utils import convert_to_openai_messages
+import json
+from typing import TYPE_CHECKING, Tuple, List, Any, Dict
 from email_assistant.schemas import ProcessEmailResponse
 
+if TYPE_CHECKING:
+    from email_assistant.state import State
+
 def email_parser(email : dict) -> Tuple[str, str, str, str]:
     """parsers given email json into required fields"""
     return (
@@ -29,42 +31,60 @@ def format_email_markdown(subject: str, author: str, to: str, email_thread: str)
 
 ---
 """
+def _tool_calls(message) -> list:
+    """parsed tool calls of an AIMessage as (name, args) pairs, falling back to the raw OpenAI ones"""
+    #check the type first, a missing attribute on a pydantic message is an expensive AttributeError
+    if message.type != "ai":
+        return []
+    if message.tool_calls:
+        return [(tc["name"], tc["args"]) for tc in message.tool_calls]
+    raw = message.additional_kwargs.get("tool_calls") or []
+    return [(tc["function"]["name"], tc["function"]["arguments"]) for tc in raw]
+
 def extract_tool_calls(messages):
     """extract the kind of tool calls made during the email processing"""
     extracted_calls = []
     for message in messages:
-        if message.additional_kwargs :
-            for tool_call in message.additional_kwargs['tool_calls']:
-                # print('############################################')
-                # print("Tool_call happened :" ,tool_call)
-                # print("name of tool call:", tool_call["function"]["name"])
+        if message.type != "ai":
+            continue
+        for tool_call in message.tool_calls:
+            extracted_calls.append(tool_call["name"])
+        if not message.tool_calls:
+            #messages built without parsed tool calls
+            for tool_call in message.additional_kwargs.get("tool_calls") or ():
                 extracted_calls.append(tool_call["function"]["name"])
-                # print("extracted tool call becomes:",extracted_calls)
     return extracted_calls
 
+#message.type -> openai role, for the messages messages_formatter can format without converting them
+_OPENAI_ROLES = {"human": "USER", "ai": "ASSISTANT", "system": "SYSTEM", "tool": "TOOL"}
+
+#same serialization convert_to_openai_messages uses; json.dumps with non-default options builds a new encoder per call
+_ARGUMENTS_ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+def _format_arguments(args) -> str:
+    return args if isinstance(args, str) else _ARGUMENTS_ENCODER.encode(args)
+
 def messages_formatter(messages : List[Any]) :
-    """Takes role, content and tool calls made with args and format them properly"""
-    actual_messages = convert_to_openai_messages(messages)
+    """Takes role, content and tool calls made with args and format them properly
+
+    Plain langchain messages are formatted directly, in one pass; only dicts and
+    messages with content blocks go through convert_to_openai_messages.
+    """
     formatted_messages = []
-    for message in actual_messages:
-        role = message['role']
-        content = message['content']
-    #     print("#"*40)
-    #     print("printing the received message ")
-    #     print(message)
-    #     print(message['tool_calls'])
-    #     print("checking if there are any toolcalls....")
-    #     print(list(message.keys()))
-        if 'tool_calls' in list(message.keys()):
-            # print("tools calls are there")
-            for tc in message['tool_calls']:
-                # print("getting to the first tool call", tc)
-                name = tc['function']['name']
-                args = tc['function']['arguments']
-                content += 'tool call made to: ' + name + ' with arguments ' + args + " ."
-                # print("getting updated content:-",content)
-        formatted_messages.append(f"{role.upper()} : {content}")
-    # print("formatted message:",formatted_messages)
+    for message in messages:
+        role = _OPENAI_ROLES.get(message.type) if not isinstance(message, dict) else None
+        if role is not None and isinstance(message.content, str):
+            parts = [role, " : ", message.content]
+            for name, args in _tool_calls(message) if role == "ASSISTANT" else ():
+                parts += ("tool call made to: ", name, " with arguments ", _format_arguments(args), " .")
+        else:
+            from langchain_core.messages.utils import convert_to_openai_messages
+
+            converted = convert_to_openai_messages(message)
+            parts = [converted["role"].upper(), " : ", converted["content"]]
+            for tc in converted.get("tool_calls", ()):
+                parts += ("tool call made to: ", tc["function"]["name"], " with arguments ", tc["function"]["arguments"], " .")
+        formatted_messages.append("".join(parts))
     return "\n\n".join(formatted_messages)
 
 def _get_allowed_actions(config : Dict[str,bool]) -> List[str]:
@@ -80,13 +100,10 @@ def _get_allowed_actions(config : Dict[str,bool]) -> List[str]:
         allowed_actions.append('respond')
     return allowed_actions
 
-def _extract_final_result(state: State) -> ProcessEmailResponse:
+def _extract_final_result(state: "State") -> ProcessEmailResponse:
     """Extract final result from completed workflow state."""
     # Extract classification from state
-    print('#'*40)
-    print("trying to extract the final result")
     classification = state.get("classification_response", "respond")
-    print("NO error occured")
     # Extract response from messages
     response_text = "No response generated"
     reasoning = f"Email classified as: {classification}"
@@ -97,8 +114,6 @@ def _extract_final_result(state: State) -> ProcessEmailResponse:
     # Find the most recent ToolMessage using Python best practices
     for message in reversed(messages):
         if getattr(message, 'tool_call_id', None) is not None:
-            print('##############################')
-            print('extractig content from the tool call id')
             content = str(message.content)
             if "Email sent" in content or " scheduled" in content:
                 response_text = content
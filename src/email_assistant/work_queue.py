@@ -0,0 +1,409 @@
+"""In-process work queue for email ingestion (``POST /ingest``).
+
+Mailbox webhooks arrive in bursts. Instead of running the graph inside the
+request, ``/ingest`` puts the email on a bounded queue and returns 202; a pool
+of EMAIL_ASSISTANT_WORK_QUEUE_WORKERS asyncio workers drains it.
+
+* backpressure: once EMAIL_ASSISTANT_WORK_QUEUE_MAX_SIZE items are queued or
+  running, ``submit`` raises ``QueueFull`` and the endpoint answers 503 with a
+  Retry-After header, the webhook sender retries later
+* retries: a transient failure (rate limit, timeout, connection error, 5xx
+  from the LLM provider) is retried up to EMAIL_ASSISTANT_WORK_QUEUE_MAX_ATTEMPTS
+  times, with exponential backoff and full jitter between attempts
+* dead letters: items that failed permanently or ran out of attempts are kept
+  with their last error instead of being dropped
+
+Storage is pluggable: ``MemoryQueueBackend`` by default, ``SqliteQueueBackend``
+when EMAIL_ASSISTANT_WORK_QUEUE_PATH is set. The SQLite backend keeps queued
+items and dead letters across restarts, items that were running when the
+process stopped are queued again on start (delivery is at least once). The
+attempt is counted when the item is claimed, so one that keeps taking the
+process down is dead-lettered once it runs out of attempts.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from email_assistant.config import (
+    WORK_QUEUE_BACKOFF_BASE_SECONDS,
+    WORK_QUEUE_BACKOFF_MAX_SECONDS,
+    WORK_QUEUE_MAX_ATTEMPTS,
+    WORK_QUEUE_MAX_DEAD_LETTERS,
+    WORK_QUEUE_MAX_SIZE,
+    WORK_QUEUE_PATH,
+    WORK_QUEUE_WORKERS,
+)
+from email_assistant.metrics import WORK_QUEUE_DEPTH, WORK_QUEUE_ITEMS, WORK_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+#status codes worth another attempt: timeouts, conflicts, rate limits and server side errors
+TRANSIENT_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+#openai client errors that carry no status code
+TRANSIENT_ERROR_NAMES = frozenset({"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"})
+
+
+class QueueFull(Exception):
+    """the queue is at its size limit, the caller should retry later"""
+
+
+@dataclass
+class QueueItem:
+    item_id: str
+    payload: Dict[str, Any]
+    enqueued_at: float
+    next_attempt_at: float
+    attempts: int = 0
+    last_error: Optional[str] = None
+
+
+def is_transient(error: BaseException) -> bool:
+    """whether an attempt that raised `error` may succeed when retried"""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS_CODES
+    return type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+
+def backoff_delay(attempt: int, base: float = WORK_QUEUE_BACKOFF_BASE_SECONDS,
+                  maximum: float = WORK_QUEUE_BACKOFF_MAX_SECONDS, rng: random.Random = random) -> float:
+    """full jitter: uniform between 0 and base * 2**(attempt - 1), capped at maximum.
+
+    Spreads the retries of a burst that failed together (one rate limit) instead
+    of sending them back at the provider in lockstep.
+    """
+    return rng.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+
+class MemoryQueueBackend:
+    """queued items in a heap ordered by next attempt, lost on restart"""
+
+    def __init__(self, max_dead_letters: int = WORK_QUEUE_MAX_DEAD_LETTERS):
+        self._ready: list = []
+        self._seq = itertools.count()
+        self._running: Dict[str, QueueItem] = {}
+        self._dead: "deque[QueueItem]" = deque(maxlen=max_dead_letters)
+        self._lock = threading.Lock()
+
+    def put(self, item: QueueItem, max_size: int) -> bool:
+        """queues `item` unless max_size items are already queued or running"""
+        with self._lock:
+            if len(self._ready) + len(self._running) >= max_size:
+                return False
+            heapq.heappush(self._ready, (item.next_attempt_at, next(self._seq), item))
+            return True
+
+    def claim(self, now: float) -> Optional[QueueItem]:
+        """the next item due at `now`, marked running with its attempt counted"""
+        with self._lock:
+            if not self._ready or self._ready[0][0] > now:
+                return None
+            item = heapq.heappop(self._ready)[2]
+            item.attempts += 1
+            self._running[item.item_id] = item
+            return item
+
+    def next_attempt_at(self) -> Optional[float]:
+        with self._lock:
+            return self._ready[0][0] if self._ready else None
+
+    def ack(self, item: QueueItem) -> None:
+        with self._lock:
+            self._running.pop(item.item_id, None)
+
+    def retry(self, item: QueueItem) -> None:
+        with self._lock:
+            self._running.pop(item.item_id, None)
+            heapq.heappush(self._ready, (item.next_attempt_at, next(self._seq), item))
+
+    def dead_letter(self, item: QueueItem) -> None:
+        with self._lock:
+            self._running.pop(item.item_id, None)
+            self._dead.append(item)
+
+    def dead_letters(self, limit: int = 100) -> List[QueueItem]:
+        """most recent first"""
+        with self._lock:
+            return list(itertools.islice(reversed(self._dead), limit))
+
+    def depth(self) -> int:
+        """queued (retries included) plus running items"""
+        with self._lock:
+            return len(self._ready) + len(self._running)
+
+    def dead_letter_count(self) -> int:
+        with self._lock:
+            return len(self._dead)
+
+
+class SqliteQueueBackend:
+    """queued items and dead letters in a local SQLite file, a durable stand-in for an external broker"""
+
+    def __init__(self, path: str, max_dead_letters: int = WORK_QUEUE_MAX_DEAD_LETTERS):
+        self.max_dead_letters = max_dead_letters
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS work_queue (
+                item_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                enqueued_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS work_queue_due ON work_queue (status, next_attempt_at);
+            """
+        )
+        # the previous process stopped while these ran, queue them again
+        requeued = self._db.execute("UPDATE work_queue SET status = 'queued' WHERE status = 'running'").rowcount
+        self._db.commit()
+        if requeued:
+            logger.info("requeued interrupted work items", extra={"items": requeued})
+
+    def _write(self, sql: str, params: tuple) -> None:
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+    def put(self, item: QueueItem, max_size: int) -> bool:
+        with self._lock:
+            if self._db.execute("SELECT COUNT(*) FROM work_queue WHERE status != 'dead'").fetchone()[0] >= max_size:
+                return False
+            self._db.execute(
+                "INSERT INTO work_queue (item_id, payload, status, attempts, enqueued_at, next_attempt_at, last_error) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (item.item_id, json.dumps(item.payload), item.attempts, item.enqueued_at, item.next_attempt_at, item.last_error),
+            )
+            self._db.commit()
+            return True
+
+    def claim(self, now: float) -> Optional[QueueItem]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT item_id, payload, enqueued_at, next_attempt_at, attempts, last_error FROM work_queue "
+                "WHERE status = 'queued' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1", (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            #the attempt is counted as it starts, an item that keeps killing the process still runs out of attempts
+            self._db.execute("UPDATE work_queue SET status = 'running', attempts = attempts + 1 WHERE item_id = ?", (row[0],))
+            self._db.commit()
+        item_id, payload, enqueued_at, next_attempt_at, attempts, last_error = row
+        return QueueItem(item_id, json.loads(payload), enqueued_at, next_attempt_at, attempts + 1, last_error)
+
+    def next_attempt_at(self) -> Optional[float]:
+        with self._lock:
+            return self._db.execute("SELECT MIN(next_attempt_at) FROM work_queue WHERE status = 'queued'").fetchone()[0]
+
+    def ack(self, item: QueueItem) -> None:
+        self._write("DELETE FROM work_queue WHERE item_id = ?", (item.item_id,))
+
+    def retry(self, item: QueueItem) -> None:
+        self._write(
+            "UPDATE work_queue SET status = 'queued', attempts = ?, next_attempt_at = ?, last_error = ? WHERE item_id = ?",
+            (item.attempts, item.next_attempt_at, item.last_error, item.item_id),
+        )
+
+    def dead_letter(self, item: QueueItem) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE work_queue SET status = 'dead', attempts = ?, next_attempt_at = ?, last_error = ? WHERE item_id = ?",
+                (item.attempts, item.next_attempt_at, item.last_error, item.item_id),
+            )
+            self._db.execute(
+                "DELETE FROM work_queue WHERE item_id IN (SELECT item_id FROM work_queue WHERE status = 'dead' "
+                "ORDER BY next_attempt_at DESC LIMIT -1 OFFSET ?)", (self.max_dead_letters,),
+            )
+            self._db.commit()
+
+    def dead_letters(self, limit: int = 100) -> List[QueueItem]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT item_id, payload, enqueued_at, next_attempt_at, attempts, last_error FROM work_queue "
+                "WHERE status = 'dead' ORDER BY next_attempt_at DESC LIMIT ?", (limit,),
+            ).fetchall()
+        return [QueueItem(i, json.loads(p), e, n, a, err) for i, p, e, n, a, err in rows]
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM work_queue WHERE status != 'dead'").fetchone()[0]
+
+    def dead_letter_count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM work_queue WHERE status = 'dead'").fetchone()[0]
+
+
+def build_backend(path: Optional[str] = WORK_QUEUE_PATH):
+    return SqliteQueueBackend(path) if path else MemoryQueueBackend()
+
+
+class WorkQueue:
+    """bounded queue plus the asyncio worker pool that runs `handler` on every QueueItem.
+
+    The workers start on the event loop of the first ``submit`` (or ``start``),
+    so the queue can be built before any loop exists. A failing backend call
+    (e.g. a locked SQLite database) is logged and retried with backoff, it
+    never takes a worker down.
+    """
+
+    def __init__(self, backend, handler: Callable[[QueueItem], Awaitable[Any]],
+                 workers: int = WORK_QUEUE_WORKERS, max_size: int = WORK_QUEUE_MAX_SIZE,
+                 max_attempts: int = WORK_QUEUE_MAX_ATTEMPTS, backoff: Callable[[int], float] = backoff_delay,
+                 clock: Callable[[], float] = time.time):
+        self.backend = backend
+        self.handler = handler
+        self.workers = workers
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.clock = clock
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop, self._wakeup = loop, asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"work-queue-{i}") for i in range(self.workers)]
+
+    async def submit(self, payload: Dict[str, Any]) -> QueueItem:
+        """queues `payload`, raises QueueFull when max_size items are queued or running"""
+        self.start()
+        now = self.clock()
+        item = QueueItem(str(uuid.uuid4()), payload, now, now)
+        if not await asyncio.to_thread(self.backend.put, item, self.max_size):
+            WORK_QUEUE_ITEMS.labels("rejected").inc()
+            raise QueueFull(f"work queue is full ({self.max_size} items)")
+        WORK_QUEUE_ITEMS.labels("enqueued").inc()
+        WORK_QUEUE_DEPTH.set(await asyncio.to_thread(self.backend.depth))
+        self._wakeup.set()
+        return item
+
+    async def _backend(self, method: Callable, *args):
+        """runs a backend call in a thread, retrying it until it succeeds.
+
+        The item state has to reach the backend (an acked item must not run again),
+        so a failing call is retried with backoff instead of being skipped.
+        """
+        for attempt in itertools.count(1):
+            try:
+                return await asyncio.to_thread(method, *args)
+            except Exception:
+                delay = self.backoff(attempt)
+                logger.exception("work queue backend call failed, retrying",
+                                 extra={"call": method.__name__, "retry_in_s": round(delay, 3)})
+                await asyncio.sleep(delay)
+
+    async def _next_item(self) -> QueueItem:
+        while True:
+            #cleared before looking, a submit in between sets it again and nothing is missed
+            self._wakeup.clear()
+            item = await self._backend(self.backend.claim, self.clock())
+            if item is not None:
+                return item
+            due = await self._backend(self.backend.next_attempt_at)
+            timeout = None if due is None else max(0.0, due - self.clock())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._next_item()
+            if item.attempts == 1:
+                WORK_QUEUE_WAIT.observe(max(0.0, self.clock() - item.enqueued_at))
+            if item.attempts > self.max_attempts:
+                #requeued by restarts, every attempt stopped the process before it finished
+                item.last_error = "interrupted by a restart on every attempt"
+                await self._failed(item, RuntimeError(item.last_error))
+                WORK_QUEUE_DEPTH.set(await self._backend(self.backend.depth))
+                continue
+            try:
+                await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                item.last_error = f"{type(e).__name__}: {e}"
+                await self._failed(item, e)
+            else:
+                await self._backend(self.backend.ack, item)
+                WORK_QUEUE_ITEMS.labels("completed").inc()
+            WORK_QUEUE_DEPTH.set(await self._backend(self.backend.depth))
+
+    async def _failed(self, item: QueueItem, error: Exception) -> None:
+        extra = {"item_id": item.item_id, "attempts": item.attempts, "error": item.last_error}
+        if is_transient(error) and item.attempts < self.max_attempts:
+            delay = self.backoff(item.attempts)
+            item.next_attempt_at = self.clock() + delay
+            await self._backend(self.backend.retry, item)
+            WORK_QUEUE_ITEMS.labels("retried").inc()
+            logger.warning("work item failed, retrying", extra={**extra, "retry_in_s": round(delay, 3)})
+            self._wakeup.set()
+            return
+        #dead letters are ordered by when they died
+        item.next_attempt_at = self.clock()
+        await self._backend(self.backend.dead_letter, item)
+        WORK_QUEUE_ITEMS.labels("dead_lettered").inc()
+        logger.error("work item dead-lettered", extra=extra)
+
+    def dead_letters(self, limit: int = 100) -> List[QueueItem]:
+        return self.backend.dead_letters(limit)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.backend.depth(),
+            "max_size": self.max_size,
+            "workers": self.workers,
+            "dead_letters": self.backend.dead_letter_count(),
+        }
+
+    async def join(self, poll_interval: float = 0.01) -> None:
+        """waits until nothing is queued or running, retries included"""
+        while await asyncio.to_thread(self.backend.depth):
+            await asyncio.sleep(poll_interval)
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """waits up to `timeout` for the queue to empty, then cancels the workers.
+
+        Items still queued stay in the backend, with SQLite they run after the restart.
+        """
+        if timeout:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks, self._loop = [], None
+
+
+async def ingest_email(item: QueueItem) -> None:
+    """the queue handler of /ingest: runs the email through the async graph.
+
+    The outcome is logged with the item_id /ingest returned, so an ingested email can be traced to it.
+    """
+    from email_assistant.agents import aprocess_email
+
+    result = await aprocess_email(item.payload)
+    logger.info("ingested email", extra={"item_id": item.item_id, "attempts": item.attempts,
+                                         "classification": result["classification"]})
+    logger.debug("ingest result: %s", result, extra={"item_id": item.item_id})
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+#chat models are built lazily by the factory and the tests stub its getters, the key only
+#lets a test that does build a real client construct it, offline tests never reach openai
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("EMAIL_ASSISTANT_CHECKPOINT_PATH", ":memory:")
+
+
+@pytest.fixture
+def stub_llms(monkeypatch):
+    """installs stubs in place of the factory's router (both graphs) and tool model"""
+    from email_assistant import agents, agents_HITL
+
+    def install(router=None, tool_model=None):
+        if router is not None:
+            monkeypatch.setattr(agents, "get_llm_router", lambda: router)
+            monkeypatch.setattr(agents_HITL, "get_llm_router", lambda: router)
+        if tool_model is not None:
+            monkeypatch.setattr(agents, "get_llm_with_tools", lambda: tool_model)
+        return router, tool_model
+
+    return install
+
+
+@pytest.fixture(autouse=True)
+def _fresh_triage_cache():
+    """tests reuse the same emails with different stubbed classifications"""
+    from email_assistant.triage_cache import triage_cache
+
+    triage_cache.clear()
+    yield
+    triage_cache.clear()
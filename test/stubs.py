@@ -0,0 +1,86 @@
+"""Offline stand-ins for the chat models the graphs get from the factory, shared by the tests."""
+
+import asyncio
+
+from langchain_core.messages import AIMessage
+
+from email_assistant.schemas import RouterSchema
+
+EMAIL = {
+    "author": "Alice Smith <alice.smith@company.com>",
+    "to": "John Doe <john.doe@company.com>",
+    "subject": "Quick question about API documentation",
+    "email_thread": "Hi John, could we schedule a quick call this week?",
+}
+
+
+class StubRouter:
+    """the structured-output triage router, one decision for every email
+
+    `usage` makes it answer like with_structured_output(..., include_raw=True), `delay` keeps
+    each ainvoke in flight for that long. Counts the calls and the most calls in flight at once.
+    """
+
+    def __init__(self, classification="respond", confidence=1.0, delay=0.0, usage=None):
+        self.decision = RouterSchema(classification=classification, reasoning="stub", confidence=confidence)
+        self.delay = delay
+        self.usage = usage
+        self.calls = 0
+        self.running = 0
+        self.peak = 0
+
+    def _reply(self):
+        if self.usage is None:
+            return self.decision
+        return {"raw": AIMessage(content="", usage_metadata=self.usage), "parsed": self.decision, "parsing_error": None}
+
+    def invoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        return self._reply()
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.running -= 1
+        return self._reply()
+
+    async def abatch(self, inputs, config=None, return_exceptions=False, **kwargs):
+        self.calls += len(inputs)
+        return [self._reply() for _ in inputs]
+
+
+class StubToolModel:
+    """the tool-bound response model: write_email, then Done once a tool result is back
+
+    Records every prompt. `gate` (an asyncio.Event) holds each ainvoke until it is set,
+    `delay` and `usage` as for StubRouter.
+    """
+
+    def __init__(self, delay=0.0, usage=None, gate=None):
+        self.delay = delay
+        self.usage = usage
+        self.gate = gate
+        self.prompts = []
+
+    def _reply(self, messages):
+        if any(getattr(m, "type", None) == "tool" for m in messages):
+            tool_call = {"name": "Done", "args": {"done": True}, "id": "done"}
+        else:
+            args = {"to": "alice.smith@company.com", "subject": "Re: API", "body": "Sure"}
+            tool_call = {"name": "write_email", "args": args, "id": "write"}
+        return AIMessage(content="", tool_calls=[tool_call], usage_metadata=self.usage)
+
+    def invoke(self, messages, config=None, **kwargs):
+        self.prompts.append(messages)
+        return self._reply(messages)
+
+    async def ainvoke(self, messages, config=None, **kwargs):
+        self.prompts.append(messages)
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._reply(messages)
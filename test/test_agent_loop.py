@@ -0,0 +1,56 @@
+import itertools
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from email_assistant import agents
+from email_assistant.fake_llm import FakeChatModel
+from email_assistant.metrics import AGENT_LLM_CALLS_SAVED, AGENT_STOPS
+
+START = {"messages": [HumanMessage(content="Respond to the email: can we meet on Tuesday?")]}
+CALENDAR_ARGS = {"attendees": ["alice@company.com"], "preferred_day": "2025-05-20T10:00:00", "duration_minutes": 30}
+
+
+def call(name, args, i):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{i}", "type": "tool_call"}])
+
+
+def run(monkeypatch, script):
+    model = FakeChatModel(responses=script)
+    monkeypatch.setattr(agents, "get_llm_with_tools", lambda: model)
+    return agents.build_response_agent().invoke(START), model
+
+
+def stops(reason):
+    return AGENT_STOPS.labels(reason).value
+
+
+def test_run_ends_after_write_email_without_a_done_round_trip(monkeypatch):
+    email = {"to": "alice@company.com", "subject": "Re: meeting", "body": "Tuesday works."}
+    saved_before, stops_before = AGENT_LLM_CALLS_SAVED.labels().value, stops("terminal_tool")
+
+    state, model = run(monkeypatch, [call("check_calendar_availability", CALENDAR_ARGS, 1), call("write_email", email, 2)])
+
+    assert [m.type for m in state["messages"]] == ["human", "ai", "tool", "ai", "tool"]
+    assert model._script_position == 2
+    assert AGENT_LLM_CALLS_SAVED.labels().value == saved_before + 1
+    assert stops("terminal_tool") == stops_before + 1
+
+
+def test_repeated_identical_tool_calls_end_the_run(monkeypatch):
+    state, model = run(monkeypatch, [call("check_calendar_availability", CALENDAR_ARGS, i) for i in range(10)])
+
+    #made twice, the third identical call is not run
+    assert model._script_position == 3
+    assert [m.type for m in state["messages"]][-1] == "ai"
+    assert sum(m.type == "tool" for m in state["messages"]) == 2
+
+
+def test_step_budget_caps_the_llm_calls(monkeypatch):
+    monkeypatch.setattr(agents, "AGENT_MAX_STEPS", 3)
+    days = (f"2025-05-{day:02d}T10:00:00" for day in itertools.count(1))
+    script = [call("check_calendar_availability", {**CALENDAR_ARGS, "preferred_day": next(days)}, i) for i in range(10)]
+
+    state, model = run(monkeypatch, script)
+
+    assert model._script_position == 3
+    assert sum(m.type == "ai" for m in state["messages"]) == 3
@@ -0,0 +1,80 @@
+"""Offline checks that the graphs run end to end through ainvoke / astream."""
+
+import asyncio
+
+import httpx
+from langgraph.types import Command
+
+from email_assistant import agents, agents_HITL
+from email_assistant.main import app
+from email_assistant.schemas import RouterSchema
+from stubs import EMAIL, StubRouter, StubToolModel
+
+
+def test_aprocess_email_runs_response_agent(stub_llms):
+    stub_llms(StubRouter("respond"), StubToolModel())
+
+    result = asyncio.run(agents.compiled_email_assistant.ainvoke({"email_input": EMAIL}))
+
+    assert result["classification_response"] == "respond"
+    #the run ends once write_email's result is back, no llm_call just to call Done
+    assert [m.type for m in result["messages"]] == ["human", "ai", "tool"]
+
+
+def test_hitl_astream_interrupts_and_resumes(stub_llms):
+    stub_llms(StubRouter("notify"), StubToolModel())
+    graph = agents_HITL.compiled_email_assistant_hitl
+    config = {"configurable": {"thread_id": "test-hitl-async"}}
+
+    async def run():
+        chunks = [chunk async for chunk in graph.astream({"email_input": EMAIL}, config=config)]
+        resumed = await graph.ainvoke(Command(resume=[{"type": "response", "args": "say yes"}]), config=config)
+        return chunks, resumed
+
+    chunks, resumed = asyncio.run(run())
+
+    assert "__interrupt__" in chunks[-1]
+    assert resumed["messages"][-1].name == "write_email"
+
+
+class StubBatchRouter:
+    """classifies by subject and fails on the subject 'boom'"""
+
+    async def abatch(self, inputs, config=None, return_exceptions=False, **kwargs):
+        results = []
+        for messages in inputs:
+            user_prompt = messages[-1]["content"]
+            if "boom" in user_prompt:
+                results.append(RuntimeError("rate limited"))
+            elif "newsletter" in user_prompt:
+                results.append(RouterSchema(classification="ignore", reasoning="stub", confidence=1.0))
+            else:
+                results.append(RouterSchema(classification="respond", reasoning="stub", confidence=1.0))
+        return results
+
+
+def test_aprocess_email_batch_keeps_order_and_isolates_errors(stub_llms):
+    stub_llms(StubBatchRouter(), StubToolModel())
+    emails = [EMAIL, {**EMAIL, "subject": "boom"}, {**EMAIL, "subject": "newsletter"}]
+
+    results = asyncio.run(agents.aprocess_email_batch(emails, max_concurrency=2))
+
+    assert results[0]["classification"] == "respond"
+    assert "error" not in results[0]
+    assert "rate limited" in results[1]["error"]
+    assert results[2]["classification"] == "ignore"
+
+
+def test_hitl_endpoint_completes_without_interrupt(stub_llms):
+    stub_llms(StubRouter("respond"), StubToolModel())
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/process-email-hitl", json={"email_input": EMAIL})
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert response.json()["result"]["response"].startswith("Email sent")
@@ -0,0 +1,114 @@
+import asyncio
+from typing import TypedDict
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, interrupt
+
+from email_assistant.checkpointer import BoundedSqliteSaver
+from email_assistant.jobs import JobStore
+
+
+class CounterState(TypedDict):
+    count: int
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def build_graph(saver):
+    """two steps then an interrupt, like a notify email waiting for review"""
+    def step(state):
+        return {"count": state["count"] + 1}
+
+    def review(state):
+        return {"count": state["count"] + interrupt("review?")}
+
+    graph = StateGraph(CounterState)
+    graph.add_node("first", step)
+    graph.add_node("second", step)
+    graph.add_node("review", review)
+    graph.add_edge(START, "first")
+    graph.add_edge("first", "second")
+    graph.add_edge("second", "review")
+    graph.add_edge("review", END)
+    return graph.compile(checkpointer=saver)
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def test_compaction_keeps_interrupted_threads_resumable():
+    saver = BoundedSqliteSaver.from_path(":memory:", clock=FakeClock())
+    graph = build_graph(saver)
+    graph.invoke({"count": 0}, config("a"))
+    before = saver.stats()["checkpoints"]
+
+    result = saver.compact()
+
+    assert result["pruned_checkpoints"] == before - saver.stats()["checkpoints"] > 0
+    assert graph.invoke(Command(resume=10), config("a")) == {"count": 12}
+
+
+def test_ttl_expires_abandoned_threads():
+    clock = FakeClock()
+    saver = BoundedSqliteSaver.from_path(":memory:", ttl_seconds=60, clock=clock)
+    graph = build_graph(saver)
+    graph.invoke({"count": 0}, config("abandoned"))
+    clock.now += 61
+    graph.invoke({"count": 0}, config("fresh"))
+
+    assert saver.compact()["expired_threads"] == 1
+    assert saver.get_tuple(config("abandoned")) is None
+    assert saver.get_tuple(config("fresh")) is not None
+
+
+def test_cap_evicts_least_recently_active_threads():
+    clock = FakeClock()
+    saver = BoundedSqliteSaver.from_path(":memory:", max_checkpoints=2, prune_history=True, clock=clock)
+    graph = build_graph(saver)
+    for thread_id in ("old", "middle", "new"):
+        graph.invoke({"count": 0}, config(thread_id))
+        clock.now += 1
+
+    assert saver.compact()["evicted_threads"] == 1
+    assert saver.get_tuple(config("old")) is None
+    assert saver.stats()["threads"] == 2
+
+
+def test_threads_with_an_unfinished_job_are_neither_expired_nor_evicted():
+    clock = FakeClock()
+    saver = BoundedSqliteSaver.from_path(":memory:", ttl_seconds=60, max_checkpoints=0, clock=clock)
+    graph = build_graph(saver)
+    for thread_id in ("resuming", "idle"):
+        graph.invoke({"count": 0}, config(thread_id))
+    store = JobStore(saver)
+    store.update(store.create("resuming", "resume").job_id, "running")
+    clock.now += 61
+
+    #both are past the TTL and over the cap, only the idle one goes
+    result = saver.compact()
+    assert (result["expired_threads"], result["evicted_threads"]) == (1, 0)
+    assert saver.get_tuple(config("idle")) is None
+    assert graph.invoke(Command(resume=10), config("resuming")) == {"count": 12}
+
+
+def test_async_graph_api():
+    saver = BoundedSqliteSaver.from_path(":memory:")
+    graph = build_graph(saver)
+
+    async def run():
+        await graph.ainvoke({"count": 0}, config("async"))
+        state = await graph.aget_state(config("async"))
+        resumed = await graph.ainvoke(Command(resume=1), config("async"))
+        return state, resumed
+
+    state, resumed = asyncio.run(run())
+
+    assert state.next == ("review",)
+    assert resumed == {"count": 3}
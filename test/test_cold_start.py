@@ -0,0 +1,11 @@
+import subprocess
+import sys
+
+LAZY_MODULES = ("langgraph", "langchain", "langchain_openai", "openai", "IPython")
+
+
+def test_importing_the_api_does_not_build_graphs_or_import_heavy_packages():
+    code = "import sys, email_assistant.main; print(','.join(m for m in %r if m in sys.modules))" % (LAZY_MODULES,)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == ""
@@ -3,6 +3,7 @@
 import pytest
 from  email_assistant.agents import compiled_email_assistant
 from email_assistant.utils import extract_tool_calls
+from email_assistant.config import AGENT_TERMINAL_TOOLS
 from email_assistant.eval.email_test_dataset import email_inputs, expected_tool_calls
 from langsmith import testing as t
 
@@ -16,6 +17,8 @@ def test_email_dataset_tool_calls(email_input, expected_calls):
     extracted_tool_calls = extract_tool_calls(result["messages"])
     print("#############################")
     print("Final tool calls done:", extracted_tool_calls)
+    #runs end right after a terminal tool (write_email) succeeds, the model no longer has to call Done
+    expected_calls = [call for call in expected_calls if call != "Done" or not AGENT_TERMINAL_TOOLS & set(expected_calls)]
     missing_calls = [call for call in expected_calls if call not in extracted_tool_calls]
     print("missing calls:", missing_calls)
 
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+from email_assistant import agents
+from email_assistant.agent_tools import Tools
+from email_assistant.eval import runner
+from email_assistant.eval.verdict_cache import VerdictCache, verdict_cache_key
+from email_assistant.fake_llm import FakeChatModel
+from email_assistant.schemas import EVAL_SCHEMA, RouterSchema
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    router = FakeChatModel(model_name="gpt-4o-mini").with_structured_output(RouterSchema, include_raw=True)
+    tool_model = FakeChatModel(model_name="gpt-4o").bind_tools(Tools, tool_choice="any")
+    monkeypatch.setattr(agents, "get_llm_router", lambda: router)
+    monkeypatch.setattr(agents, "get_llm_router_escalation", lambda: router)
+    monkeypatch.setattr(agents, "get_llm_with_tools", lambda: tool_model)
+    return agents.build_email_assistant(), FakeChatModel(model_name="gpt-4o").with_structured_output(EVAL_SCHEMA, include_raw=True)
+
+
+def test_every_example_is_graded_and_costed(tmp_path, fake_models):
+    graph, judge_llm = fake_models
+    output = tmp_path / "results.jsonl"
+
+    results = asyncio.run(runner.run_eval(str(output), concurrency=4, graph=graph, judge_llm=judge_llm))
+
+    assert [r["example"] for r in results] == runner.email_names
+    assert all(r["error"] is None and r["grade"] is True for r in results)
+    assert len(output.read_text().splitlines()) == len(runner.email_names)
+    summary = runner.summarize(results)
+    assert summary["pass_rate"] == 1.0 and summary["input_tokens"] > 0
+    assert summary["cost_usd"] == pytest.approx(sum(r["cost_usd"] for r in results)) and summary["cost_usd"] > 0
+
+
+def test_an_interrupted_run_resumes_and_reruns_errors(tmp_path, fake_models, monkeypatch):
+    graph, judge_llm = fake_models
+    output = tmp_path / "results.jsonl"
+    first = asyncio.run(runner.run_eval(str(output), limit=3, graph=graph, judge_llm=judge_llm))
+    failed = dict(first[1], error="TimeoutError: judge timed out", grade=None)
+    #the errored example and a line cut off mid-write
+    output.write_text(json.dumps(first[0]) + "\n" + json.dumps(failed) + "\n" + '{"example": "email_')
+
+    seen = []
+    real_run_example = runner.run_example
+
+    async def run_example(item, graph, judge_llm, *args):
+        seen.append(item["example"])
+        return await real_run_example(item, graph, judge_llm, *args)
+
+    monkeypatch.setattr(runner, "run_example", run_example)
+    results = asyncio.run(runner.run_eval(str(output), limit=3, graph=graph, judge_llm=judge_llm))
+
+    assert sorted(seen) == sorted(runner.email_names[1:3])
+    assert [r["error"] for r in results] == [None, None, None]
+    assert [r["error"] for r in runner.load_results(str(output)).values()] == [None, None, None]
+
+
+def test_unchanged_transcripts_reuse_cached_verdicts(tmp_path, fake_models):
+    graph, judge_llm = fake_models
+    verdicts = VerdictCache(str(tmp_path / "verdicts.sqlite"))
+    judged = []
+
+    class CountingJudge:
+        async def ainvoke(self, messages, config=None):
+            judged.append(messages)
+            return await judge_llm.ainvoke(messages, config=config)
+
+    def run():
+        return asyncio.run(runner.run_eval(str(tmp_path / "results.jsonl"), limit=4, fresh=True, graph=graph,
+                                           judge_llm=CountingJudge(), verdicts=verdicts, judge_model="fake:judge"))
+
+    first = run()
+    assert len(judged) == 4 and runner.summarize(first)["verdicts_cached"] == 0
+    second = run()
+    assert len(judged) == 4 and runner.summarize(second)["verdicts_cached"] == 4
+    assert [r["grade"] for r in second] == [r["grade"] for r in first]
+    assert all(r["tokens"]["judge"]["input_tokens"] == 0 for r in second)
+    assert verdicts.stats()["hits"] == 4 and verdicts.stats()["entries"] == 4
+
+    key = verdict_cache_key("transcript", "criteria", "fake:judge")
+    assert key != verdict_cache_key("transcript", "criteria", "openai:gpt-4o")
+    assert key != verdict_cache_key("transcript", "criteria", "fake:judge", prompt_version="2-abc")
+    assert key != verdict_cache_key("transcript changed", "criteria", "fake:judge")
+
+
+def test_cost_uses_the_longest_matching_price():
+    usage = {"gpt-4o-mini-2024-07-18": {"input_tokens": 1_000_000, "output_tokens": 0},
+             "gpt-4o-2024-08-06": {"input_tokens": 0, "output_tokens": 1_000_000},
+             "fake-chat-model": {"input_tokens": 5, "output_tokens": 5}}
+
+    assert runner.usage_cost(usage) == pytest.approx(0.15 + 10.00)
+    assert runner.percentile([0.1, 0.2, 0.3, 0.4], 50) == 0.2
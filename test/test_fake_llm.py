@@ -0,0 +1,58 @@
+import asyncio
+import statistics
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from email_assistant import config, factory
+from email_assistant.agent_tools import Tools
+from email_assistant.fake_llm import FakeChatModel, parse_latency
+from email_assistant.prompt_registry import unwrap_structured
+from email_assistant.schemas import RouterSchema
+from email_assistant.triage import triage_messages
+
+NEWSLETTER = {"author": "Dev Weekly <news@devweekly.io>", "to": "me@company.com", "subject": "This week's newsletter", "email_thread": "Unsubscribe here."}
+MEETING = {"author": "Alice <alice@company.com>", "to": "me@company.com", "subject": "Planning", "email_thread": "Can we schedule a meeting next week?"}
+
+
+def test_structured_output_goes_through_the_tool_calling_path():
+    router = FakeChatModel().with_structured_output(RouterSchema, include_raw=True)
+
+    result = router.invoke(triage_messages(NEWSLETTER))
+
+    assert unwrap_structured("triage", result) == RouterSchema(classification="ignore", reasoning=result["parsed"].reasoning, confidence=0.95)
+    assert result["raw"].usage_metadata["input_tokens"] > 0
+
+
+def test_bound_tools_drive_a_meeting_conversation():
+    model = FakeChatModel().bind_tools(Tools, tool_choice="any")
+    messages = [HumanMessage(content=f"Respond to the email: {MEETING['email_thread']}")]
+    names = []
+    while not names or names[-1] != "Done":
+        reply = asyncio.run(model.ainvoke(messages))
+        names.append(reply.tool_calls[0]["name"])
+        messages.append(reply)
+
+    assert names == ["check_calendar_availability", "schedule_meeting", "write_email", "Done"]
+
+
+def test_latency_distributions():
+    assert parse_latency("lognormal:0.5:0.2") == ("lognormal", 0.5, 0.2)
+    assert parse_latency("fixed:0.1") == ("fixed", 0.1, 0.0)
+    with pytest.raises(ValueError):
+        parse_latency("pareto:1")
+
+    model = FakeChatModel(latency_distribution="lognormal", latency_mean=0.5, latency_jitter=0.2, seed=1)
+    samples = [model.sample_latency() for _ in range(5000)]
+    assert statistics.mean(samples) == pytest.approx(0.5, rel=0.05)
+    assert statistics.stdev(samples) == pytest.approx(0.2, rel=0.1)
+    assert FakeChatModel(latency_mean=0.3).sample_latency() == 0.3
+
+
+def test_factory_hands_out_the_fake_provider(monkeypatch):
+    monkeypatch.setattr(config, "LLM_PROVIDER", "fake")
+    factory.get_chat_model.cache_clear()
+    try:
+        assert isinstance(factory.get_chat_model(), FakeChatModel)
+    finally:
+        factory.get_chat_model.cache_clear()
@@ -0,0 +1,85 @@
+import functools
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import tool
+
+from email_assistant import agents
+from email_assistant.fake_llm import FakeChatModel
+from email_assistant.history import compact_history, estimate_tokens, message_tokens
+
+
+def _turn(i, result_chars=2000):
+    call = {"name": "check_calendar_availability", "args": {"attendees": ["alice@company.com"], "preferred_day": f"2025-05-{i:02d}T10:00:00", "duration_minutes": 30}, "id": f"call_{i}", "type": "tool_call"}
+    return [
+        AIMessage(content="", tool_calls=[call]),
+        ToolMessage(content=f"slot {i} " + "x" * result_chars, tool_call_id=f"call_{i}", name="check_calendar_availability"),
+    ]
+
+
+def _conversation(turns):
+    messages = [HumanMessage(content="Respond to the email: can we meet?")]
+    for i in range(1, turns + 1):
+        messages += _turn(i)
+    return messages
+
+
+def test_old_tool_results_are_collapsed_oldest_first_and_stay_paired():
+    messages = _conversation(5)
+    budget = sum(message_tokens(m) for m in messages) - 600
+
+    history = compact_history(messages, token_budget=budget, keep_turns=2)
+
+    assert history.tokens_after <= budget
+    assert history.tokens_saved == history.tokens_before - history.tokens_after > 0
+    assert history.compacted_results == 2
+    #same messages in the same order, every tool call still answered by its own result
+    assert [type(m) for m in history.messages] == [type(m) for m in messages]
+    assert [getattr(m, "tool_call_id", None) for m in history.messages] == [getattr(m, "tool_call_id", None) for m in messages]
+    assert history.messages[2].content.startswith("[earlier check_calendar_availability result, compacted] slot 1")
+    assert history.messages[6] is messages[6]
+    #the last two turns are never touched
+    assert history.messages[-4:] == messages[-4:]
+    assert "x" * 2000 in messages[2].content
+
+
+def test_under_budget_or_disabled_sends_the_conversation_unchanged():
+    messages = _conversation(3)
+
+    for history in (compact_history(messages, token_budget=100_000), compact_history(messages, token_budget=0)):
+        assert history.messages == messages
+        assert history.tokens_saved == 0
+
+    #only protected turns: over budget, but nothing recent is cut
+    history = compact_history(messages, token_budget=10, keep_turns=3)
+    assert history.messages == messages and history.tokens_after > 10
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_response_agent_reports_tokens_saved_per_run(monkeypatch):
+    script = [m for i in range(1, 5) for m in _turn(i)[:1]] + [
+        AIMessage(content="", tool_calls=[{"name": "Done", "args": {"done": True}, "id": "call_done", "type": "tool_call"}])
+    ]
+    model = FakeChatModel(responses=script)
+    sent = []
+    original = agents.prompt_registry.agent_messages
+    monkeypatch.setattr(agents.prompt_registry, "agent_messages", lambda messages: sent.append(messages) or original(messages))
+    monkeypatch.setattr(agents, "get_llm_with_tools", lambda: model)
+
+    @tool
+    def check_calendar_availability(attendees: list, preferred_day: str, duration_minutes: int) -> str:
+        """long calendar dump"""
+        return "free " * 500
+    monkeypatch.setitem(agents.tool_names, "check_calendar_availability", check_calendar_availability)
+    monkeypatch.setattr(agents, "compact_history", functools.partial(compact_history, token_budget=1000, keep_turns=1))
+
+    state = agents.build_response_agent().invoke({"messages": [HumanMessage(content="Respond to the email: can we meet?")]})
+
+    assert state["history_tokens_saved"] > 0
+    #the state keeps the full results, only the requests were compacted
+    assert not any("compacted" in m.content for m in state["messages"] if isinstance(m, ToolMessage))
+    assert any("compacted" in m.content for m in sent[-1] if isinstance(m, ToolMessage))
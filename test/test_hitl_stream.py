@@ -0,0 +1,120 @@
+"""Offline check of the server-sent events stream of /process-email-hitl/stream."""
+
+import asyncio
+import json
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from email_assistant import factory
+from email_assistant.main import app, process_email_hitl_stream_endpoint
+from email_assistant.schemas import ProcessEmailHITLRequest
+from stubs import EMAIL, StubRouter
+
+class StreamingToolModel(BaseChatModel):
+    """replays scripted replies, streaming the text word by word and the tool calls last"""
+    replies: list
+
+    @property
+    def _llm_type(self):
+        return "streaming-tool-stub"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self.replies.pop(0))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self.replies.pop(0)
+        for word in reply.content.split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        tool_call_chunks = [
+            {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+            for i, tc in enumerate(reply.tool_calls)
+        ]
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=tool_call_chunks))
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def post_stream(payload):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/process-email-hitl/stream", json=payload)
+    return response
+
+
+def test_stream_sends_tokens_nodes_and_result(stub_llms):
+    draft = AIMessage(
+        content="Happy to set up a call",
+        tool_calls=[{"name": "write_email", "args": {"to": "alice", "subject": "Re", "body": "Sure"}, "id": "w"}],
+    )
+    done = AIMessage(content="", tool_calls=[{"name": "Done", "args": {"done": True}, "id": "d"}])
+    stub_llms(StubRouter("respond"), StreamingToolModel(replies=[draft, done]))
+
+    response = asyncio.run(post_stream({"email_input": EMAIL}))
+    events = parse_events(response.text)
+    kinds = [kind for kind, _ in events]
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert kinds[0] == "thread"
+    assert "".join(data["content"] for kind, data in events if kind == "token").strip() == "Happy to set up a call"
+    assert [data["node"] for kind, data in events if kind == "node"][:2] == ["triage_router", "llm_call"]
+    assert kinds[-1] == "result"
+    assert events[-1][1]["result"]["response"].startswith("Email sent")
+
+
+def test_stream_stops_at_interrupt(stub_llms):
+    stub_llms(StubRouter("notify"))
+
+    events = parse_events(asyncio.run(post_stream({"email_input": EMAIL})).text)
+
+    assert events[-1][0] == "interrupt"
+    assert events[-1][1]["interrupt"]["allowed_actions"] == ["ignore", "respond"]
+
+
+def test_stream_resume_releases_the_thread(stub_llms):
+    stub_llms(StubRouter("notify"))
+    thread_id = parse_events(asyncio.run(post_stream({"email_input": EMAIL})).text)[0][1]["thread_id"]
+
+    resume = {"thread_id": thread_id, "human_response": {"type": "ignore"}}
+    events = parse_events(asyncio.run(post_stream(resume)).text)
+
+    assert events[-1][0] == "result"
+    assert asyncio.run(factory.get_job_runner().active_job(thread_id)) is None
+
+
+def test_a_stream_closed_after_its_first_event_releases_the_thread(stub_llms):
+    stub_llms(StubRouter("notify"))
+    thread_id = parse_events(asyncio.run(post_stream({"email_input": EMAIL})).text)[0][1]["thread_id"]
+    resume = {"thread_id": thread_id, "human_response": {"type": "ignore"}}
+    runner = factory.get_job_runner()
+
+    async def disconnect_after_first_event():
+        response = await process_email_hitl_stream_endpoint(ProcessEmailHITLRequest(**resume))
+        first = await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()
+        await response.background()
+        return first
+
+    async def never_iterated():
+        response = await process_email_hitl_stream_endpoint(ProcessEmailHITLRequest(**resume))
+        busy = await runner.active_job(thread_id)
+        await response.background()
+        return busy
+
+    assert "event: thread" in asyncio.run(disconnect_after_first_event())
+    assert asyncio.run(runner.active_job(thread_id)) is None
+    assert asyncio.run(never_iterated()) is not None
+    assert asyncio.run(runner.active_job(thread_id)) is None
+    events = parse_events(asyncio.run(post_stream(resume)).text)
+    assert events[-1][0] == "result"
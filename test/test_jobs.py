@@ -0,0 +1,178 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from email_assistant import factory
+from email_assistant.checkpointer import BoundedSqliteSaver
+from email_assistant.jobs import JobRunner, JobStore, callback_allowed
+from email_assistant.main import app, process_email_hitl_endpoint
+from email_assistant.schemas import ProcessEmailHITLRequest
+from stubs import EMAIL, StubRouter, StubToolModel
+
+
+def test_hitl_new_and_resume_run_as_jobs_with_a_callback(monkeypatch, stub_llms):
+    stub_llms(StubRouter("notify"), StubToolModel())
+    callbacks = []
+
+    def receive(request):
+        callbacks.append(json.loads(request.content))
+        return httpx.Response(204)
+
+    runner = JobRunner(JobStore(factory.get_checkpointer()), callback_transport=httpx.MockTransport(receive),
+                       callback_allowed_hosts=["client.test"])
+    monkeypatch.setattr(factory, "get_job_runner", lambda: runner)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            started = await client.post("/process-email-hitl/jobs", json={"email_input": EMAIL})
+            await runner.drain()
+            interrupted = (await client.get(f"/jobs/{started.json()['job_id']}")).json()
+
+            resume = {"thread_id": started.json()["thread_id"], "human_response": {"type": "response", "args": "say yes"},
+                      "callback_url": "http://client.test/done"}
+            queued = await client.post("/process-email-hitl/jobs", json=resume)
+            duplicate = await client.post("/process-email-hitl/jobs", json=resume)
+            await runner.drain()
+            finished = (await client.get(f"/jobs/{queued.json()['job_id']}")).json()
+            unknown = await client.get("/jobs/nope")
+            bad_thread = await client.post("/process-email-hitl/jobs", json={**resume, "thread_id": "missing"})
+            bad_callback = await client.post("/process-email-hitl/jobs",
+                                             json={"email_input": EMAIL, "callback_url": "http://169.254.169.254/latest"})
+            return started, interrupted, queued, duplicate, finished, unknown, bad_thread, bad_callback
+
+    started, interrupted, queued, duplicate, finished, unknown, bad_thread, bad_callback = asyncio.run(run())
+
+    assert started.status_code == 202 and started.json()["status"] == "queued"
+    assert interrupted["status"] == "completed" and interrupted["result"]["status"] == "interrupted"
+    assert queued.status_code == 202 and queued.json()["kind"] == "resume"
+    assert duplicate.status_code == 409
+    assert finished["status"] == "completed"
+    assert finished["result"]["result"]["response"].startswith("Email sent")
+    assert [c["job_id"] for c in callbacks] == [queued.json()["job_id"]]
+    assert callbacks[0]["status"] == "completed"
+    assert unknown.status_code == 404 and bad_thread.status_code == 400
+    assert bad_callback.status_code == 400 and len(callbacks) == 1
+
+
+@pytest.mark.parametrize("url, allowed", [
+    ("https://hooks.example.com/done", True),
+    ("http://hooks.example.com:8443/done", True),
+    ("https://hooks.example.com.evil.test/done", False),
+    ("https://other.example.com/email/done", True),
+    ("https://other.example.com/emailx", False),
+    ("https://other.example.com/admin", False),
+    ("file:///etc/passwd", False),
+    ("http://127.0.0.1/done", False),
+])
+def test_callbacks_only_go_to_allowed_hosts(url, allowed):
+    assert callback_allowed(url, ["hooks.example.com", "https://other.example.com/email"]) is allowed
+    assert callback_allowed(url, []) is False
+
+
+def test_jobs_are_removed_with_their_thread_and_survive_restarts_as_failed():
+    saver = BoundedSqliteSaver.from_path(":memory:")
+    now = [1000.0]
+    store = JobStore(saver, clock=lambda: now[0])
+    store.heartbeat()
+    running = store.create("thread-1", "resume")
+    store.update(running.job_id, "running")
+    done = store.create("thread-2", "new")
+    store.update(done.job_id, "completed", {"status": "completed"})
+
+    #a second worker on the same database leaves the jobs of a live one alone
+    other = JobStore(saver, clock=lambda: now[0])
+    assert other.fail_orphaned(lease=60) == 0
+    assert store.get(running.job_id).status == "running"
+
+    #a crashed worker stops heartbeating, its jobs fail once the lease runs out
+    now[0] += 61
+    assert other.fail_orphaned(lease=60) == 1
+    assert store.get(running.job_id).status == "failed"
+    assert store.get(done.job_id).result == {"status": "completed"}
+
+    saver.delete_thread("thread-2")
+    assert store.get(done.job_id) is None
+
+
+def test_a_stopped_runner_leaves_its_jobs_to_the_next_start():
+    saver = BoundedSqliteSaver.from_path(":memory:")
+
+    async def run():
+        first = JobRunner(JobStore(saver))
+        await first.start()
+        job = await first.claim("thread-1", "resume")
+        second = JobRunner(JobStore(saver))
+        assert await second.start() == 0
+        await first.stop()
+        restarted = JobRunner(JobStore(saver))
+        failed = await restarted.start()
+        await second.stop()
+        await restarted.stop()
+        return job, failed
+
+    job, failed = asyncio.run(run())
+
+    assert failed == 1
+    assert JobStore(saver).get(job.job_id).status == "failed"
+
+
+def test_a_thread_runs_one_resume_at_a_time_across_endpoints(monkeypatch, stub_llms):
+    gate = asyncio.Event()
+    stub_llms(StubRouter("notify"), StubToolModel(gate=gate))
+    runner = JobRunner(JobStore(factory.get_checkpointer()))
+    monkeypatch.setattr(factory, "get_job_runner", lambda: runner)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            started = (await client.post("/process-email-hitl", json={"email_input": EMAIL})).json()
+            resume = {"thread_id": started["thread_id"], "human_response": {"type": "response", "args": "say yes"}}
+            #both pass the thread check before either job is stored
+            jobs = await asyncio.gather(*(client.post("/process-email-hitl/jobs", json=resume) for _ in range(2)))
+            sync = await client.post("/process-email-hitl", json=resume)
+            stream = await client.post("/process-email-hitl/stream", json=resume)
+            gate.set()
+            await runner.drain()
+            return jobs, sync, stream
+
+    jobs, sync, stream = asyncio.run(run())
+
+    assert sorted(r.status_code for r in jobs) == [202, 409]
+    assert sync.status_code == 409 and stream.status_code == 409
+    job_id = next(r.json()["job_id"] for r in jobs if r.status_code == 202)
+    assert runner.store.get(job_id).status == "completed"
+
+
+def test_a_cancelled_sync_resume_releases_the_thread(monkeypatch, stub_llms):
+    gate = asyncio.Event()
+    tool_model = StubToolModel(gate=gate)
+    stub_llms(StubRouter("notify"), tool_model)
+    runner = JobRunner(JobStore(factory.get_checkpointer()))
+    monkeypatch.setattr(factory, "get_job_runner", lambda: runner)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            started = (await client.post("/process-email-hitl", json={"email_input": EMAIL})).json()
+        resume = {"thread_id": started["thread_id"], "human_response": {"type": "response", "args": "say yes"}}
+        #held at the drafting call, then cancelled like a request on server shutdown
+        task = asyncio.create_task(process_email_hitl_endpoint(ProcessEmailHITLRequest(**resume)))
+        while not tool_model.prompts:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return started["thread_id"]
+
+    thread_id = asyncio.run(run())
+
+    assert asyncio.run(runner.active_job(thread_id)) is None
+
+
+def test_create_if_idle_refuses_a_second_unfinished_job():
+    store = JobStore(BoundedSqliteSaver.from_path(":memory:"))
+    first = store.create_if_idle("thread-1", "resume")
+
+    assert store.create_if_idle("thread-1", "resume") is None
+    store.update(first.job_id, "completed")
+    assert store.create_if_idle("thread-1", "resume", status="running").status == "running"
@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+
+from email_assistant import factory
+from email_assistant.llm_client import AsyncShardedTransport, ShardedTransport, http2_enabled
+
+
+def test_chat_models_share_one_pool_with_their_own_timeouts(monkeypatch):
+    monkeypatch.setattr("email_assistant.config.LLM_PROVIDER", "openai")
+    drafting = factory._init_chat_model("gpt-4o")
+    triage = factory._init_chat_model("gpt-4o-mini", timeout=5)
+
+    for model in (drafting, triage):
+        assert model.http_client is factory.get_http_client()
+        assert model.http_async_client is factory.get_async_http_client()
+        assert model.root_async_client._client is factory.get_async_http_client()
+    assert drafting.request_timeout.read == 60 and triage.request_timeout.read == 5
+    assert triage.request_timeout.connect == 5
+
+
+def test_http2_is_only_used_when_requested_and_available():
+    assert http2_enabled(False) is False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        assert http2_enabled(True) is False
+    else:
+        assert http2_enabled(True) is True
+
+
+def test_sharded_transport_sends_requests_to_the_least_busy_pool():
+    seen = []
+
+    def shard(index):
+        async def handle(request):
+            seen.append(index)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200)
+        return httpx.MockTransport(handle)
+
+    async def run():
+        async with httpx.AsyncClient(transport=AsyncShardedTransport([shard(0), shard(1), shard(2)])) as client:
+            await asyncio.gather(*(client.get("http://llm.test/") for _ in range(6)))
+
+    asyncio.run(run())
+    assert sorted(seen) == [0, 0, 1, 1, 2, 2]
+
+
+def test_a_streamed_response_counts_as_in_flight_until_its_body_is_closed():
+    def chunks():
+        yield b"data: 1\n\n"
+        yield b"data: 2\n\n"
+
+    async def achunks():
+        for chunk in chunks():
+            yield chunk
+
+    transport = AsyncShardedTransport([httpx.MockTransport(lambda request: httpx.Response(200, content=achunks()))
+                                       for _ in range(2)])
+    sync_transport = ShardedTransport([httpx.MockTransport(lambda request: httpx.Response(200, content=chunks()))
+                                       for _ in range(2)])
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("POST", "http://llm.test/") as response:
+                #headers are in, the generation is still streaming
+                assert transport.shards.in_flight == [1, 0]
+                await client.get("http://llm.test/")
+                assert transport.shards.in_flight == [1, 0]
+                assert [line async for line in response.aiter_lines() if line] == ["data: 1", "data: 2"]
+        assert transport.shards.in_flight == [0, 0]
+
+    asyncio.run(run())
+    with httpx.Client(transport=sync_transport) as client:
+        with client.stream("POST", "http://llm.test/"):
+            assert sync_transport.shards.in_flight == [1, 0]
+        assert sync_transport.shards.in_flight == [0, 0]
@@ -0,0 +1,61 @@
+import asyncio
+import io
+import json
+import logging
+
+from email_assistant.log import JsonFormatter, bind_thread_id, timed_node
+
+
+class Expensive:
+    """counts how often it is rendered"""
+
+    def __init__(self):
+        self.rendered = 0
+
+    def __str__(self):
+        self.rendered += 1
+        return "expensive"
+
+
+def _logger(level):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger(f"email_assistant.test_log.{level}")
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger, stream
+
+
+def test_disabled_levels_never_render_their_arguments():
+    logger, stream = _logger(logging.INFO)
+    state = Expensive()
+
+    logger.debug("state: %s", state)
+    assert state.rendered == 0 and stream.getvalue() == ""
+
+    logger.info("state: %s", state)
+    assert state.rendered == 1
+    assert json.loads(stream.getvalue())["msg"] == "state: expensive"
+
+
+def test_records_carry_thread_id_node_and_timing():
+    logger, stream = _logger(logging.INFO)
+
+    def node(state):
+        logger.info("inside", extra={"classification": "respond"})
+        return state
+
+    async def anode(state):
+        return state
+
+    timed = timed_node("triage_router", logger)
+    timed(node)({"x": 1}, {"configurable": {"thread_id": "thread-1"}})
+    with bind_thread_id("thread-2"):
+        asyncio.run(timed(anode)({"x": 1}, {}))
+
+    inside, finished, afinished = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert inside == {**inside, "thread_id": "thread-1", "node": "triage_router", "classification": "respond"}
+    assert finished["msg"] == "node finished" and finished["duration_ms"] >= 0
+    assert afinished["thread_id"] == "thread-2" and afinished["node"] == "triage_router"
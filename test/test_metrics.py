@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+
+from email_assistant.main import app
+from email_assistant.metrics import Counter, Histogram, Registry
+from stubs import EMAIL, StubRouter, StubToolModel
+
+USAGE = {"input_tokens": 120, "output_tokens": 30, "total_tokens": 150}
+
+
+def test_text_format():
+    registry = Registry()
+    counter = Counter("requests", "Requests", ["path"], registry=registry)
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0), registry=registry)
+    counter.labels('/a"b').inc()
+    counter.labels('/a"b').inc(2)
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP requests Requests",
+        "# TYPE requests counter",
+        'requests_total{path="/a\\"b"} 3',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 5.55",
+        "latency_seconds_count 3",
+    ]
+
+
+def test_metrics_endpoint_after_a_request(stub_llms):
+    stub_llms(StubRouter(usage=USAGE), StubToolModel(usage=USAGE))
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            assert (await client.post("/process-email", json={"email_input": EMAIL})).status_code == 200
+            return await client.get("/metrics")
+
+    response = asyncio.run(run())
+    body = response.text
+
+    assert response.headers["content-type"].startswith("text/plain")
+    for node in ("triage_router", "llm_call", "tool_handler"):
+        assert f'email_assistant_node_latency_seconds_count{{node="{node}"}}' in body
+    assert 'email_assistant_tool_latency_seconds_count{tool="write_email",status="ok"}' in body
+    assert 'email_assistant_agent_loop_iterations_bucket{le="2"}' in body
+    assert 'email_assistant_classifications_total{classification="respond",source="llm"}' in body
+    assert 'email_assistant_llm_tokens_total{prompt="agent",type="completion"}' in body
+    assert 'email_assistant_llm_tokens_total{prompt="triage",type="prompt"}' in body
@@ -0,0 +1,81 @@
+from email_assistant.agents_HITL import _interrupt_request
+from email_assistant.history import estimate_tokens
+from email_assistant.preprocessing import TRUNCATION_MARKER, clean_email_body, preprocess_email
+from email_assistant.triage import triage_messages
+
+NEW_MESSAGE = "Hi John,\n\nCan we move the review to Thursday?\n\nThanks!\nAlice"
+
+
+def test_quoted_history_is_cut_at_the_reply_header():
+    gmail = NEW_MESSAGE + "\n\nOn Mon, Jun 3, 2024 at 9:10 AM John Doe <john@company.com>\nwrote:\n> Review is on Tuesday.\n"
+    outlook = NEW_MESSAGE + "\n\n________________________________\nFrom: John Doe\nSent: Monday, June 3, 2024\nSubject: Review"
+    inline = "Sounds good.\n> Are you free on Thursday?\nSee you then."
+
+    assert clean_email_body(gmail) == NEW_MESSAGE
+    assert clean_email_body(outlook) == NEW_MESSAGE
+    assert clean_email_body(inline) == "Sounds good.\nSee you then."
+
+
+def test_forwarded_messages_are_kept():
+    forwarded = "Subject: Budget\nTo: me@company.com\n\nThe budget is approved for Q3."
+    gmail = ("FYI see below.\n\n---------- Forwarded message ---------\nFrom: Bob <bob@company.com>\n"
+             "Date: Mon, Jun 3, 2024 at 9:10 AM\n" + forwarded)
+    apple = "FYI see below.\n\nBegin forwarded message:\n\nFrom: Bob <bob@company.com>\n" + forwarded
+
+    assert clean_email_body(gmail) == gmail
+    assert clean_email_body(apple) == apple
+    #a reply inside the forwarded message is still cut
+    assert clean_email_body(gmail + "\n\nOn Sun, Jun 2, 2024, Carol wrote:\n> old text") == gmail
+
+
+def test_signatures_and_footers_go_but_the_sign_off_and_unsubscribe_stay():
+    body = (NEW_MESSAGE + "\n\nSent from my iPhone\n-- \nAlice Smith | Engineer\n+1 555 0100\n\n"
+            "CONFIDENTIALITY NOTICE: This e-mail is confidential.")
+    newsletter = "This week in tech.\n\nTo unsubscribe, click here."
+
+    assert clean_email_body(body) == NEW_MESSAGE
+    assert clean_email_body(newsletter) == newsletter
+
+
+def test_html_is_converted_to_text():
+    body = ("<html><head><style>p {color: red}</style></head><body><p>Hi John,</p><p>Agenda:</p>"
+            "<ul><li>budget</li><li>hiring</li></ul><p>Tom &amp; Alice</p>"
+            "<blockquote>earlier message</blockquote></body></html>")
+
+    assert clean_email_body(body) == "Hi John,\nAgenda:\n\n- budget\n- hiring\nTom & Alice"
+
+
+def test_long_bodies_are_truncated_to_the_budget():
+    body = "word " * 2000
+
+    cleaned = clean_email_body(body, 100)
+
+    assert cleaned.endswith(TRUNCATION_MARKER)
+    assert estimate_tokens(cleaned) <= 100
+
+
+def test_a_body_that_is_only_a_quote_is_kept():
+    body = "> the whole message is quoted"
+
+    assert clean_email_body(body) == body
+
+
+def test_triage_sees_the_cleaned_body_and_the_input_is_untouched():
+    email = {"author": "Alice <alice@company.com>", "to": "john@company.com", "subject": "Review",
+             "email_thread": NEW_MESSAGE + "\n\nOn Mon, Jun 3, 2024, John wrote:\n> old text"}
+
+    prompt = triage_messages(email)[-1]["content"]
+
+    assert "Thursday" in prompt and "old text" not in prompt
+    assert "old text" in email["email_thread"]
+    assert preprocess_email(email)["email_thread"] == NEW_MESSAGE
+
+
+def test_the_hitl_notify_request_shows_the_cleaned_body():
+    email = {"author": "Alice <alice@company.com>", "to": "john@company.com", "subject": "Review",
+             "email_thread": NEW_MESSAGE + "\n\nOn Mon, Jun 3, 2024, John wrote:\n> old text"}
+
+    #the description is also what the response agent gets when the human picks respond
+    description = _interrupt_request({"email_input": email, "classification_response": "notify"})["description"]
+
+    assert "Thursday" in description and "old text" not in description
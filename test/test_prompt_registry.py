@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from email_assistant.prompt_registry import PromptProfile, PromptRegistry, unwrap_structured, prompt_registry
+from email_assistant.schemas import RouterSchema
+from email_assistant.triage_cache import triage_cache_key
+from stubs import EMAIL
+
+
+def test_agent_prompt_keeps_a_stable_prefix_and_puts_the_date_last():
+    today = [date(2025, 1, 1)]
+    registry = PromptRegistry(today=lambda: today[0])
+    conversation = [HumanMessage(content="Respond to the email")]
+
+    first = registry.agent_messages(conversation)
+    today[0] = date(2025, 1, 2)
+    second = registry.agent_messages(conversation)
+
+    assert first[0]["content"] is second[0]["content"]
+    assert first[1] is second[1] is conversation[0]
+    assert first[-1]["content"] == "Today's date is 2025-01-01."
+    assert second[-1]["content"] == "Today's date is 2025-01-02."
+    assert "2025" not in first[0]["content"]
+
+
+def test_versions_change_with_the_profile():
+    registry = PromptRegistry(profiles=[PromptProfile("sales", background="You work for the sales team.")])
+
+    assert registry.get("default").triage_version != registry.get("sales").triage_version
+    assert registry.get("default").triage_version == PromptRegistry().get("default").triage_version
+    assert "sales team" in registry.triage_messages(EMAIL, profile="sales")[0]["content"]
+    with pytest.raises(KeyError):
+        registry.get("missing")
+
+
+def test_triage_cache_key_follows_the_registry_version():
+    assert triage_cache_key(EMAIL) == triage_cache_key(EMAIL, prompt_registry.get().triage_version)
+
+
+def test_cached_token_ratio_from_usage_metadata():
+    registry = PromptRegistry()
+    usage = {"input_tokens": 2000, "output_tokens": 10, "total_tokens": 2010, "input_token_details": {"cache_read": 1536}}
+    registry.record_usage("agent", AIMessage(content="", usage_metadata=usage))
+    registry.record_usage("agent", AIMessage(content="", usage_metadata={**usage, "input_token_details": {}}))
+    registry.record_usage("agent", AIMessage(content=""))
+
+    stats = registry.stats()["usage"]["agent"]
+    assert stats["calls"] == 2
+    assert stats["calls_with_cache_hit"] == 1
+    assert stats["cached_token_ratio"] == pytest.approx(1536 / 4000)
+
+
+def test_unwrap_structured_output_with_raw_message():
+    decision = RouterSchema(classification="respond", reasoning="question", confidence=0.9)
+
+    assert unwrap_structured("triage", decision) is decision
+    assert unwrap_structured("triage", {"raw": AIMessage(content=""), "parsed": decision, "parsing_error": None}) is decision
+    with pytest.raises(ValueError):
+        unwrap_structured("triage", {"raw": AIMessage(content=""), "parsed": None, "parsing_error": ValueError("bad json")})
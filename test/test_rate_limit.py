@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from email_assistant.metrics import LLM_RATE_LIMITED
+from email_assistant.rate_limit import RateLimitedRunnable, RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_token_bucket_waits_for_refill_and_reconciles_with_reported_usage():
+    clock = Clock()
+    limiter = RateLimiter(rpm=60, tpm=600, max_concurrency=10, clock=clock)
+
+    wait, permit = limiter.try_acquire(500)
+    assert wait == 0 and permit is not None
+    #100 tokens left, 10 refilled per second
+    wait, blocked = limiter.try_acquire(300)
+    assert blocked is None and wait == pytest.approx(20)
+
+    #the call only used 200 of its 500 estimated tokens
+    limiter.release(permit, used_tokens=200)
+    wait, permit = limiter.try_acquire(300)
+    assert wait == 0 and permit is not None
+
+
+def test_concurrency_halves_once_per_burst_of_429s_and_climbs_back():
+    limiter = RateLimiter(max_concurrency=8, min_concurrency=1)
+    permits = [limiter.try_acquire(10)[1] for _ in range(8)]
+    assert limiter.try_acquire(10)[1] is None
+
+    #three calls of the same burst get a 429, the limit is halved once
+    for permit in permits[:3]:
+        limiter.release(permit, rate_limited=True)
+    assert limiter.stats()["concurrency"] == 4
+
+    #the rest of the burst returns, then a call started after the decrease gets a 429: halved again
+    for permit in permits[3:]:
+        limiter.release(permit, rate_limited=True)
+    assert limiter.stats()["concurrency"] == 4
+    limiter.release(limiter.try_acquire(10)[1], rate_limited=True)
+    assert limiter.stats()["concurrency"] == 2
+
+    for _ in range(20):
+        limiter.release(limiter.try_acquire(10)[1])
+    assert 4 <= limiter.stats()["concurrency"] < 8 and limiter.stats()["in_flight"] == 0
+
+
+def test_wrapped_model_never_exceeds_the_concurrency_limit_and_backs_off_on_429():
+    limiter = RateLimiter(max_concurrency=3)
+    running, peak, calls = 0, 0, 0
+
+    async def model(messages):
+        nonlocal running, peak, calls
+        running += 1
+        calls += 1
+        call = calls
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if call == 1:
+            raise RateLimitError("slow down")
+        return AIMessage(content="ok", usage_metadata={"input_tokens": 5, "output_tokens": 1, "total_tokens": 6})
+
+    llm = RateLimitedRunnable(RunnableLambda(model), limiter)
+    rate_limited = LLM_RATE_LIMITED.labels().value
+
+    async def run():
+        return await asyncio.gather(*(llm.ainvoke([{"role": "user", "content": "hi"}]) for _ in range(12)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    assert sum(isinstance(r, RateLimitError) for r in results) == 1
+    assert peak == 3
+    assert LLM_RATE_LIMITED.labels().value == rate_limited + 1
+    #halved once, then climbed back with the successful calls
+    assert limiter.generation == 1 and limiter.stats()["in_flight"] == 0
+
+
+def test_failed_and_cancelled_calls_do_not_raise_the_concurrency():
+    limiter = RateLimiter(max_concurrency=8, min_concurrency=1)
+    limiter.release(limiter.try_acquire(10)[1], rate_limited=True)
+    started = asyncio.Event()
+
+    async def model(messages):
+        if messages == "timeout":
+            raise asyncio.TimeoutError()
+        if messages == "server error":
+            raise RuntimeError("502 bad gateway")
+        started.set()
+        await asyncio.sleep(10)
+
+    llm = RateLimitedRunnable(RunnableLambda(model), limiter)
+
+    async def run():
+        for failing in ("timeout", "server error"):
+            with pytest.raises(Exception):
+                await llm.ainvoke(failing)
+        #a speculative draft cancelled once triage decides
+        draft = asyncio.create_task(llm.ainvoke("draft"))
+        await started.wait()
+        draft.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await draft
+
+    asyncio.run(run())
+
+    assert limiter.concurrency == 4.0 and limiter.stats()["in_flight"] == 0
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from email_assistant import agents, speculation, triage
+from email_assistant.metrics import SPECULATION_LATENCY_GAINED, SPECULATION_WASTED_TOKENS, SPECULATIVE_DRAFTS
+from email_assistant.speculation import SenderHistory, sender_history
+from stubs import EMAIL, StubRouter, StubToolModel
+
+USAGE = {"input_tokens": 900, "output_tokens": 30, "total_tokens": 930}
+
+
+@pytest.fixture
+def speculating(monkeypatch, stub_llms):
+    monkeypatch.setattr(speculation, "SPECULATIVE_DRAFTING", True)
+    monkeypatch.setattr(triage, "TRIAGE_RULES_ENABLED", False)
+    monkeypatch.setattr(triage, "TRIAGE_CACHE_ENABLED", False)
+    sender_history.clear()
+    for _ in range(5):
+        sender_history.record(EMAIL, "respond")
+    drafter = StubToolModel(delay=0.02, usage=USAGE)
+    stub_llms(tool_model=drafter)
+    yield drafter
+    sender_history.clear()
+
+
+def test_sender_history_falls_back_from_address_to_domain_to_everyone():
+    history = SenderHistory(min_observations=2)
+    for _ in range(4):
+        history.record({"author": "Bob <bob@client.com>"}, "respond")
+    history.record({"author": "news@promo.com"}, "ignore")
+
+    assert history.respond_probability({"author": "Bob <bob@client.com>"}) == pytest.approx(5 / 6)
+    #one email from carol is not enough, the client.com domain decides
+    history.record({"author": "carol@client.com"}, "ignore")
+    assert history.respond_probability({"author": "carol@client.com"}) == pytest.approx(5 / 7)
+    assert history.respond_probability({"author": "dan@unknown.org"}) == pytest.approx(5 / 8)
+
+
+def run(stub_llms, classification):
+    #the router answers after the speculative draft is done
+    stub_llms(StubRouter(classification, delay=0.05))
+    return asyncio.run(agents.get_email_assistant().ainvoke({"email_input": EMAIL}))
+
+
+def test_committed_draft_becomes_the_first_model_turn(speculating, stub_llms):
+    committed, gained = SPECULATIVE_DRAFTS.labels("committed").value, SPECULATION_LATENCY_GAINED.labels()
+    count_before = sum(gained.counts)
+
+    result = run(stub_llms, "respond")
+
+    assert [m.type for m in result["messages"]] == ["human", "ai", "tool"]
+    #one drafting call in total: the speculative one was used, not repeated
+    assert len(speculating.prompts) == 1
+    assert SPECULATIVE_DRAFTS.labels("committed").value == committed + 1
+    assert sum(gained.counts) == count_before + 1
+
+
+def test_draft_is_cancelled_when_triage_does_not_respond(speculating, stub_llms):
+    cancelled, wasted = SPECULATIVE_DRAFTS.labels("cancelled").value, SPECULATION_WASTED_TOKENS.labels().value
+
+    result = run(stub_llms, "notify")
+
+    assert result["classification_response"] == "notify"
+    assert "messages" not in result or not result["messages"]
+    assert SPECULATIVE_DRAFTS.labels("cancelled").value == cancelled + 1
+    #the draft finished before triage, its reported usage is what was wasted
+    assert SPECULATION_WASTED_TOKENS.labels().value == wasted + 930
+
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.tools import tool
+
+from email_assistant import tool_execution
+from email_assistant.tool_execution import arun_tool_calls, run_tool_calls
+
+
+@tool
+def slow_lookup(day: str) -> str:
+    """pretends to hit a calendar backend"""
+    time.sleep(0.2)
+    return f"free on {day}"
+
+
+@tool
+def broken(day: str) -> str:
+    """always fails"""
+    raise RuntimeError("backend down")
+
+
+@tool
+def stuck(day: str) -> str:
+    """never answers in time"""
+    time.sleep(1)
+    return "too late"
+
+
+TOOLS = {t.name: t for t in (slow_lookup, broken, stuck)}
+
+
+def call(name, call_id, day="monday"):
+    return {"name": name, "args": {"day": day}, "id": call_id, "type": "tool_call"}
+
+
+def test_calls_run_concurrently_and_keep_order():
+    calls = [call("slow_lookup", str(i), day) for i, day in enumerate(["mon", "tue", "wed", "thu"])]
+
+    start = time.perf_counter()
+    results = run_tool_calls(calls, TOOLS)
+    elapsed = time.perf_counter() - start
+
+    assert [m.tool_call_id for m in results] == ["0", "1", "2", "3"]
+    assert [m.content for m in results] == ["free on mon", "free on tue", "free on wed", "free on thu"]
+    assert elapsed < 0.6
+
+
+def test_failures_and_timeouts_become_error_messages():
+    calls = [call("broken", "a"), call("stuck", "b"), call("missing", "c"), call("slow_lookup", "d")]
+
+    for results in (
+        run_tool_calls(calls, TOOLS, timeouts={"stuck": 0.3}),
+        asyncio.run(arun_tool_calls(calls, TOOLS, timeouts={"stuck": 0.3})),
+    ):
+        assert [m.status for m in results] == ["error", "error", "error", "success"]
+        assert "backend down" in results[0].content
+        assert "timed out" in results[1].content
+        assert "unknown tool" in results[2].content
+        assert results[3].content == "free on monday"
+
+
+def test_timeouts_start_when_the_call_runs_not_when_it_is_queued(monkeypatch):
+    #one pool thread: the second call waits 0.2s for it, then runs 0.2s within its own 0.3s timeout
+    monkeypatch.setattr(tool_execution, "_executor", ThreadPoolExecutor(max_workers=1))
+    calls = [call("slow_lookup", "a", "mon"), call("slow_lookup", "b", "tue")]
+
+    results = run_tool_calls(calls, TOOLS, timeouts={"slow_lookup": 0.3})
+
+    assert [m.content for m in results] == ["free on mon", "free on tue"]
+
+
+def test_a_pool_held_by_hung_calls_does_not_hang_the_next_call(monkeypatch):
+    release = threading.Event()
+
+    @tool
+    def hung(day: str) -> str:
+        """never returns until the test releases it"""
+        release.wait()
+        return "released"
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(tool_execution, "_executor", executor)
+    tools = {"hung": hung, "slow_lookup": slow_lookup}
+    try:
+        #the hung calls time out but keep both pool threads
+        hung_results = run_tool_calls([call("hung", "a"), call("hung", "b")], tools, timeouts={"hung": 0.1})
+        assert all("timed out" in m.content for m in hung_results)
+
+        start = time.perf_counter()
+        results = run_tool_calls([call("slow_lookup", "c")], tools, timeouts={"slow_lookup": 0.2})
+
+        assert time.perf_counter() - start < 0.5
+        assert results[0].status == "error" and "did not start" in results[0].content
+    finally:
+        release.set()
+        executor.shutdown(wait=True)
+
+
+def test_side_effecting_tools_run_in_order_without_a_timeout():
+    sent = []
+    running = []
+
+    @tool("write_email")
+    def send(to: str) -> str:
+        """slower than its timeout, must still be reported as sent"""
+        running.append(to)
+        assert len(running) == 1
+        time.sleep(0.2)
+        running.remove(to)
+        sent.append(to)
+        return f"sent to {to}"
+
+    tools = {"write_email": send, "slow_lookup": slow_lookup}
+    calls = [{"name": "write_email", "args": {"to": to}, "id": to, "type": "tool_call"} for to in ("alice", "bob")]
+    calls.append(call("slow_lookup", "lookup"))
+
+    for results in (
+        run_tool_calls(calls, tools, timeouts={"write_email": 0.05}),
+        asyncio.run(arun_tool_calls(calls, tools, timeouts={"write_email": 0.05})),
+    ):
+        assert [m.content for m in results] == ["sent to alice", "sent to bob", "free on monday"]
+    assert sent == ["alice", "bob", "alice", "bob"]
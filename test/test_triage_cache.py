@@ -0,0 +1,77 @@
+from email_assistant.schemas import RouterSchema
+from email_assistant.triage_cache import TriageCache, triage_cache_key, triage_model_id
+
+EMAIL = {
+    "author": "GitHub <notifications@github.com>",
+    "to": "Lance Martin <lance@company.com>",
+    "subject": "PR #42: Comment from alex-dev",
+    "email_thread": "alex-dev commented on   PR #42.\nLooks good!",
+}
+DECISION = RouterSchema(classification="notify", reasoning="github notification", confidence=0.9)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_ignores_case_whitespace_and_numbers_but_not_prompt_version():
+    near_duplicate = {**EMAIL, "subject": "pr #43: comment from ALEX-dev", "email_thread": "alex-dev commented on PR #43. Looks good!"}
+
+    assert triage_cache_key(EMAIL) == triage_cache_key(near_duplicate)
+    assert triage_cache_key(EMAIL) != triage_cache_key(EMAIL, prompt_version="other")
+    assert triage_cache_key(EMAIL) != triage_cache_key({**EMAIL, "author": "Alice <alice@company.com>"})
+    #versions and model names are not normalized, digits matter there
+    assert triage_cache_key(EMAIL, prompt_version="3") != triage_cache_key(EMAIL, prompt_version="4")
+
+
+def test_key_changes_with_the_triage_and_escalation_models(monkeypatch):
+    key = triage_cache_key(EMAIL)
+
+    monkeypatch.setattr("email_assistant.config.TRIAGE_MODEL", "gpt-4.1-mini")
+    assert triage_cache_key(EMAIL) != key
+    monkeypatch.setattr("email_assistant.config.TRIAGE_MODEL", "gpt-4o-mini")
+    assert triage_cache_key(EMAIL) == key
+    monkeypatch.setattr("email_assistant.config.LARGE_MODEL", "gpt-4.1")
+    assert triage_cache_key(EMAIL) != key
+    monkeypatch.setattr("email_assistant.config.LLM_PROVIDER", "fake")
+    assert triage_model_id().startswith("fake:gpt-4o-mini+fake:gpt-4.1@")
+
+
+def test_hits_misses_and_ttl():
+    clock = FakeClock()
+    cache = TriageCache(max_entries=10, ttl_seconds=60, sqlite_path=None, clock=clock)
+    key = triage_cache_key(EMAIL)
+
+    assert cache.get(key) is None
+    cache.put(key, DECISION)
+    assert cache.get(key) == DECISION
+    clock.now += 61
+    assert cache.get(key) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TriageCache(max_entries=2, ttl_seconds=60, sqlite_path=None)
+    cache.put("a", DECISION)
+    cache.put("b", DECISION)
+    cache.get("a")
+    cache.put("c", DECISION)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == DECISION
+    assert cache.get("c") == DECISION
+
+
+def test_sqlite_tier_survives_a_new_process(tmp_path):
+    path = str(tmp_path / "triage.sqlite")
+    TriageCache(sqlite_path=path).put("key", DECISION)
+
+    restarted = TriageCache(sqlite_path=path)
+
+    assert restarted.get("key") == DECISION
+    assert restarted.stats()["disk_hits"] == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from email_assistant.eval import triage_eval
+from email_assistant.triage_cache import triage_cache
+from stubs import StubRouter
+
+
+def test_confusion_matrix_precision_and_recall():
+    expected = ["ignore", "ignore", "notify", "respond", "respond", "respond"]
+    predicted = ["ignore", "respond", "notify", "respond", "respond", "notify"]
+
+    matrix = triage_eval.confusion_matrix(expected, predicted)
+    assert matrix["ignore"] == {"ignore": 1, "notify": 0, "respond": 1}
+    assert matrix["respond"] == {"ignore": 0, "notify": 1, "respond": 2}
+
+    metrics = triage_eval.per_class_metrics(matrix)
+    assert metrics["ignore"] == {"precision": 1.0, "recall": 0.5, "support": 2}
+    assert metrics["notify"]["precision"] == 0.5 and metrics["notify"]["recall"] == 1.0
+    assert metrics["respond"]["precision"] == pytest.approx(2 / 3) and metrics["respond"]["recall"] == pytest.approx(2 / 3)
+
+    #a class never predicted and never expected has no precision or recall
+    empty = triage_eval.per_class_metrics(triage_eval.confusion_matrix(["ignore"], ["ignore"]))
+    assert empty["notify"] == {"precision": None, "recall": None, "support": 0}
+
+
+def test_every_example_reaches_the_router_with_bounded_concurrency(monkeypatch):
+    monkeypatch.setattr("email_assistant.triage.TRIAGE_RULES_ENABLED", False)
+    router = StubRouter("respond", confidence=0.99, delay=0.01)
+    triage_cache.clear()
+
+    def run():
+        return asyncio.run(triage_eval.evaluate(concurrency=3, router=router))
+
+    result = run()
+    run()
+
+    n = len(triage_eval.examples_triage)
+    assert router.calls == 2 * n and router.peak == 3
+    assert result["examples"] == n and result["errors"] == 0
+    assert sum(sum(row.values()) for row in result["confusion_matrix"].values()) == n
+    assert result["per_class"]["respond"]["recall"] == 1.0
+    assert result["accuracy"] == result["per_class"]["respond"]["support"] / n
+    assert 0.01 <= result["latency_s"]["p50"] <= result["latency_s"]["p95"]
+    assert all(m["predicted"] == "respond" for m in result["mismatches"])
+    assert result["per_source"]["llm"]["examples"] == n and result["per_source"]["rule"]["examples"] == 0
+
+
+def test_latency_and_accuracy_are_reported_per_source():
+    records = [
+        {"expected": "ignore", "predicted": "ignore", "source": "rule", "latency_s": 0.0001, "error": None},
+        {"expected": "notify", "predicted": "respond", "source": "llm", "latency_s": 0.2, "error": None},
+        {"expected": "respond", "predicted": "respond", "source": "llm", "latency_s": 0.4, "error": None},
+        {"expected": "respond", "predicted": "respond", "source": "escalated", "latency_s": 1.5, "error": None},
+        {"expected": "notify", "predicted": None, "source": None, "latency_s": 0.1, "error": "TimeoutError: "},
+    ]
+
+    sources = triage_eval.per_source(records)
+
+    assert sources["rule"] == {"examples": 1, "accuracy": 1.0, "latency_s": {"p50": 0.0001, "p95": 0.0001, "mean": 0.0001}}
+    assert sources["llm"]["accuracy"] == 0.5 and sources["llm"]["latency_s"]["p95"] == 0.4
+    assert sources["escalated"]["examples"] == 1 and sources["escalated"]["latency_s"]["p50"] == 1.5
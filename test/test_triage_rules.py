@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from email_assistant.eval.email_test_dataset import examples_triage
+from email_assistant.triage_rules import DEFAULT_TRIAGE_RULES, TriageRuleEngine
+
+
+def email(author, subject="Hello"):
+    return {"author": author, "to": "Lance <lance@company.com>", "subject": subject, "email_thread": "..."}
+
+
+def test_default_rules_agree_with_the_dataset_when_they_skip_the_llm():
+    engine = TriageRuleEngine.from_dicts(DEFAULT_TRIAGE_RULES)
+    for example in examples_triage:
+        decision = engine.classify(example["inputs"]["email_input"])
+        if decision is not None:
+            assert decision.classification == example["outputs"]["classification"]
+
+
+def test_subdomains_and_local_parts_match():
+    engine = TriageRuleEngine.from_dicts(DEFAULT_TRIAGE_RULES)
+
+    assert engine.classify(email("GitHub <notifications@mail.github.com>")).classification == "notify"
+    assert engine.classify(email("AWS <no-reply@aws.amazon.com>")).classification == "notify"
+    assert engine.classify(email("Alice <alice@github.com>")) is None
+
+
+def test_only_matches_that_decide_count_as_hits():
+    engine = TriageRuleEngine.from_dicts(DEFAULT_TRIAGE_RULES)
+
+    #below min_confidence the LLM decides, so the rule did not classify anything
+    assert engine.classify(email("Marketing <marketing@company.com>")) is None
+    assert engine.classify(email("GitHub <notifications@github.com>")).classification == "notify"
+    hits = {rule["name"]: rule["hits"] for rule in engine.stats()}
+    assert hits["marketing-lists"] == 0 and hits["github-notifications"] == 1
+
+
+def test_subject_tokens_must_all_match_and_highest_confidence_wins(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [
+        {"name": "build", "classification": "notify", "confidence": 0.9, "subject_tokens": ["build", "failed"]},
+        {"name": "ci-domain", "classification": "ignore", "confidence": 0.95, "sender_domains": ["ci.example.com"]},
+    ]}))
+    engine = TriageRuleEngine.from_file(str(path))
+
+    assert engine.classify(email("Bob <bob@company.com>", "Build #12 FAILED on main")).classification == "notify"
+    assert engine.classify(email("Bob <bob@company.com>", "Build passed")) is None
+    assert engine.classify(email("CI <bot@ci.example.com>", "Build #12 failed")).classification == "ignore"
+
+
+def test_thousands_of_rules_stay_indexed():
+    rules = [{"name": f"domain-{i}", "classification": "ignore", "sender_domains": [f"sender{i}.com"]} for i in range(5000)]
+    engine = TriageRuleEngine.from_dicts(rules)
+
+    assert engine.match(email("x <x@sender4321.com>")).name == "domain-4321"
+    assert engine.match(email("x <x@unknown.com>")) is None
+
+
+def test_rule_without_conditions_is_rejected():
+    with pytest.raises(ValueError):
+        TriageRuleEngine.from_dicts([{"name": "empty", "classification": "ignore"}])
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ValidationError
+
+from email_assistant import triage
+from email_assistant.schemas import RouterSchema
+from email_assistant.triage import abatch_classify_emails, aclassify_email, classify_email, is_vip_sender
+from stubs import StubRouter
+
+
+def email(author, subject="Question"):
+    return {"author": author, "to": "me@company.com", "subject": subject, "email_thread": f"{subject} from {author}"}
+
+
+@pytest.fixture(autouse=True)
+def _no_rules(monkeypatch):
+    monkeypatch.setattr(triage, "TRIAGE_RULES_ENABLED", False)
+    monkeypatch.setattr(triage, "TRIAGE_CACHE_ENABLED", False)
+
+
+def test_confident_small_model_answers_alone_and_the_large_router_is_never_built():
+    small = StubRouter("notify", 0.9)
+    built = []
+
+    result = classify_email(small, email("Bob <bob@company.com>"), lambda: built.append(1))
+
+    assert result.classification == "notify" and small.calls == 1 and built == []
+
+
+def test_low_confidence_escalates_to_the_large_model():
+    small, large = StubRouter("ignore", 0.4), StubRouter("respond", 0.95)
+
+    result = asyncio.run(aclassify_email(small, email("Bob <bob@company.com>"), lambda: large))
+
+    assert result.classification == "respond"
+    assert (small.calls, large.calls) == (1, 1)
+    #no large model configured: the small model's answer stands
+    assert classify_email(small, email("Bob <bob@company.com>"), lambda: None).classification == "ignore"
+
+
+def test_the_router_schema_requires_a_confidence():
+    #a model that leaves it out must not be taken as certain and skip escalation
+    assert "confidence" in convert_to_openai_tool(RouterSchema)["function"]["parameters"]["required"]
+    with pytest.raises(ValidationError):
+        RouterSchema(classification="notify", reasoning="no confidence given")
+
+
+def test_vip_senders_go_straight_to_the_large_model(monkeypatch):
+    monkeypatch.setattr(triage, "TRIAGE_VIP_SENDERS", ["ceo@company.com", "@bigclient.com"])
+    small, large = StubRouter("notify", 0.99), StubRouter("respond", 0.99)
+
+    assert classify_email(small, email("CEO <CEO@company.com>"), lambda: large).classification == "respond"
+    assert small.calls == 0 and large.calls == 1
+    assert is_vip_sender(email("Ann <ann@bigclient.com>"), ["@bigclient.com"])
+    assert not is_vip_sender(email("Ann <ann@notbigclient.com>"), ["@bigclient.com"])
+
+
+def test_batch_escalates_only_the_uncertain_and_vip_emails(monkeypatch):
+    monkeypatch.setattr(triage, "TRIAGE_VIP_SENDERS", ["@bigclient.com"])
+
+    class MixedRouter(StubRouter):
+        async def abatch(self, inputs, config=None, return_exceptions=False):
+            self.calls += len(inputs)
+            return [RouterSchema(classification="notify", reasoning="stub", confidence=0.3 if "unsure" in str(messages) else 0.9)
+                    for messages in inputs]
+
+    small, large = MixedRouter("notify", 0.9), StubRouter("respond", 0.9)
+    emails = [email("Bob <bob@company.com>"), email("Bob <bob@company.com>", "unsure"), email("Ann <ann@bigclient.com>")]
+
+    results = asyncio.run(abatch_classify_emails(small, emails, 4, lambda: large))
+
+    assert [r.classification for r in results] == ["notify", "respond", "respond"]
+    assert (small.calls, large.calls) == (2, 2)
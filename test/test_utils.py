@@ -0,0 +1,54 @@
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages.utils import convert_to_openai_messages
+
+from email_assistant.agents import _format_process_result
+from email_assistant.utils import extract_tool_calls, messages_formatter
+
+WRITE_ARGS = {"to": "alice@company.com", "subject": "Re: API", "body": "Sure, café at 3?"}
+MESSAGES = [
+    SystemMessage(content="system"),
+    HumanMessage(content="Respond to the email"),
+    AIMessage(content="", tool_calls=[
+        {"name": "check_calendar_availability", "args": {"attendees": ["a"], "duration_minutes": 30}, "id": "1"},
+        {"name": "write_email", "args": {"to": "x", "subject": "draft", "body": "draft"}, "id": "2"},
+    ]),
+    ToolMessage(content="All attendees available", tool_call_id="1"),
+    AIMessage(content="thinking", tool_calls=[{"name": "write_email", "args": WRITE_ARGS, "id": "3"}]),
+    ToolMessage(content="Email sent", tool_call_id="3"),
+    AIMessage(content=[{"type": "text", "text": "block content"}]),
+    {"role": "user", "content": "a dict message"},
+]
+
+
+def reference_formatter(messages):
+    """the formatting as defined on top of convert_to_openai_messages"""
+    formatted = []
+    for message in convert_to_openai_messages(messages):
+        content = message["content"]
+        for tc in message.get("tool_calls", []):
+            content += "tool call made to: " + tc["function"]["name"] + " with arguments " + tc["function"]["arguments"] + " ."
+        formatted.append(f"{message['role'].upper()} : {content}")
+    return "\n\n".join(formatted)
+
+
+def test_messages_formatter_matches_the_openai_conversion():
+    assert messages_formatter(MESSAGES) == reference_formatter(MESSAGES)
+
+
+def test_extract_tool_calls_from_parsed_and_raw_tool_calls():
+    raw_only = AIMessage(content="", additional_kwargs={
+        "refusal": None,
+        "tool_calls": [{"id": "9", "type": "function", "function": {"name": "Done", "arguments": "{}"}}],
+    })
+
+    assert extract_tool_calls(MESSAGES[:-1] + [raw_only]) == ["check_calendar_availability", "write_email", "write_email", "Done"]
+
+
+def test_format_process_result_returns_the_last_written_email():
+    result = _format_process_result({"messages": MESSAGES[:-1], "classification_response": "respond"})
+
+    assert json.loads(result["response"]) == WRITE_ARGS
+    assert result["classification"] == "respond"
+    assert _format_process_result({"classification_response": "ignore"})["response"] == "no response generated"
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import random
+import sqlite3
+
+import httpx
+
+from email_assistant import factory
+from email_assistant.main import app
+from email_assistant.metrics import WORK_QUEUE_ITEMS
+from email_assistant.work_queue import (
+    MemoryQueueBackend,
+    QueueItem,
+    SqliteQueueBackend,
+    WorkQueue,
+    backoff_delay,
+    ingest_email,
+    is_transient,
+)
+from stubs import EMAIL
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+def test_transient_errors_and_jittered_backoff():
+    assert is_transient(RateLimitError()) and is_transient(asyncio.TimeoutError())
+    assert not is_transient(ValueError("bad email"))
+
+    rng = random.Random(0)
+    delays = [backoff_delay(attempt, base=1, maximum=10, rng=rng) for attempt in (1, 2, 3, 4, 5, 6)]
+    assert all(0 <= d <= cap for d, cap in zip(delays, (1, 2, 4, 8, 10, 10)))
+
+
+def test_transient_failures_are_retried_and_permanent_ones_dead_lettered():
+    attempts = {}
+
+    async def handler(item):
+        payload = item.payload
+        attempts[payload["n"]] = attempts.get(payload["n"], 0) + 1
+        if payload["n"] == 1 and attempts[1] < 3:
+            raise RateLimitError("slow down")
+        if payload["n"] == 2:
+            raise ValueError("unparseable")
+        if payload["n"] == 3:
+            raise RateLimitError("still limited")
+
+    async def run():
+        queue = WorkQueue(MemoryQueueBackend(), handler, workers=2, max_attempts=3, backoff=lambda attempt: 0.001)
+        for n in range(4):
+            await queue.submit({"n": n})
+        await queue.join()
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(run())
+
+    assert attempts == {0: 1, 1: 3, 2: 1, 3: 3}
+    dead = {item.payload["n"]: item for item in queue.dead_letters()}
+    assert set(dead) == {2, 3}
+    assert dead[2].attempts == 1 and dead[2].last_error == "ValueError: unparseable"
+    assert dead[3].attempts == 3
+    assert queue.stats()["depth"] == 0 and queue.stats()["dead_letters"] == 2
+
+
+def test_ingest_returns_503_when_the_queue_is_full(monkeypatch):
+    release = asyncio.Event()
+    handled = []
+
+    async def handler(item):
+        await release.wait()
+        handled.append(item.payload)
+
+    queue = WorkQueue(MemoryQueueBackend(), handler, workers=1, max_size=2)
+    monkeypatch.setattr(factory, "get_work_queue", lambda: queue)
+    rejected = WORK_QUEUE_ITEMS.labels("rejected").value
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            responses = [await client.post("/ingest", json={"email_input": EMAIL}) for _ in range(3)]
+            release.set()
+            await queue.join()
+            await queue.stop()
+            return responses
+
+    accepted, queued, full = asyncio.run(run())
+
+    assert accepted.status_code == queued.status_code == 202
+    assert full.status_code == 503 and full.headers["retry-after"] == "1"
+    assert handled == [EMAIL, EMAIL]
+    assert WORK_QUEUE_ITEMS.labels("rejected").value == rejected + 1
+
+
+def test_sqlite_backend_requeues_running_items_after_a_restart(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    backend = SqliteQueueBackend(path)
+    for n in range(2):
+        assert backend.put(QueueItem(f"item-{n}", {"n": n}, 0.0, float(n)), max_size=2)
+    assert not backend.put(QueueItem("item-2", {"n": 2}, 0.0, 0.0), max_size=2)
+    running = backend.claim(now=10.0)
+    backend.dead_letter(backend.claim(now=10.0))
+
+    restarted = SqliteQueueBackend(path)
+    assert restarted.depth() == 1
+    assert restarted.claim(now=10.0).payload == running.payload
+    assert [item.item_id for item in restarted.dead_letters()] == ["item-1"]
+    assert not restarted.put(QueueItem("item-3", {"n": 3}, 0.0, 0.0), max_size=1)
+
+
+def test_an_item_that_kills_the_process_runs_out_of_attempts(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    assert SqliteQueueBackend(path).put(QueueItem("item-0", {"n": 0}, 0.0, 0.0), max_size=1)
+    #every attempt is claimed, then the process dies before the item is acked or retried
+    for attempt in (1, 2, 3):
+        assert SqliteQueueBackend(path).claim(now=10.0).attempts == attempt
+
+    handled = []
+
+    async def handler(item):
+        handled.append(item.item_id)
+
+    async def run():
+        queue = WorkQueue(SqliteQueueBackend(path), handler, workers=1, max_attempts=3)
+        queue.start()
+        await asyncio.wait_for(queue.join(), 5)
+        await queue.stop()
+        return queue.dead_letters()
+
+    dead = asyncio.run(run())
+
+    assert handled == []
+    assert dead[0].item_id == "item-0" and dead[0].attempts == 4
+    assert dead[0].last_error == "interrupted by a restart on every attempt"
+
+
+class FlakyBackend(MemoryQueueBackend):
+    """a memory backend whose claim and ack fail once, like a locked SQLite database"""
+
+    def __init__(self):
+        super().__init__()
+        self.failures = {"claim": 1, "ack": 1}
+
+    def _fail_once(self, call):
+        if self.failures[call]:
+            self.failures[call] -= 1
+            raise sqlite3.OperationalError("database is locked")
+
+    def claim(self, now):
+        self._fail_once("claim")
+        return super().claim(now)
+
+    def ack(self, item):
+        self._fail_once("ack")
+        return super().ack(item)
+
+
+def test_backend_errors_do_not_kill_the_workers():
+    handled = []
+
+    async def handler(item):
+        handled.append(item.payload["n"])
+
+    async def run():
+        queue = WorkQueue(FlakyBackend(), handler, workers=1, backoff=lambda attempt: 0.001)
+        for n in range(3):
+            await queue.submit({"n": n})
+        await asyncio.wait_for(queue.join(), 5)
+        alive = all(not task.done() for task in queue._tasks)
+        await queue.stop()
+        return queue, alive
+
+    queue, alive = asyncio.run(run())
+
+    assert sorted(handled) == [0, 1, 2] and alive
+    assert queue.backend.failures == {"claim": 0, "ack": 0}
+    assert queue.stats()["depth"] == 0
+
+
+def test_ingested_emails_are_logged_with_their_item_id(monkeypatch, caplog):
+    async def aprocess_email(email_input):
+        return {"classification": "notify", "response": "", "reasoning": "stub"}
+
+    monkeypatch.setattr("email_assistant.agents.aprocess_email", aprocess_email)
+    item = QueueItem("item-42", EMAIL, 0.0, 0.0, attempts=1)
+
+    with caplog.at_level(logging.INFO, logger="email_assistant.work_queue"):
+        asyncio.run(ingest_email(item))
+
+    record = next(r for r in caplog.records if r.getMessage() == "ingested email")
+    assert record.item_id == "item-42" and record.classification == "notify"